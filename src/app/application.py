@@ -1,30 +1,90 @@
 from strategy.strategy import StrategyFactory
-from datetime import datetime
 from pnl.pnl_calculation import PnLEngine
+from pricing.scenario import ScenarioEngine
+from app.incremental import IncrementalBacktest
 from configuration import ConfigurationFactory
+from manager.data import DataManager
+from utility.instrumentation import Instrumentation
+from utility.metrics import StrategyMetrics
+from os import makedirs
+from os.path import join
 import pandas as pd
-import matplotlib.pyplot as plt
 
 
 class BacktestingEngine:
 
-    def __init__(self):
+    def __init__(self, config=None, headless=False, output_dir=None):
         #initialise configuration
-        self._init_conf()
+        self._init_conf(config, headless, output_dir)
         #initialise backtest components
         self._init_components()
 
     def _init_components(self):
-        self.strategies = StrategyFactory().strategies
-        self.pnl = PnLEngine()
-        self.config = ConfigurationFactory.create_btest_config()
+        #the config is loaded once and passed down to every component
+        if self.config.get("backtest_cache", {}).get("enabled", False):
+            #the strategies are only built in run for the trade dates that are not in the backtest cache
+            self.backtest = IncrementalBacktest(config=self.config)
+            self.pnl = None
+            self.strategies = None
+        else:
+            self.backtest = None
+            self.pnl = PnLEngine(config=self.config)
+            with Instrumentation.span("strategy_factory"):
+                self.strategies = StrategyFactory(config=self.config).strategies
 
-    def _init_conf(self):
-        pass
+    def _init_conf(self, config=None, headless=False, output_dir=None):
+        self.config = ConfigurationFactory.create_btest_config() if config is None else config
+        #in headless mode the strategy index and metrics are written to output_dir rather than plotted
+        self.headless = headless
+        self.output_dir = join(DataManager.ROOT_DIR, "output") if output_dir is None else output_dir
+        #configure the run instrumentation before any of the components are created
+        Instrumentation.configure(self.config.get("instrumentation", {}))
 
     def run(self):
-        print("{} - Running backtesting engine".format(datetime.now()))
-        strat_index = self.pnl.run(strategies=self.strategies)
+        Instrumentation.log("Running backtesting engine")
+        if self.backtest is not None:
+            strat_index = self.backtest.run()
+        else:
+            strat_index = self.pnl.run(strategies=self.strategies)
+
+        if self.headless:
+            self._output_results(strat_index)
+            if self.config.get("scenario_config", {}).get("enabled", False):
+                self._output_scenarios()
+        else:
+            self._plot(strat_index)
+
+        Instrumentation.log("Finished running backtesting engine")
+        Instrumentation.write_report(DataManager.ROOT_DIR)
+        return strat_index
+
+    def _output_results(self, strat_index):
+        """
+        Writes the strategy index to csv and its summary metrics to json
+        """
+        makedirs(self.output_dir, exist_ok=True)
+        strat_index.to_csv(join(self.output_dir, "strategy_index.csv"))
+        metrics = StrategyMetrics.compute_summary(strat_index)
+        metrics.to_json(join(self.output_dir, "metrics.json"), orient="index", indent=2)
+        Instrumentation.log("Successfully output strategy index and metrics to {}".format(self.output_dir))
+
+    def _output_scenarios(self):
+        """
+        Writes the scenario pnl surfaces of the portfolio on every date to csv
+        """
+        strategies = self.strategies
+        if strategies is None:
+            #the incremental backtest only built the strategies of the trade dates that were not cached
+            with Instrumentation.span("strategy_factory"):
+                strategies = self.backtest.build_strategies()
+        surfaces = ScenarioEngine(config=self.config).run(strategies=strategies)
+        makedirs(self.output_dir, exist_ok=True)
+        surfaces.to_csv(join(self.output_dir, "scenario_pnl.csv"))
+        Instrumentation.log("Successfully output scenario pnl surfaces to {}".format(self.output_dir))
+
+    def _plot(self, strat_index):
+        #matplotlib is only imported when we plot so that headless runs never load it
+        import matplotlib.pyplot as plt
 
         #tmp plottiing engine
         plt.plot(strat_index["opt_pnl"],
@@ -42,5 +102,3 @@ class BacktestingEngine:
         plt.grid(b=True, which='minor', color='#999999', linestyle='-', alpha=0.2)
         plt.legend()
         plt.show()
-
-        print("{} - Finished running backtesting engine".format(datetime.now()))
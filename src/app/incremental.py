@@ -0,0 +1,102 @@
+from strategy.strategy import StrategyFactory
+from pnl.pnl_calculation import PnLEngine
+from pnl.backtest_cache import BacktestCache
+from manager.data import DataManager
+from configuration import ConfigurationFactory
+from utility.instrumentation import Instrumentation
+from os.path import join
+import numpy as np
+import pandas as pd
+
+
+class IncrementalBacktest:
+    """
+    Runs the backtest reusing the results of previous runs. The strategies and leg pnl are only rebuilt for the
+    trade dates whose data or config has changed since they were cached - the rest are read back from the
+    backtest cache and merged in trade date order so the strategy index is the same as a full rebuild
+    """
+
+    def __init__(self, config=None, cache_dir=None):
+        self._init_config(config, cache_dir)
+
+    def _init_config(self, config=None, cache_dir=None):
+        self._config = ConfigurationFactory.create_btest_config() if config is None else config
+        _cache_config = self._config.get("backtest_cache", {})
+        if cache_dir is None:
+            cache_dir = join(DataManager.ROOT_DIR, _cache_config.get("cache_dir", "backtest_cache"))
+        self.cache = BacktestCache(cache_dir, self._config)
+        #the year indices and the strategies built by the last run (only those of the trade dates not cached)
+        self.year_indices = None
+        self.strategies = None
+        self.skipped_trade_dates = None
+
+    def run(self):
+        """
+        :return: the strategy index
+        """
+        year_indices = StrategyFactory.load_year_indices(self._config)
+
+        #only the dates with newly listed weeklys can be traded so those are the only ones we key
+        keys = {}
+        cached = {}
+        for year, year_index in year_indices.items():
+            _date_partition = year_index.date_partition
+            keys[year] = BacktestCache.trade_date_keys(_date_partition,
+                                                       _date_partition.dates[_date_partition.new_listing.values])
+            cached[year] = self.cache.hits(year, keys[year])
+
+        factory = StrategyFactory(config=self._config, year_indices=year_indices, skip_trade_dates=cached)
+        self.year_indices = year_indices
+        self.strategies = factory.strategies
+        self.skipped_trade_dates = factory.skipped_trade_dates
+        pnl = PnLEngine(config=self._config)
+        _leg_pnl = pnl.compute_leg_pnl_table(factory.strategies)
+        _new_leg_pnl = dict(tuple(_leg_pnl.groupby("trade_date", sort=False)))
+        _empty = pd.DataFrame({"trade_date": np.array([], dtype="datetime64[ns]"),
+                               "leg_id": np.array([], dtype=np.int64),
+                               "date": np.array([], dtype="datetime64[ns]"),
+                               "opt_pnl": np.array([], dtype=np.float64)})
+        for _col in pnl.hedging.pnl_columns:
+            _empty[_col] = np.array([], dtype=np.float64)
+
+        #merge the new and cached results in trade date order as in the stacked leg table of a full rebuild
+        results = [_empty]
+        for year in factory.strategies:
+            _strategies = factory.strategies[year]
+            for trade_date in sorted(list(_strategies) + factory.skipped_trade_dates[year]):
+                if trade_date in _strategies:
+                    _trade_date_pnl = _new_leg_pnl.get(trade_date, _empty)
+                    self.cache.put(year, trade_date, keys[year][trade_date], _trade_date_pnl, _strategies[trade_date])
+                else:
+                    _trade_date_pnl = self.cache.get(year, trade_date)
+                results.append(_trade_date_pnl)
+            self.cache.flush(year)
+            Instrumentation.log("Rebuilt {} and reused {} cached trade dates for {}".format(len(_strategies),
+                                                                                             len(factory.skipped_trade_dates[year]),
+                                                                                             year))
+
+        with Instrumentation.span("pnl"):
+            total_pnl = PnLEngine.aggregate_leg_pnl(pd.concat(results, axis=0, ignore_index=True))
+            return pnl.create_strategy_index(total_pnl)
+
+    def build_strategies(self):
+        """
+        Completes the strategies of the last run for consumers that need every leg history (e.g. the scenarios) -
+        the strategies built in run are reused and only the trade dates read from the cache are built, from the
+        year indices already loaded
+
+        :return: dict of year -> trade date -> strategy in trade date order as built by a full StrategyFactory
+        """
+        if self.strategies is None:
+            raise ValueError("The incremental backtest has not been run")
+        _n_skipped = sum(len(_dates) for _dates in self.skipped_trade_dates.values())
+        if _n_skipped == 0:
+            return self.strategies
+        Instrumentation.log("Building the strategies of {} trade dates read from the backtest cache".format(_n_skipped))
+        _built = {year: set(_strategies) for year, _strategies in self.strategies.items()}
+        factory = StrategyFactory(config=self._config, year_indices=self.year_indices, skip_trade_dates=_built)
+        strategies = {}
+        for year, _strategies in factory.strategies.items():
+            _strategies = {**_strategies, **self.strategies.get(year, {})}
+            strategies[year] = {trade_date: _strategies[trade_date] for trade_date in sorted(_strategies)}
+        return strategies
@@ -0,0 +1,137 @@
+from strategy.strategy import StrategyFactory
+from pnl.pnl_calculation import PnLEngine
+from pnl.backtest_cache import BacktestCache
+from manager.data import DataManager
+from configuration import ConfigurationFactory
+from utility.instrumentation import Instrumentation
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import copy
+import pandas as pd
+
+#year indices shared with the sweep worker processes - set once per worker by the pool initializer
+_YEAR_INDICES = None
+
+
+def _init_worker(year_indices):
+    global _YEAR_INDICES
+    _YEAR_INDICES = year_indices
+
+
+def _run_variant(config):
+    strategies = StrategyFactory(config=config, year_indices=_YEAR_INDICES).strategies
+    return PnLEngine(config=config).run(strategies=strategies)
+
+
+class SweepEngine:
+    """
+    Runs a grid of strategy parameter variants against the same data. Each year is loaded and indexed once
+    and shared by every variant (inherited by the worker processes rather than pickled per task), and the
+    variants are fanned out across a process pool.
+
+    The grid is a dict of parameter -> list of values with the parameters
+    strat_type, entry_freq, long_short, call_delta_strike_range, put_delta_strike_range,
+    call_delta_strike and put_delta_strike (the last two are the outright strategy delta strikes)
+    """
+
+    PARAMS = ["strat_type", "entry_freq", "long_short", "call_delta_strike_range", "put_delta_strike_range",
+              "call_delta_strike", "put_delta_strike"]
+
+    def __init__(self, config=None, grid=None, n_workers=None):
+        self._init_config(config, grid, n_workers)
+
+    def _init_config(self, config=None, grid=None, n_workers=None):
+        self._config = ConfigurationFactory.create_btest_config() if config is None else config
+        _sweep_config = self._config.get("sweep_config", {})
+        self.grid = _sweep_config.get("grid", {}) if grid is None else grid
+        self.n_workers = _sweep_config.get("n_workers", 1) if n_workers is None else n_workers
+        Instrumentation.configure(self._config.get("instrumentation", {}))
+        _unknown = [_param for _param in self.grid if _param not in self.PARAMS]
+        if _unknown:
+            raise ValueError("Unknown sweep parameters {}".format(_unknown))
+
+    def create_variants(self):
+        """
+        Expands the grid into a list of (params, config) variants. Parameters that do not apply to the
+        variant's strategy type (e.g. outright delta strikes on a multileg strategy) would give identical
+        backtests so such duplicates are dropped
+        """
+        variants = []
+        _seen = set()
+        _names = list(self.grid)
+        for _values in product(*[self.grid[_name] for _name in _names]):
+            params = dict(zip(_names, _values))
+            config = SweepEngine.apply_params(self._config, params)
+            _key = BacktestCache.config_hash(config)
+            if _key in _seen:
+                continue
+            _seen.add(_key)
+            variants.append((params, config))
+        return variants
+
+    @staticmethod
+    def apply_params(config, params):
+        config = copy.deepcopy(config)
+        _bt_config = config["backtest_config"]
+        _trading_params = _bt_config["trading_params"]
+        if "strat_type" in params:
+            _trading_params["strat_type"]["method"] = params["strat_type"]
+        if "entry_freq" in params:
+            _trading_params["entry_freq"] = params["entry_freq"]
+        if "long_short" in params:
+            for _leg_type in ["call_legs", "put_legs"]:
+                _bt_config["multi_leg_strategy"][_leg_type]["long_short"] = params["long_short"]
+                for _leg in _bt_config["outright_strategy"][_leg_type].values():
+                    _leg["long_short"] = params["long_short"]
+        for _leg_type in ["call", "put"]:
+            if "{}_delta_strike_range".format(_leg_type) in params:
+                _bt_config["multi_leg_strategy"]["{}_legs".format(_leg_type)]["delta_strike_range"] = \
+                    list(params["{}_delta_strike_range".format(_leg_type)])
+            if "{}_delta_strike".format(_leg_type) in params:
+                for _leg in _bt_config["outright_strategy"]["{}_legs".format(_leg_type)].values():
+                    _leg["delta_strike"] = params["{}_delta_strike".format(_leg_type)]
+        return config
+
+    def run(self):
+        """
+        :return: tidy dataframe of the strategy indices with one row per variant and date
+        """
+        variants = self.create_variants()
+        Instrumentation.log("Running parameter sweep of {} variants".format(len(variants)))
+        Instrumentation.count("sweep_variants", len(variants))
+        with Instrumentation.span("load_year_indices"):
+            year_indices = StrategyFactory.load_year_indices(self._config)
+
+        with Instrumentation.span("sweep"):
+            if self.n_workers > 1:
+                with ProcessPoolExecutor(max_workers=self.n_workers,
+                                         initializer=_init_worker,
+                                         initargs=(year_indices,)) as pool:
+                    _indices = list(pool.map(_run_variant, [_config for _, _config in variants]))
+            else:
+                _init_worker(year_indices)
+                _indices = [_run_variant(_config) for _, _config in variants]
+
+        results = []
+        for variant_id, ((params, _), strat_index) in enumerate(zip(variants, _indices)):
+            _res = strat_index.reset_index()
+            _res.insert(0, "variant_id", variant_id)
+            for _pos, _param in enumerate(self.grid):
+                #delta strike ranges are stored as tuples so that the column stays hashable for grouping
+                _value = tuple(params[_param]) if isinstance(params[_param], list) else params[_param]
+                _res.insert(_pos + 1, _param, pd.Series([_value] * len(_res), index=_res.index, dtype=object))
+            results.append(_res)
+
+        Instrumentation.log("Finished running parameter sweep")
+        Instrumentation.write_report(DataManager.ROOT_DIR)
+        if not results:
+            return pd.DataFrame(columns=["variant_id"] + list(self.grid) + ["date", "opt_pnl", "dh_pnl"])
+        return pd.concat(results, axis=0, ignore_index=True)
+
+    @staticmethod
+    def pivot_indices(results, column="dh_pnl"):
+        """
+        :return: wide dataframe of the strategy indices of the sweep results with one column per variant, as
+        taken by StrategyMetrics
+        """
+        return results.pivot(index="date", columns="variant_id", values=column)
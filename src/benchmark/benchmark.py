@@ -0,0 +1,180 @@
+##benchmark harness timing each stage of the pipeline on synthetic data and reporting the results as json
+
+from benchmark.synthetic import SyntheticDataGenerator
+from manager.data import DataManager
+from pricing.bs_model import BlackScholes
+from pricing.pricer import Application
+from strategy.strategy import StrategyFactory
+from pnl.pnl_calculation import PnLEngine
+from utility.instrumentation import Instrumentation
+from datetime import datetime
+from tempfile import mkdtemp
+from os.path import join
+import argparse
+import copy
+import json
+import platform
+import shutil
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+
+class BenchmarkSuite:
+    """
+    Times each stage of the pipeline (synthetic data generation, pricing, loading, strategy construction and pnl)
+    along with the black scholes array kernels at a set of scales. For each stage we report the wall time,
+    the number of rows processed, the throughput and optionally the peak traced memory. Tracing slows down the
+    allocations so the memory is measured in a second run of the stage and never in the timed run.
+
+    The stages run with the fixed CONFIG rather than the repo conf so that the timings do not depend on local
+    settings (e.g. incremental pricing) and the logging is silenced
+    """
+
+    CONFIG = {"backtest_config": {"trading_params": {"hold_period": "HTM",
+                                                     "entry_freq": "1B",
+                                                     "dh_params": "1d",
+                                                     "option_expiry_calendar": "weeklies",
+                                                     "strat_type": {"method": "multi_leg_strategy"}},
+                                  "multi_leg_strategy": {"call_legs": {"call_put": "c",
+                                                                       "delta_strike_range": [0.5, 0.05],
+                                                                       "long_short": -1,
+                                                                       "expiry": "1w"},
+                                                         "put_legs": {"call_put": "p",
+                                                                      "delta_strike_range": [-0.05, -0.5],
+                                                                      "long_short": -1,
+                                                                      "expiry": "1w"}}},
+              "data_config": {"prefetch_depth": 1, "downcast_floats": False},
+              "strategy_factory": {"n_workers": 1},
+              "pricer_config": {"n_workers": 1, "chunk_size": 250000, "ingest_chunk_size": 1000000,
+                                "incremental": False},
+              "instrumentation": {"verbosity": 0}}
+
+    def __init__(self, years=("2015",), n_days=(20,), n_strikes=40, trace_memory=True, work_dir=None, seed=0):
+        self.years = [str(yy) for yy in years]
+        self.n_days = list(n_days)
+        self.n_strikes = n_strikes
+        self.trace_memory = trace_memory
+        self.work_dir = work_dir
+        self.seed = seed
+
+    def run(self):
+        report = {"created": str(datetime.now()),
+                  "machine": {"python": platform.python_version(),
+                              "platform": platform.platform(),
+                              "processor": platform.processor(),
+                              "numpy": np.__version__,
+                              "pandas": pd.__version__},
+                  "runs": []}
+        for n_days in self.n_days:
+            report["runs"].append(self._run_scale(n_days))
+        return report
+
+    def _run_scale(self, n_days):
+        _root = mkdtemp(dir=self.work_dir, prefix="bench_")
+        _default_root = DataManager.ROOT_DIR
+        #point the loaders at the synthetic data for the duration of the run
+        DataManager.ROOT_DIR = _root
+        try:
+            config = self._create_config()
+            Instrumentation.configure(config["instrumentation"])
+            stages = {}
+            generator = SyntheticDataGenerator(n_days=n_days, n_strikes=self.n_strikes, seed=self.seed)
+            _rows = {}
+            for yy in self.years:
+                stages["generate_{}".format(yy)], (_, _rows[yy]) = self._time(lambda: generator.write(yy, _root))
+                stages["generate_{}".format(yy)]["rows"] = _rows[yy]
+
+            #pricing of the raw files
+            pricer = Application(config=config)
+            stages["pricer"], _ = self._time(pricer.run, rows=sum(_rows.values()))
+
+            #cold and warm loads of the priced data (the warm load reads the binary cache)
+            _priced_rows = 0
+            _cache_dir = join(_root, "priced_data", ".cache")
+            for yy in self.years:
+                stages["load_cold_{}".format(yy)], data = self._time(
+                    lambda: DataManager.load_priced_exchange_data(yy),
+                    reset=lambda: shutil.rmtree(_cache_dir, ignore_errors=True))
+                stages["load_warm_{}".format(yy)], _ = self._time(
+                    lambda: DataManager.load_priced_exchange_data(yy))
+                stages["load_cold_{}".format(yy)]["rows"] = stages["load_warm_{}".format(yy)]["rows"] = len(data)
+                _priced_rows += len(data)
+
+            #black scholes kernels on the last year of priced data
+            stages["bs_greeks_array"], _ = self._time(lambda: BlackScholes.compute_greeks_array(
+                data["forward_price"].values, data["strike_price"].values, data["dte"].values,
+                data["bs_vol"].values, BlackScholes.is_call_flag(data["cp_flag"].values)), rows=len(data))
+            stages["bs_implied_vol_array"], _ = self._time(lambda: BlackScholes.compute_vol_from_price_array(
+                data["forward_price"].values, data["strike_price"].values, data["dte"].values,
+                data["mid_price"].values, BlackScholes.is_call_flag(data["cp_flag"].values)), rows=len(data))
+
+            #strategy construction and pnl over all of the years
+            stages["strategy_factory"], factory = self._time(lambda: StrategyFactory(config=config),
+                                                             rows=_priced_rows)
+            _n_legs = sum(len(getattr(_strat, _legs, {})) for _year in factory.strategies.values()
+                          for _strat in _year.values() for _legs in ["call_legs", "put_legs"])
+            stages["strategy_factory"]["legs"] = _n_legs
+            stages["pnl_engine"], _ = self._time(lambda: PnLEngine(config=config).run(strategies=factory.strategies),
+                                                 rows=_n_legs)
+
+            return {"scale": {"years": self.years, "n_days": n_days, "n_strikes": self.n_strikes},
+                    "stages": stages}
+        finally:
+            DataManager.ROOT_DIR = _default_root
+            shutil.rmtree(_root, ignore_errors=True)
+
+    def _create_config(self):
+        config = copy.deepcopy(self.CONFIG)
+        config["backtest_config"]["start_date"] = "{}-01-01".format(self.years[0])
+        config["backtest_config"]["end_date"] = "{}-12-31".format(self.years[-1])
+        config["pricer_config"].update({"start_year": int(self.years[0]), "end_year": int(self.years[-1])})
+        return config
+
+    def _time(self, func, rows=None, reset=None):
+        """
+        Times a run of func and then, if tracing memory, runs it again under tracemalloc for the peak memory
+
+        :param reset: called before the memory run to undo the side effects of the timed run e.g. a cache written
+        by a cold load
+        """
+        _start = time.perf_counter()
+        result = func()
+        _seconds = time.perf_counter() - _start
+        stage = {"seconds": _seconds}
+        if self.trace_memory:
+            if reset is not None:
+                reset()
+            tracemalloc.start()
+            try:
+                func()
+                stage["peak_mem_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            finally:
+                tracemalloc.stop()
+        if rows is not None:
+            stage["rows"] = rows
+            stage["rows_per_sec"] = rows / _seconds if _seconds > 0 else None
+        return stage, result
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic option data")
+    parser.add_argument("--years", nargs="+", default=["2015"], help="synthetic data years")
+    parser.add_argument("--days", nargs="+", type=int, default=[20], help="trading days per year, one run per value")
+    parser.add_argument("--strikes", type=int, default=40, help="strikes either side of the atm strike")
+    parser.add_argument("--no-memory", action="store_true", help="do not trace peak memory")
+    parser.add_argument("--output", default=None, help="path of the json report (stdout if not set)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    suite = BenchmarkSuite(years=args.years, n_days=args.days, n_strikes=args.strikes,
+                           trace_memory=not args.no_memory)
+    _report = json.dumps(suite.run(), indent=2)
+    if args.output is None:
+        print(_report)
+    else:
+        with open(args.output, "w") as _output:
+            _output.write(_report)
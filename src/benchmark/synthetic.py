@@ -0,0 +1,113 @@
+from os import makedirs
+from os.path import join
+from pricing.bs_model import BlackScholes
+from utility.instrumentation import Instrumentation
+import pandas as pd
+import numpy as np
+
+
+class SyntheticDataGenerator:
+    """
+    Generates synthetic SPX option chains in the same schema as the raw OptionMetrics files
+    (raw_data/optionMetricsSpx{yyyy}.csv) so the pipeline can be run and timed without the proprietary data.
+
+    The forward follows a random walk, quotes are black prices off a simple skewed smile with a bid/offer
+    spread around them, strikes are stored x1000 and a fraction of the rows are duplicated as in the real data
+    """
+
+    def __init__(self, n_days=None, n_strikes=40, strike_step=5, expiry_weekdays=(4,), expiry_horizon=35,
+                 spot=2000.0, daily_vol=0.01, atm_vol=0.15, duplicate_fraction=1.0, seed=0):
+        self.n_days = n_days
+        self.n_strikes = n_strikes
+        self.strike_step = strike_step
+        self.expiry_weekdays = expiry_weekdays
+        self.expiry_horizon = expiry_horizon
+        self.spot = spot
+        self.daily_vol = daily_vol
+        self.atm_vol = atm_vol
+        self.duplicate_fraction = duplicate_fraction
+        self.seed = seed
+
+    def generate(self, yyyy):
+        """
+        :return: dataframe of one year of raw option data
+        """
+        rng = np.random.default_rng(self.seed + int(yyyy))
+        dates = pd.bdate_range(start="{}-01-01".format(yyyy), end="{}-12-31".format(yyyy))
+        if self.n_days is not None:
+            dates = dates[:self.n_days]
+        forwards = self.spot * np.exp(np.cumsum(rng.normal(0, self.daily_vol, len(dates))))
+        _calendar = pd.date_range(start=dates[0], end=dates[-1] + pd.Timedelta(days=self.expiry_horizon))
+        expiries = _calendar[_calendar.weekday.isin(self.expiry_weekdays)]
+
+        #build every (date, expiry, strike, cp) combination as flat arrays
+        _date_idx, _exdates, _strikes = [], [], []
+        for idx, (date, fwd) in enumerate(zip(dates, forwards)):
+            _atm = self.strike_step * np.round(fwd / self.strike_step)
+            _day_strikes = _atm + self.strike_step * np.arange(-self.n_strikes, self.n_strikes + 1)
+            _day_expiries = expiries[(expiries >= date) & (expiries <= date + pd.Timedelta(days=self.expiry_horizon))]
+            for exdate in _day_expiries:
+                _date_idx.append(np.full(len(_day_strikes), idx))
+                _exdates.append(np.full(len(_day_strikes), exdate.to_datetime64()))
+                _strikes.append(_day_strikes)
+        _date_idx = np.tile(np.concatenate(_date_idx), 2)
+        _exdates = np.tile(np.concatenate(_exdates), 2)
+        _strikes = np.tile(np.concatenate(_strikes), 2)
+        _is_call = np.repeat([True, False], len(_strikes) // 2)
+        _dates = dates.values[_date_idx]
+        _fwd = np.round(forwards[_date_idx], 4)
+        _dte = (_exdates - _dates).astype("timedelta64[D]").astype(np.float64)
+
+        #price off a skewed smile - expired options are priced with a small time value to keep quotes positive
+        _moneyness = np.log(_strikes / _fwd)
+        _vol = self.atm_vol - 0.3 * _moneyness + 0.5 * _moneyness ** 2
+        _mid = BlackScholes.compute_price_array(_fwd, _strikes, np.maximum(_dte, 0.5), _vol, _is_call)
+        _mid = np.maximum(_mid, 0.05)
+        _spread = np.maximum(0.05, 0.02 * _mid)
+
+        data = pd.DataFrame({"secid": 108105,
+                             "date": SyntheticDataGenerator._to_yyyymmdd(_dates),
+                             "symbol": "SPXW",
+                             "exdate": SyntheticDataGenerator._to_yyyymmdd(_exdates),
+                             "last_date": 0,
+                             "cp_flag": np.where(_is_call, "C", "P"),
+                             "strike_price": (_strikes * 1000).astype(np.int64),
+                             "best_bid": np.round(np.maximum(_mid - _spread, 0), 2),
+                             "best_offer": np.round(_mid + _spread, 2),
+                             "volume": rng.integers(0, 1000, len(_strikes)),
+                             "open_interest": rng.integers(0, 10000, len(_strikes)),
+                             "impl_volatility": np.round(_vol, 6),
+                             "optionid": np.arange(len(_strikes)),
+                             "forward_price": _fwd,
+                             "index_flag": 1,
+                             "issuer": "CBOE",
+                             "exercise_style": "E",
+                             "div_convention": "I"})
+
+        #the real data has duplicate rows for the same contract and date
+        _n_dup = int(len(data) * self.duplicate_fraction)
+        _dup_rows = np.sort(rng.choice(len(data), size=_n_dup, replace=False))
+        data = pd.concat([data, data.iloc[_dup_rows]], axis=0)
+        data = data.iloc[np.argsort(np.concatenate([np.arange(len(data) - _n_dup), _dup_rows]), kind="stable")]
+        return data.reset_index(drop=True)
+
+    @staticmethod
+    def _to_yyyymmdd(dates):
+        #the raw files store dates as yyyymmdd integers
+        dates = pd.DatetimeIndex(dates)
+        return (dates.year * 10000 + dates.month * 100 + dates.day).values
+
+    def write(self, yyyy, root_dir):
+        """
+        Writes one year of raw data to root_dir/raw_data in the loader's file naming
+
+        :return: tuple of (file path, number of rows)
+        """
+        _raw_dir = join(root_dir, "raw_data")
+        makedirs(_raw_dir, exist_ok=True)
+        data = self.generate(yyyy)
+        _path = join(_raw_dir, "optionMetricsSpx{}.csv".format(yyyy))
+        data.to_csv(_path, index=False)
+        Instrumentation.log("Successfully generated {} rows of synthetic data {}".format(len(data), _path),
+                            level=Instrumentation.YEAR)
+        return _path, len(data)
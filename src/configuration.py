@@ -4,17 +4,20 @@ from datetime import datetime
 class ConfigurationFactory:
 
     @staticmethod
-    def create_btest_config():
+    def create_btest_config(conf_path=None):
+        """
+        Loads the backtest config from conf_path (conf/backtest_config.json if not set) - raises rather than
+        returning None if the config does not exist or is not valid json, so no caller falls back on another config
+        """
         _root_dir = dirname(dirname(__file__))
-        _conf_path = join(_root_dir, "conf", "backtest_config.json")
-        if exists(_conf_path):
-            try:
-                with open(_conf_path) as _conf:
-                    conf = json.load(_conf)
-                    print("{} - Successfully loaded configuration file".format(datetime.now()))
-                    return conf
-            except Exception as e:
-                print(str(e))
-        else:
-            print("Error loading backtest configuration please check /conf directory")
-
+        _conf_path = join(_root_dir, "conf", "backtest_config.json") if conf_path is None else conf_path
+        if not exists(_conf_path):
+            raise FileNotFoundError("Backtest configuration {} does not exist please check /conf directory".format(
+                _conf_path))
+        try:
+            with open(_conf_path) as _conf:
+                conf = json.load(_conf)
+        except ValueError as e:
+            raise ValueError("Error loading backtest configuration {}: {}".format(_conf_path, e)) from e
+        print("{} - Successfully loaded configuration file".format(datetime.now()))
+        return conf
@@ -1,11 +1,29 @@
-from app.application import BacktestingEngine
+from configuration import ConfigurationFactory
+import argparse
+import sys
+
 
 def _configure_log():
     pass
 
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Run the SPX weeklys backtest")
+    parser.add_argument("--config", default=None, help="path of the backtest config (conf/backtest_config.json if not set)")
+    parser.add_argument("--headless", action="store_true",
+                        help="write the strategy index and metrics to files instead of plotting")
+    parser.add_argument("--output-dir", default=None, help="directory of the headless output (output/ if not set)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = _parse_args()
     try:
-        spx_bt = BacktestingEngine()
+        config = ConfigurationFactory.create_btest_config(conf_path=args.config)
+        #imported here so that --help (or a bad config) does not pay for loading the backtest
+        from app.application import BacktestingEngine
+        spx_bt = BacktestingEngine(config=config, headless=args.headless, output_dir=args.output_dir)
         spx_bt.run()
     except Exception as e:
-        print(str(e))
\ No newline at end of file
+        print(str(e))
+        sys.exit(1)
@@ -0,0 +1,97 @@
+from os import stat
+from os.path import exists, join
+from datetime import datetime
+from utility.atomic_write import AtomicWrite
+import json
+import pandas as pd
+import numpy as np
+
+
+class ColumnarCache:
+    """
+    Binary columnar cache for csv data - each column is stored as its own .npy file so that it can be memory
+    mapped on load. Datetime columns keep their datetime64 dtype and string columns are stored as categorical
+    codes, so loading from the cache skips all of the csv text parsing.
+
+    The cache is keyed on the mtime and size of the source file and is rebuilt whenever the source changes
+    """
+
+    _META = "meta.json"
+    _VERSION = 1
+
+    @staticmethod
+    def fingerprint(source_path):
+        _stat = stat(source_path)
+        return {"mtime_ns": _stat.st_mtime_ns, "size": _stat.st_size}
+
+    @staticmethod
+    def is_valid(cache_dir, source_path, downcast_floats=False):
+        meta = ColumnarCache._read_meta(cache_dir)
+        if meta is None:
+            return False
+        return meta.get("version") == ColumnarCache._VERSION and \
+               meta.get("source") == ColumnarCache.fingerprint(source_path) and \
+               meta.get("downcast_floats") == downcast_floats
+
+    @staticmethod
+    def write(data, cache_dir, source_path, downcast_floats=False):
+        """
+        Writes each column of the dataframe and the meta file to cache_dir
+        """
+        with AtomicWrite.directory(cache_dir) as _tmp_dir:
+            columns = []
+            for idx, name in enumerate(data.columns):
+                col = data[name]
+                _col_meta = {"name": name, "file": "col_{}.npy".format(idx)}
+                if pd.api.types.is_datetime64_any_dtype(col.dtype):
+                    _col_meta["kind"] = "datetime"
+                    values = col.values.astype("datetime64[ns]")
+                elif pd.api.types.is_numeric_dtype(col.dtype) or pd.api.types.is_bool_dtype(col.dtype):
+                    _col_meta["kind"] = "numeric"
+                    values = col.values
+                    if downcast_floats and values.dtype == np.float64:
+                        values = values.astype(np.float32)
+                else:
+                    #strings (e.g. cp_flag) are stored as categorical codes with the categories in the meta file
+                    _col_meta["kind"] = "category"
+                    _cat = pd.Categorical(col)
+                    _col_meta["categories"] = [str(c) for c in _cat.categories]
+                    values = _cat.codes
+                np.save(join(_tmp_dir, _col_meta["file"]), np.ascontiguousarray(values), allow_pickle=False)
+                columns.append(_col_meta)
+
+            meta = {"version": ColumnarCache._VERSION,
+                    "source": ColumnarCache.fingerprint(source_path),
+                    "downcast_floats": downcast_floats,
+                    "n_rows": len(data),
+                    "columns": columns,
+                    "created": str(datetime.now())}
+            with open(join(_tmp_dir, ColumnarCache._META), "w") as _meta:
+                json.dump(meta, _meta)
+
+    @staticmethod
+    def read(cache_dir, mmap=True):
+        """
+        Rebuilds the dataframe from the cached columns. With mmap the column arrays are memory mapped
+        copy-on-write so the pages are only read when used and never written back to the cache
+        """
+        meta = ColumnarCache._read_meta(cache_dir)
+        _mmap_mode = "c" if mmap else None
+        columns = {}
+        for _col_meta in meta["columns"]:
+            values = np.load(join(cache_dir, _col_meta["file"]), mmap_mode=_mmap_mode, allow_pickle=False)
+            if _col_meta["kind"] == "category":
+                values = pd.Categorical.from_codes(values, categories=_col_meta["categories"])
+            columns[_col_meta["name"]] = values
+        return pd.DataFrame(columns, copy=False)
+
+    @staticmethod
+    def _read_meta(cache_dir):
+        _meta_path = join(cache_dir, ColumnarCache._META)
+        if not exists(_meta_path):
+            return None
+        try:
+            with open(_meta_path) as _meta:
+                return json.load(_meta)
+        except ValueError:
+            return None
@@ -1,17 +1,30 @@
-from os.path import dirname, join
+from os.path import dirname, join, splitext
 import pandas as pd
 import numpy as np
-from datetime import datetime
+from manager.cache import ColumnarCache
+from manager.index import YearIndex
+from utility.instrumentation import Instrumentation
 
 class DataManager:
 
+    #root directory holding the raw_data and priced_data folders
+    ROOT_DIR = dirname(dirname(dirname(__file__)))
+
+    #columns of the raw optionmetrics files needed for pricing along with their dtypes
+    RAW_COLUMNS = {"date": str,
+                   "exdate": str,
+                   "cp_flag": str,
+                   "strike_price": np.float64,
+                   "best_bid": np.float64,
+                   "best_offer": np.float64,
+                   "forward_price": np.float64}
+
     @staticmethod
     def load_exchange_data(yyyy):
-        root_dir = dirname(dirname(dirname(__file__)))
+        root_dir = DataManager.ROOT_DIR
         _fname = "optionMetricsSpx{}.csv"
         data_path = join(root_dir, "raw_data", _fname.format(yyyy))
-        print("{} - Loading exchange data {}".format(datetime.now(),
-                                                     _fname.format(yyyy)))
+        Instrumentation.log("Loading exchange data {}".format(_fname.format(yyyy)), level=Instrumentation.YEAR)
         data = pd.read_csv(data_path)
         try:
             data.drop(columns=["secid", "optionid", "index_flag", "issuer", "exercise_style", "volume", "div_convention", "last_date"],
@@ -23,8 +36,8 @@ class DataManager:
             except Exception as e:
                 data.drop(columns=["optionid", "index_flag", "issuer", "exercise_style", "volume"],
                           inplace=True)
-            print("{} - Successfully dropped redundant columns from {}".format(datetime.now(),
-                                                                               _fname.format(yyyy)))
+            Instrumentation.log("Successfully dropped redundant columns from {}".format(_fname.format(yyyy)),
+                                level=Instrumentation.YEAR)
         data[["strike_price"]] /= 1000
 
         #create mid price
@@ -48,18 +61,97 @@ class DataManager:
         return data
 
     @staticmethod
-    def load_priced_exchange_data(yyyy, option_expiry_calendar="weeklies"):
+    def stream_exchange_data(yyyy, opt_expiry_filter=None, chunksize=1000000, columns=None):
+        """
+        Streams the raw exchange data in chunks, reading only the required columns with explicit dtypes.
+        The days to expiry and forward price filters are applied to each chunk as it is read so the peak memory
+        is bounded by the chunk size rather than the size of the file
+
+        :return: generator of filtered dataframe chunks
+        """
+        root_dir = DataManager.ROOT_DIR
+        _fname = "optionMetricsSpx{}.csv"
+        data_path = join(root_dir, "raw_data", _fname.format(yyyy))
+        columns = DataManager.RAW_COLUMNS if columns is None else columns
+        Instrumentation.log("Streaming exchange data {}".format(_fname.format(yyyy)), level=Instrumentation.YEAR)
+        _reader = pd.read_csv(data_path,
+                              usecols=list(columns),
+                              dtype=columns,
+                              chunksize=chunksize)
+        for chunk in _reader:
+            Instrumentation.count("raw_rows_read", len(chunk))
+            #parse dates and compute days to expiry
+            chunk["date"] = pd.to_datetime(chunk["date"], format="%Y%m%d")
+            chunk["exdate"] = pd.to_datetime(chunk["exdate"], format="%Y%m%d")
+            chunk["dte"] = (chunk["exdate"] - chunk["date"]).dt.days.astype(np.float64)
+            #We drop any rows with negative forward price and only preserve the data with expiry dates < option expiry
+            _mask = chunk["forward_price"] > 0
+            if opt_expiry_filter is not None:
+                _mask &= chunk["dte"] < opt_expiry_filter
+            chunk = chunk[_mask].copy()
+            chunk["strike_price"] /= 1000
+
+            #create mid price
+            chunk["mid_price"] = (chunk["best_bid"] + chunk["best_offer"]) / 2
+            yield chunk
+
+    @staticmethod
+    def load_exchange_data_streaming(yyyy, opt_expiry_filter=None, chunksize=1000000, columns=None):
+        chunks = list(DataManager.stream_exchange_data(yyyy,
+                                                       opt_expiry_filter=opt_expiry_filter,
+                                                       chunksize=chunksize,
+                                                       columns=columns))
+        data = pd.concat(chunks, axis=0, ignore_index=True)
+        Instrumentation.count("rows_loaded", len(data))
+        Instrumentation.log("Successfully streamed {} rows of exchange data {}".format(len(data),
+                                                                                     "optionMetricsSpx{}.csv".format(yyyy)),
+                            level=Instrumentation.YEAR)
+        return data
+
+    @staticmethod
+    def get_priced_data_path(yyyy, option_expiry_calendar="weeklies"):
+        return join(DataManager.ROOT_DIR, "priced_data", "priced_{}_optionMetricsSpx{}.csv".format(option_expiry_calendar,
+                                                                                                   yyyy))
+
+    @staticmethod
+    def load_priced_exchange_data(yyyy, option_expiry_calendar="weeklies", use_cache=True, downcast_floats=False):
         #filepaths
-        root_dir = dirname(dirname(dirname(__file__)))
+        root_dir = DataManager.ROOT_DIR
         _fname = "priced_{}_optionMetricsSpx{}.csv"
-        data_path = join(root_dir, "priced_data", _fname.format(option_expiry_calendar, yyyy))
+        data_path = DataManager.get_priced_data_path(yyyy, option_expiry_calendar)
+
+        if use_cache:
+            #the binary cache sits next to the priced data and is rebuilt whenever the csv changes
+            cache_dir = join(root_dir, "priced_data", ".cache", splitext(_fname.format(option_expiry_calendar, yyyy))[0])
+            if ColumnarCache.is_valid(cache_dir, data_path, downcast_floats=downcast_floats):
+                Instrumentation.log("Loading exchange data {} from cache".format(_fname.format(option_expiry_calendar, yyyy)),
+                                    level=Instrumentation.YEAR)
+                data = ColumnarCache.read(cache_dir)
+                Instrumentation.count("rows_loaded", len(data))
+                return data
 
-        print("{} - Loading exchange data {}".format(datetime.now(),
-                                                     _fname.format(option_expiry_calendar, yyyy)))
+        Instrumentation.log("Loading exchange data {}".format(_fname.format(option_expiry_calendar, yyyy)),
+                            level=Instrumentation.YEAR)
         data = pd.read_csv(data_path)
+        Instrumentation.count("rows_loaded", len(data))
         #parse dates
         data["date"] = pd.to_datetime(data["date"], format="%Y-%m-%d")
         data["exdate"] = pd.to_datetime(data["exdate"], format="%Y-%m-%d")
 
+        if use_cache:
+            ColumnarCache.write(data, cache_dir, data_path, downcast_floats=downcast_floats)
+            Instrumentation.log("Successfully cached exchange data {}".format(_fname.format(option_expiry_calendar, yyyy)),
+                                level=Instrumentation.YEAR)
+            #read back from the cache so that a cold and a warm load return the same dtypes
+            return ColumnarCache.read(cache_dir)
+
         return data
 
+    @staticmethod
+    def load_year_index(yyyy, option_expiry_calendar="weeklies", downcast_floats=False):
+        """
+        Loads a year of priced data and builds its contract index and date partition
+        """
+        data = DataManager.load_priced_exchange_data(yyyy, option_expiry_calendar=option_expiry_calendar,
+                                                     downcast_floats=downcast_floats)
+        return YearIndex(data)
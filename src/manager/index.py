@@ -0,0 +1,236 @@
+from utility.instrumentation import Instrumentation
+import hashlib
+import pandas as pd
+import numpy as np
+
+
+class ContractIndex:
+    """
+    Index of the option contracts in a year of priced data keyed on (exdate, strike_price, cp_flag).
+
+    The data is sorted once so that the rows of each contract are contiguous (keeping their original order)
+    and the duplicate rows for the same dte are dropped, so the history of a contract is a single slice
+    which we look up in O(1) rather than masking the whole year for every leg.
+
+    The sorted year is held as a column store of numpy arrays which is shared by all the legs of the year -
+    a leg only keeps the row offsets of its contract into the store
+    """
+
+    KEYS = ["exdate", "strike_price", "cp_flag"]
+
+    def __init__(self, data):
+        self._init_index(data)
+
+    def _init_index(self, data):
+        _exdate = data["exdate"].values
+        _strike = data["strike_price"].values
+        _cp_codes, _ = pd.factorize(data["cp_flag"])
+        #np.lexsort is stable so the rows of a contract keep the order they have in the data
+        _order = np.lexsort((_cp_codes, _strike, _exdate))
+        _sorted = data.iloc[_order]
+        # the data has duplicate rows which is annoying - we drop them here
+        # note we had dte 4,4,3,3,2,2,1,1,0 so we keep the last row for each dte of a contract
+        _duplicated = _sorted.duplicated(subset=self.KEYS + ["dte"], keep="last")
+        Instrumentation.count("duplicates_dropped", _duplicated.sum())
+        _sorted = _sorted[~_duplicated]
+
+        #the shared column store along with the original row labels
+        self.columns = {_col: _sorted[_col].values for _col in _sorted.columns}
+        self._labels = _sorted.index.values
+        self.n_rows = len(_sorted)
+
+        #find the first row of each contract and store the slice of each contract against its key
+        _exdate = self.columns["exdate"]
+        _strike = self.columns["strike_price"]
+        _cp_flag = np.asarray(self.columns["cp_flag"], dtype=str)
+        _new_contract = np.ones(self.n_rows, dtype=bool)
+        _new_contract[1:] = (_exdate[1:] != _exdate[:-1]) | (_strike[1:] != _strike[:-1]) | (_cp_flag[1:] != _cp_flag[:-1])
+        _starts = np.flatnonzero(_new_contract)
+        _stops = np.append(_starts[1:], self.n_rows)
+        #the slices of every contract in store order
+        self.contract_starts, self.contract_stops = _starts, _stops
+        self._offsets = {ContractIndex.key(e, k, c): (start, stop) for e, k, c, start, stop in zip(_exdate[_starts],
+                                                                                                   _strike[_starts],
+                                                                                                   _cp_flag[_starts],
+                                                                                                   _starts,
+                                                                                                   _stops)}
+
+    @staticmethod
+    def key(exdate, strike, cp_flag):
+        return pd.Timestamp(exdate), float(strike), str(cp_flag)
+
+    def get_offsets(self, exdate, strike, cp_flag):
+        """
+        :return: the (start, stop) row offsets of the contract in the column store, an empty slice if not listed
+        """
+        return self._offsets.get(ContractIndex.key(exdate, strike, cp_flag), (0, 0))
+
+    def get_frame(self, start, stop, columns=None):
+        """
+        Materialises the rows [start, stop) of the column store as a dataframe
+        """
+        columns = list(self.columns) if columns is None else columns
+        return pd.DataFrame({_col: self.columns[_col][start:stop] for _col in columns},
+                            index=self._labels[start:stop])
+
+    def take(self, rows, columns):
+        """
+        :return: dict of column -> values at the given row positions of the column store
+        """
+        return {_col: self.columns[_col][rows] for _col in columns}
+
+    def get_leg_data(self, exdate, strike, cp_flag):
+        """
+        :return: the deduplicated history of the contract ordered as in the original data
+        """
+        start, stop = self.get_offsets(exdate, strike, cp_flag)
+        return self.get_frame(start, stop)
+
+
+class DatePartition:
+    """
+    Partition of a year of priced data by trade date.
+
+    The data is sorted by date once (keeping the original row order within each date) so that the rows of a
+    trade date are a single slice. The per date max dte and the new weekly listing flags are computed for every
+    date at the same time rather than rescanning the year for each candidate trade date
+    """
+
+    def __init__(self, data):
+        self._init_partition(data)
+
+    def _init_partition(self, data):
+        _order = np.argsort(data["date"].values, kind="stable")
+        self.data = data.iloc[_order]
+        _dates = self.data["date"].values
+        _dte = self.data["dte"].values
+
+        _unique_dates, _starts = np.unique(_dates, return_index=True)
+        _stops = np.append(_starts[1:], len(_dates))
+        self.dates = pd.DatetimeIndex(_unique_dates)
+        self._offsets = dict(zip(self.dates, zip(_starts, _stops)))
+        self._fingerprints = {}
+
+        #the new leg maturity is the max dte of the whole year i.e. the dte of a newly listed weekly
+        self.max_dte = _dte.max() if len(_dte) else np.nan
+        if len(_dates):
+            self.date_max_dte = pd.Series(np.maximum.reduceat(_dte, _starts), index=self.dates)
+            #a date lists new weeklys when the rows at the new leg maturity are the most common on that date
+            _n_new = np.add.reduceat((_dte == self.max_dte).astype(np.int64), _starts)
+            self.new_listing = pd.Series(_n_new > (_stops - _starts) - _n_new, index=self.dates)
+        else:
+            self.date_max_dte = pd.Series(dtype=float)
+            self.new_listing = pd.Series(dtype=bool)
+
+    def date_fingerprints(self, columns):
+        """
+        Hashes the rows of each date over the given columns so that a change to any of the rows of a date
+        (or a newly added date) can be detected without comparing the data itself
+
+        :return: series of date -> hex digest of the date's rows
+        """
+        _columns = tuple(columns)
+        if _columns not in self._fingerprints:
+            _row_hashes = pd.util.hash_pandas_object(self.data[list(_columns)], index=False).values
+            self._fingerprints[_columns] = pd.Series([hashlib.sha1(_row_hashes[start:stop].tobytes()).hexdigest()
+                                                      for start, stop in self._offsets.values()],
+                                                     index=self.dates, dtype=object)
+        return self._fingerprints[_columns]
+
+    def get(self, date):
+        """
+        :return: the rows of the trade date in their original order, an empty frame if the date is not listed
+        """
+        start, stop = self._offsets.get(pd.Timestamp(date), (0, 0))
+        return self.data.iloc[start:stop]
+
+    def get_many(self, dates):
+        """
+        :return: the rows of the trade dates concatenated in the order of the dates
+        """
+        return self.data.iloc[DatePartition.rows(self._offsets, dates)]
+
+    @staticmethod
+    def rows(offsets, dates):
+        """
+        :return: the row positions of the dates given the (start, stop) offsets of each date
+        """
+        _slices = [offsets.get(pd.Timestamp(date), (0, 0)) for date in dates]
+        return np.concatenate([np.arange(start, stop) for start, stop in _slices] + [np.zeros(0, dtype=np.int64)])
+
+    def nearest_date(self, date):
+        """
+        :return: the trade date in the data nearest to date
+        """
+        date = pd.Timestamp(date)
+        _idx = self.dates.searchsorted(date)
+        if _idx == 0:
+            return self.dates[0]
+        if _idx == len(self.dates):
+            return self.dates[-1]
+        _before, _after = self.dates[_idx - 1], self.dates[_idx]
+        return _before if date - _before <= _after - date else _after
+
+
+class StrikeIndex:
+    """
+    The listed strikes of each bucket (e.g. trade date and call/put) of a set of rows sorted once, so that the
+    listed strike nearest to each of an array of strikes is found with a single searchsorted rather than masking
+    the rows for every lookup. Where a strike is listed on more than one row of a bucket (e.g. for several
+    expiries) the first or last of the rows is kept
+    """
+
+    def __init__(self, buckets, strikes, keep="first"):
+        self._init_index(np.asarray(buckets, dtype=np.int64), np.asarray(strikes, dtype=float), keep)
+
+    def _init_index(self, buckets, strikes, keep):
+        #np.lexsort is stable so the rows of a strike keep their order
+        _order = np.lexsort((strikes, buckets))
+        _buckets, _strikes = buckets[_order], strikes[_order]
+        _new_strike = np.ones(len(_order), dtype=bool)
+        _new_strike[1:] = (_buckets[1:] != _buckets[:-1]) | (_strikes[1:] != _strikes[:-1])
+        if keep == "first":
+            _keep = _new_strike
+        else:
+            #the last row of a strike is the row before the first row of the next strike
+            _keep = np.ones(len(_order), dtype=bool)
+            _keep[:-1] = _new_strike[1:]
+        self.rows, self.buckets, self.strikes = _order[_keep], _buckets[_keep], _strikes[_keep]
+        #the strikes of every bucket are offset so that a single sorted key orders by bucket then strike
+        self._min_strike = self.strikes.min() if len(self.strikes) else 0.
+        self._scale = (self.strikes.max() - self._min_strike + 1) if len(self.strikes) else 1.
+        self._keys = self._key(self.buckets, self.strikes)
+
+    def _key(self, buckets, strikes):
+        _strikes = np.clip(strikes, self._min_strike, self._min_strike + self._scale - 1)
+        return buckets * self._scale + (_strikes - self._min_strike)
+
+    def nearest(self, buckets, strikes):
+        """
+        :return: the row of the nearest listed strike of the bucket for each strike, -1 if the bucket has no
+        strikes (or the strike is nan)
+        """
+        buckets, strikes = np.asarray(buckets, dtype=np.int64), np.asarray(strikes, dtype=float)
+        _lo = np.searchsorted(self.buckets, buckets, side="left")
+        _hi = np.searchsorted(self.buckets, buckets, side="right")
+        _found = (_hi > _lo) & ~np.isnan(strikes)
+        if not _found.any():
+            return np.full(len(buckets), -1, dtype=np.int64)
+        _pos = np.searchsorted(self._keys, self._key(buckets, np.where(_found, strikes, self._min_strike)))
+        #the listed strikes either side of the strike - an exact match is the strike above
+        _below = np.where(_found, np.clip(_pos - 1, _lo, _hi - 1), 0)
+        _above = np.where(_found, np.clip(_pos, _lo, _hi - 1), 0)
+        _nearest = np.where(np.abs(self.strikes[_above] - strikes) < np.abs(self.strikes[_below] - strikes),
+                            _above, _below)
+        return np.where(_found, self.rows[_nearest], -1)
+
+
+class YearIndex:
+    """
+    The contract index and date partition of a year of priced data - built once and shared by every strategy
+    (and every backtest) that trades the year
+    """
+
+    def __init__(self, data):
+        self.contract_index = ContractIndex(data)
+        self.date_partition = DatePartition(data)
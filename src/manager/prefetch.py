@@ -0,0 +1,73 @@
+from queue import Queue
+from threading import Semaphore, Thread, Event
+
+
+class YearPrefetcher:
+    """
+    Loads the years of data in a background thread ahead of the year being processed, so the load (reading
+    and parsing the files and building the year index) of year N + 1 overlaps with building the strategies of
+    year N.
+
+    At most depth years are loaded ahead of the consumer which caps the memory held by the prefetched data -
+    with a depth of 0 the years are loaded in the calling thread when they are asked for
+    """
+
+    def __init__(self, years, load, depth=1):
+        self._years = list(years)
+        self._load = load
+        self.depth = depth
+        self._queue = Queue()
+        self._next = 0
+        self._stopped = Event()
+        self._thread = None
+        if self.depth > 0:
+            self._slots = Semaphore(self.depth)
+            self._thread = Thread(target=self._run, name="year-prefetch", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for year in self._years:
+            #wait until the consumer has taken one of the prefetched years
+            self._slots.acquire()
+            if self._stopped.is_set():
+                return
+            try:
+                self._queue.put((year, self._load(year), None))
+            except Exception as e:
+                self._queue.put((year, None, e))
+
+    def get(self, year):
+        """
+        :return: the loaded data of the year - the years must be asked for in the order they were given
+        """
+        if year != self._years[self._next]:
+            raise ValueError("Expected year {} but got {}".format(self._years[self._next], year))
+        self._next += 1
+        if self._thread is None:
+            return self._load(year)
+        _year, data, error = self._queue.get()
+        self._slots.release()
+        if error is not None:
+            raise error
+        return data
+
+    def __iter__(self):
+        for year in self._years[self._next:]:
+            yield year, self.get(year)
+
+    def close(self):
+        """
+        Stops the prefetching - a load in progress is finished but its result is dropped
+        """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._slots.release()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,97 @@
+from multiprocessing import shared_memory
+from manager.index import DatePartition
+import numpy as np
+import pandas as pd
+
+
+class SharedYearData:
+    """
+    The date partitioned columns of a year of priced data copied once into shared memory so that worker
+    processes can read the rows of any trade date without the year being pickled to them.
+
+    The owner creates the blocks and passes the small descriptor to the workers, which attach to the blocks
+    zero copy (see SharedYearView). String columns (e.g. cp_flag) are stored as categorical codes
+    """
+
+    COLUMNS = ["date", "exdate", "strike_price", "cp_flag", "dte", "forward_price", "bs_vol", "bs_delta"]
+
+    def __init__(self, date_partition, columns=None):
+        self._init_blocks(date_partition, self.COLUMNS if columns is None else columns)
+
+    def _init_blocks(self, date_partition, columns):
+        self._blocks = []
+        _columns = {}
+        for _col in columns:
+            values = date_partition.data[_col]
+            _col_meta = {}
+            if pd.api.types.is_datetime64_any_dtype(values.dtype) or pd.api.types.is_numeric_dtype(values.dtype):
+                values = np.ascontiguousarray(values.values)
+            else:
+                _cat = pd.Categorical(values)
+                _col_meta["categories"] = [str(c) for c in _cat.categories]
+                values = np.ascontiguousarray(_cat.codes)
+            #shared memory blocks cannot be empty
+            _block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=_block.buf)[:] = values
+            self._blocks.append(_block)
+            _col_meta.update({"block": _block.name, "dtype": values.dtype.str, "shape": values.shape})
+            _columns[_col] = _col_meta
+        self.descriptor = {"columns": _columns,
+                           "offsets": date_partition._offsets,
+                           "max_dte": date_partition.max_dte}
+
+    def close(self):
+        """
+        Frees the shared memory - the workers must have finished with the year
+        """
+        for _block in self._blocks:
+            _block.close()
+            _block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SharedYearView:
+    """
+    Worker side view of a SharedYearData - the column arrays are backed by the shared memory blocks
+    """
+
+    def __init__(self, descriptor):
+        self._blocks = []
+        self.columns = {}
+        for _col, _col_meta in descriptor["columns"].items():
+            #the pool workers share the resource tracker of the owner which unlinks the blocks
+            _block = shared_memory.SharedMemory(name=_col_meta["block"])
+            values = np.ndarray(tuple(_col_meta["shape"]), dtype=np.dtype(_col_meta["dtype"]), buffer=_block.buf)
+            if "categories" in _col_meta:
+                values = pd.Categorical.from_codes(values, categories=_col_meta["categories"])
+            self.columns[_col] = values
+            self._blocks.append(_block)
+        self._offsets = descriptor["offsets"]
+        self.max_dte = descriptor["max_dte"]
+        self.block_names = tuple(_col_meta["block"] for _col_meta in descriptor["columns"].values())
+
+    def get(self, date):
+        """
+        :return: the rows of the trade date as a dataframe (copied out of the shared columns)
+        """
+        start, stop = self._offsets.get(pd.Timestamp(date), (0, 0))
+        return pd.DataFrame({_col: values[start:stop] for _col, values in self.columns.items()})
+
+    def get_many(self, dates):
+        """
+        :return: the rows of the trade dates concatenated in the order of the dates
+        """
+        _rows = DatePartition.rows(self._offsets, dates)
+        return pd.DataFrame({_col: values[_rows] for _col, values in self.columns.items()})
+
+    def close(self):
+        self.columns = {}
+        for _block in self._blocks:
+            _block.close()
+        self._blocks = []
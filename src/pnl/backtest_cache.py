@@ -0,0 +1,151 @@
+from os import makedirs
+from os.path import exists, join
+from datetime import datetime
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from pnl.hedging import HedgingEngine
+from utility.atomic_write import AtomicWrite
+
+
+class BacktestCache:
+    """
+    Persistent cache of the per trade date backtest results - the legs built on each trade date and the tick pnl
+    of each of those legs.
+
+    Each trade date is keyed on a fingerprint of the data rows its strategy depends on (the rows from the trade
+    date up to the expiry of the newly listed legs) and the cache is split by a hash of the config sections that
+    affect the backtest, so a rerun only has to rebuild the trade dates whose data or config has changed
+    """
+
+    _META = "meta.json"
+    _VERSION = 2
+
+    #columns of the priced data that the strategies and their (sized) pnl depend on
+    DATA_COLUMNS = ["date", "exdate", "strike_price", "cp_flag", "dte", "forward_price", "bs_vol", "bs_delta",
+                    "bs_price", "bs_vega"]
+    PNL_COLUMNS = ["leg_id", "date", "opt_pnl", "dh_pnl"]
+    LEG_COLUMNS = ["leg_type", "leg", "exp_date", "strike", "opt_type"]
+
+    def __init__(self, cache_dir, config):
+        self.config_hash = BacktestCache.config_hash(config)
+        #the leg pnl has a dh pnl column for each of the hedge schedules
+        _dh_params = config["backtest_config"]["trading_params"].get("dh_params", "1d")
+        self.pnl_columns = self.PNL_COLUMNS[:-1] + HedgingEngine(_dh_params).pnl_columns
+        self.cache_dir = join(cache_dir, self.config_hash)
+        #year -> dict of trade date -> key of the cached results
+        self._meta = {}
+
+    @staticmethod
+    def config_hash(config):
+        #only the trading params and the section of the strategy type being traded affect the backtest
+        _bt_config = config["backtest_config"]
+        _strat_type = _bt_config["trading_params"]["strat_type"]["method"]
+        _key = json.dumps([_bt_config["trading_params"], _bt_config[_strat_type]], sort_keys=True)
+        return hashlib.sha1(_key.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def trade_date_keys(date_partition, trade_dates):
+        """
+        The legs of a trade date are the newly listed weeklys so the strategy only depends on the rows from the
+        trade date up to their expiry i.e. trade date + max dte
+
+        :return: dict of trade date -> key of the data the trade date depends on
+        """
+        _fingerprints = date_partition.date_fingerprints(BacktestCache.DATA_COLUMNS).values
+        keys = {}
+        if not len(trade_dates):
+            return keys
+        _window = pd.Timedelta(days=float(date_partition.max_dte))
+        _starts = date_partition.dates.searchsorted(trade_dates)
+        _stops = date_partition.dates.searchsorted(trade_dates + _window, side="right")
+        for trade_date, start, stop in zip(trade_dates, _starts, _stops):
+            _hash = hashlib.sha1("{}|{}".format(BacktestCache._VERSION, date_partition.max_dte).encode())
+            for _fingerprint in _fingerprints[start:stop]:
+                _hash.update(_fingerprint.encode())
+            keys[trade_date] = _hash.hexdigest()
+        return keys
+
+    def _year_dir(self, yyyy):
+        return join(self.cache_dir, str(yyyy))
+
+    def _result_path(self, yyyy, trade_date):
+        return join(self._year_dir(yyyy), "{}.npz".format(pd.Timestamp(trade_date).strftime("%Y%m%d")))
+
+    def _load_meta(self, yyyy):
+        if yyyy not in self._meta:
+            _path = join(self._year_dir(yyyy), self._META)
+            self._meta[yyyy] = {}
+            if exists(_path):
+                with open(_path) as _meta:
+                    meta = json.load(_meta)
+                if meta.get("version") == self._VERSION:
+                    self._meta[yyyy] = meta["trade_dates"]
+        return self._meta[yyyy]
+
+    def hits(self, yyyy, keys):
+        """
+        :return: the set of trade dates whose cached results were computed from the same data and config
+        """
+        meta = self._load_meta(yyyy)
+        return {trade_date for trade_date, key in keys.items()
+                if meta.get(str(pd.Timestamp(trade_date).date())) == key and
+                exists(self._result_path(yyyy, trade_date))}
+
+    def get(self, yyyy, trade_date):
+        """
+        :return: the cached tick pnl of the legs of the trade date
+        """
+        with np.load(self._result_path(yyyy, trade_date), allow_pickle=False) as _result:
+            leg_pnl = pd.DataFrame({_col: _result[_col] for _col in self.pnl_columns})
+        leg_pnl.insert(0, "trade_date", pd.Timestamp(trade_date))
+        return leg_pnl
+
+    def get_legs(self, yyyy, trade_date):
+        """
+        :return: the cached legs of the strategy built on the trade date
+        """
+        with np.load(self._result_path(yyyy, trade_date), allow_pickle=False) as _result:
+            return pd.DataFrame({_col: _result["legs_{}".format(_col)] for _col in self.LEG_COLUMNS})
+
+    def put(self, yyyy, trade_date, key, leg_pnl, strategy):
+        """
+        Writes the results of the trade date - the key is only recorded on flush
+        """
+        makedirs(self._year_dir(yyyy), exist_ok=True)
+        _legs = BacktestCache._leg_descriptors(strategy)
+        _arrays = {_col: leg_pnl[_col].values for _col in self.pnl_columns}
+        #the leg ids are numbered across the whole backtest so we store them relative to the trade date
+        if len(leg_pnl):
+            _arrays["leg_id"] = _arrays["leg_id"] - _arrays["leg_id"].min()
+        _arrays.update({"legs_{}".format(_col): np.asarray(_legs[_col]) for _col in self.LEG_COLUMNS})
+        _arrays["legs_exp_date"] = np.asarray(_legs["exp_date"], dtype="datetime64[ns]")
+        _arrays["legs_strike"] = np.asarray(_legs["strike"], dtype=np.float64)
+
+        with AtomicWrite.file(self._result_path(yyyy, trade_date), "wb") as _result:
+            np.savez(_result, **_arrays)
+        self._load_meta(yyyy)[str(pd.Timestamp(trade_date).date())] = key
+
+    @staticmethod
+    def _leg_descriptors(strategy):
+        legs = {_col: [] for _col in BacktestCache.LEG_COLUMNS}
+        for _leg_type in ["call_legs", "put_legs"]:
+            for _leg_name, _leg in getattr(strategy, _leg_type, {}).items():
+                legs["leg_type"].append(_leg_type)
+                legs["leg"].append(_leg_name)
+                legs["exp_date"].append(pd.Timestamp(_leg.exp_date).to_datetime64())
+                legs["strike"].append(_leg.strike)
+                legs["opt_type"].append(str(_leg.opt_type))
+        return legs
+
+    def flush(self, yyyy):
+        """
+        Writes the keys of the cached results of the year
+        """
+        makedirs(self._year_dir(yyyy), exist_ok=True)
+        with AtomicWrite.file(join(self._year_dir(yyyy), self._META)) as _meta:
+            json.dump({"version": self._VERSION,
+                       "config_hash": self.config_hash,
+                       "updated": str(datetime.now()),
+                       "trade_dates": self._load_meta(yyyy)}, _meta, sort_keys=True)
@@ -0,0 +1,86 @@
+import re
+import numpy as np
+
+
+class HedgingEngine:
+    """
+    Simulates the delta hedge of every leg of the stacked leg table under one or more hedge schedules side by
+    side, giving one dh pnl column per schedule from a single pass over the table.
+
+    The schedules are given by trading_params.dh_params as a string or a list of strings:
+        "Nd"       - rebalance to the leg's delta every N days of the leg history ("1d" is daily)
+        "band_x"   - rebalance only when the leg's delta has moved more than x from the hedge held (or no
+                     hedge is held as the delta was nan)
+        "none"     - unhedged
+
+    The first schedule is the dh_pnl of the backtest and every other schedule s is in the column dh_pnl_s
+    """
+
+    def __init__(self, dh_params="1d"):
+        self.schedules = HedgingEngine.parse_schedules(dh_params)
+        self.pnl_columns = ["dh_pnl"] + ["dh_pnl_{}".format(_name) for _name, _, _ in self.schedules[1:]]
+
+    @staticmethod
+    def parse_schedules(dh_params):
+        """
+        :return: list of (name, kind, param) of the hedge schedules
+        """
+        schedules = []
+        for _name in [dh_params] if isinstance(dh_params, str) else dh_params:
+            _name = str(_name).strip().lower()
+            _every = re.fullmatch(r"(\d+)d", _name)
+            _band = re.fullmatch(r"band_(\d*\.?\d+)", _name)
+            if _every and int(_every.group(1)) > 0:
+                schedules.append((_name, "every", int(_every.group(1))))
+            elif _band:
+                schedules.append((_name, "band", float(_band.group(1))))
+            elif _name in ["none", "unhedged"]:
+                schedules.append((_name, "none", None))
+            else:
+                raise ValueError("Unknown delta hedge schedule {}".format(_name))
+        if not schedules:
+            raise ValueError("No delta hedge schedule in dh_params")
+        return schedules
+
+    def hedges(self, delta, first_row):
+        """
+        :return: list of (pnl column, hedge) of each schedule where the hedge is the delta held from each row
+        of the stacked legs to the next
+        """
+        _leg_pos = HedgingEngine._leg_positions(first_row)
+        return [(_column, HedgingEngine.hedge_positions(delta, _leg_pos, _kind, _param))
+                for _column, (_, _kind, _param) in zip(self.pnl_columns, self.schedules)]
+
+    @staticmethod
+    def _leg_positions(first_row):
+        #the position of each row within its leg history i.e. the number of days since the leg was traded
+        _rows = np.arange(len(first_row))
+        return _rows - np.maximum.accumulate(np.where(first_row, _rows, 0))
+
+    @staticmethod
+    def hedge_positions(delta, leg_pos, kind, param=None):
+        """
+        :param leg_pos: the position of each row within its leg history (the first row of a leg is 0)
+        :return: the hedge held from each row to the next under the schedule
+        """
+        _rows = np.arange(len(delta))
+        if kind == "none":
+            return np.zeros(len(delta))
+        elif kind == "every":
+            #the hedge is the delta of the last rebalance - every leg is hedged on the day it is traded
+            _rebalance = leg_pos % param == 0
+            return delta[np.maximum.accumulate(np.where(_rebalance, _rows, 0))]
+        elif kind == "band":
+            #the hedge depends on the hedge held the day before so we step through the days of the leg
+            #histories, updating the same day of every leg at once. A leg with no hedge held (its delta was nan
+            #when it was last rebalanced) is rebalanced on the next day, while a nan delta keeps the hedge held
+            hedge = np.array(delta, dtype=float)
+            _order = np.argsort(leg_pos, kind="stable")
+            _bounds = np.append(0, np.cumsum(np.bincount(leg_pos)))
+            for _pos in range(1, len(_bounds) - 1):
+                _day = _order[_bounds[_pos]:_bounds[_pos + 1]]
+                _held = hedge[_day - 1]
+                _rebalance = np.isnan(_held) | (np.abs(delta[_day] - _held) > param)
+                hedge[_day] = np.where(_rebalance, delta[_day], _held)
+            return hedge
+        raise ValueError("Unknown delta hedge schedule {}".format(kind))
@@ -0,0 +1,18 @@
+import numpy as np
+
+
+class LegTable:
+    """
+    Helpers for the stacked leg table - the histories of the legs laid end to end, with the rows of each leg
+    contiguous and identified by its leg_id
+    """
+
+    @staticmethod
+    def first_rows(leg_id):
+        """
+        :return: boolean mask of the first row of each leg
+        """
+        leg_id = np.asarray(leg_id)
+        first_row = np.ones(len(leg_id), dtype=bool)
+        first_row[1:] = leg_id[1:] != leg_id[:-1]
+        return first_row
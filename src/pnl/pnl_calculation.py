@@ -1,72 +1,197 @@
 import pandas as pd
+import numpy as np
 from configuration import ConfigurationFactory
-from datetime import datetime
+from pnl.hedging import HedgingEngine
+from pnl.leg_table import LegTable
+from sizing.sizing import Sizing
+from utility.instrumentation import Instrumentation
 
 class PnLEngine:
 
-    def __init__(self):
+    def __init__(self, config=None):
         #initialise config
-        self._init_config()
+        self._init_config(config)
         #initialise params
         self._init_params()
 
-    def _init_config(self):
-        print("{} - Initialising pnl engine".format(datetime.now()))
-        self._config = ConfigurationFactory.create_btest_config()["backtest_config"]
+    def _init_config(self, config=None):
+        Instrumentation.log("Initialising pnl engine")
+        config = ConfigurationFactory.create_btest_config() if config is None else config
+        self._config = config["backtest_config"]
         self._strat_type = self._config["trading_params"]["strat_type"]["method"]
         self.config = self._config[self._strat_type]
+        #the delta hedge schedules of the dh pnl
+        self.hedging = HedgingEngine(self._config["trading_params"].get("dh_params", "1d"))
+        self._sizing_params = self._config["trading_params"].get("sizing_params", {})
 
     def _init_params(self):
         self._options = ["call", "put"]
 
-    def compute_total_leg_pnl(self, strategies):
+    #columns of the leg histories used in the pnl computation
+    _LEG_COLUMNS = ["date", "bs_price", "forward_price", "bs_delta"]
+
+    def stack_leg_data(self, strategies, columns=None):
         """
-        Computes the leg pnl for both call and put legs
+        Stacks the histories of every leg of every strategy into one long table. Each leg is identified by
+        a leg_id and its rows stay contiguous and in the order of the leg data, so per leg diffs and shifts
+        can be computed in one vectorised pass over the table.
+
+        The legs only hold row offsets into their year's column store so the table is gathered straight from
+        the stores without materialising the leg dataframes
         """
-        pnl = []
+        columns = self._LEG_COLUMNS if columns is None else columns
+        _stores = []
+        _offsets = []
+        _long_short = []
+        _sized = []
+        _trade_dates = []
         for yyyy in strategies:
             for trade_entry in strategies[yyyy]:
-                #compute the leg pnl and the dh pnl in separate column
                 _strat = strategies[yyyy][trade_entry]
                 for _leg_type in self._options:
-                    try:
-                        _leg_id = "{}_legs".format(_leg_type)
-                        _strat_legs = getattr(_strat, _leg_id)
-                        for _leg in _strat_legs:
-                            #compute the pnl here
-                            _leg_data = _strat_legs[_leg].leg_data
-                            _leg_data["opt_pnl"] = self.config[_leg_id]["long_short"] * _leg_data["bs_price"].diff()
-                            _leg_data["delta_pnl"] = -self.config[_leg_id]["long_short"] * _leg_data["forward_price"].diff() * _leg_data["bs_delta"].shift()
-                            _leg_data["dh_pnl"] = _leg_data["opt_pnl"] + _leg_data["delta_pnl"]
-                            #now we just need to store the filtered dataframe in a res container (note this is tick pnl)
-                            _tmp = _leg_data.filter(["date", "opt_pnl", "dh_pnl"])
-                            _tmp.set_index("date", drop=True, inplace=True)
-                            pnl.append(_tmp)
-                    except AttributeError as e:
-                        print("{} - strategy object does not contain {} legs; removing from possible options".format(datetime.now(),
-                                                                                                                     _leg_type))
-                        #in which case we remove it from self._options list
-                        self._options.remove(_leg_type)
-
-        return pd.concat(pnl, axis=0).dropna().groupby("date").sum()
+                    _leg_id = "{}_legs".format(_leg_type)
+                    #strategies without this leg type are skipped
+                    _strat_legs = getattr(_strat, _leg_id, None)
+                    if _strat_legs is None:
+                        continue
+                    for _leg in _strat_legs:
+                        _stores.append(_strat_legs[_leg].store)
+                        _offsets.append(_strat_legs[_leg].offsets)
+                        _long_short.append(self._get_long_short(_leg_id, _leg))
+                        _sized.append(self._is_sized(_leg_id, _leg))
+                        _trade_dates.append(trade_entry)
+
+        _offsets = np.asarray(_offsets, dtype=np.int64).reshape(-1, 2)
+        _lengths = _offsets[:, 1] - _offsets[:, 0]
+        _rows = PnLEngine._expand_offsets(_offsets[:, 0], _lengths)
+
+        #gather each run of consecutive legs that share a column store (i.e. a year) in one take
+        _columns = {_col: [] for _col in columns}
+        _row_start = 0
+        _leg_idx = 0
+        while _leg_idx < len(_stores):
+            _run_end = _leg_idx
+            while _run_end < len(_stores) and _stores[_run_end] is _stores[_leg_idx]:
+                _run_end += 1
+            _row_end = _row_start + _lengths[_leg_idx:_run_end].sum()
+            _values = _stores[_leg_idx].take(_rows[_row_start:_row_end], columns)
+            for _col in columns:
+                _columns[_col].append(_values[_col])
+            _leg_idx, _row_start = _run_end, _row_end
+
+        stacked = pd.DataFrame({_col: np.concatenate(_columns[_col]) if _columns[_col] else np.array([])
+                                for _col in columns})
+        stacked["leg_id"] = np.repeat(np.arange(len(_lengths)), _lengths)
+        stacked["trade_date"] = np.repeat(pd.to_datetime(_trade_dates).values, _lengths)
+        stacked["long_short"] = np.repeat(np.asarray(_long_short, dtype=float), _lengths)
+        stacked["sized"] = np.repeat(np.asarray(_sized, dtype=bool), _lengths)
+        return stacked
+
+    @staticmethod
+    def _expand_offsets(starts, lengths):
+        #row positions start, start + 1, ..., start + length - 1 of every leg laid end to end
+        _leg_first_row = np.cumsum(lengths) - lengths
+        return np.arange(lengths.sum()) + np.repeat(starts - _leg_first_row, lengths)
+
+    def _get_long_short(self, leg_id, leg):
+        #multileg strategies have one long_short per leg type whereas outright strategies have one per leg
+        _leg_config = self.config[leg_id]
+        if "long_short" in _leg_config:
+            return _leg_config["long_short"]
+        return _leg_config[leg]["long_short"]
+
+    def _is_sized(self, leg_id, leg):
+        #a leg configured with a leg_sizing of no_sizing is traded at unit size whatever the sizing method
+        _leg_config = self.config[leg_id]
+        if "long_short" not in _leg_config:
+            _leg_config = _leg_config[leg]
+        return _leg_config.get("leg_sizing") != "no_sizing"
+
+    @staticmethod
+    def compute_leg_pnl(stacked, hedging=None):
+        """
+        Computes the tick opt, delta and dh pnl of every leg of the stacked leg table - the diffs and shifts are
+        taken over the whole table and then masked at the first row of each leg. There is a dh pnl column for
+        each hedge schedule of the hedging engine (daily hedging by default)
+        """
+        hedging = HedgingEngine() if hedging is None else hedging
+        _first_row = LegTable.first_rows(stacked["leg_id"].values)
+
+        _price_diff = PnLEngine._leg_diff(stacked["bs_price"].values, _first_row)
+        _fwd_diff = PnLEngine._leg_diff(stacked["forward_price"].values, _first_row)
+        _long_short = stacked["long_short"].values
+
+        pnl = stacked.copy()
+        pnl["opt_pnl"] = _long_short * _price_diff
+        for _column, _hedge in hedging.hedges(stacked["bs_delta"].values, _first_row):
+            _delta_pnl = -_long_short * _fwd_diff * PnLEngine._leg_shift(_hedge, _first_row)
+            if _column == "dh_pnl":
+                pnl["delta_pnl"] = _delta_pnl
+            pnl[_column] = pnl["opt_pnl"] + _delta_pnl
+        return pnl
+
+    @staticmethod
+    def _leg_diff(values, first_row):
+        _diff = np.empty(len(values))
+        _diff[1:] = values[1:] - values[:-1]
+        _diff[first_row] = np.nan
+        return _diff
+
+    @staticmethod
+    def _leg_shift(values, first_row):
+        _shift = np.empty(len(values))
+        _shift[1:] = values[:-1]
+        _shift[first_row] = np.nan
+        return _shift
+
+    def compute_leg_pnl_table(self, strategies):
+        """
+        :return: the tick pnl of every leg of every strategy identified by its trade date and leg_id, scaled
+        by the size the leg was traded at
+        """
+        stacked = self.stack_leg_data(strategies, columns=self._LEG_COLUMNS + Sizing.get_columns(self._sizing_params))
+        pnl = PnLEngine.compute_leg_pnl(stacked, hedging=self.hedging)
+        _size = Sizing.compute_sizing(stacked, self._sizing_params)
+        for _col in ["opt_pnl"] + self.hedging.pnl_columns:
+            pnl[_col] = pnl[_col].values * _size
+        return pnl.filter(["trade_date", "leg_id", "date", "opt_pnl"] + self.hedging.pnl_columns)
+
+    @staticmethod
+    def aggregate_leg_pnl(leg_pnl):
+        """
+        Sums the tick pnl of the legs by date. The rows summed are those with both an opt and a dh pnl, and the
+        pnl of the other hedge schedules is summed over those rows skipping its own nans so that a nan under
+        one schedule does not drop the row from the others
+        """
+        #note this is tick pnl
+        _tmp = leg_pnl.filter(["date", "opt_pnl"] + [_col for _col in leg_pnl.columns if _col.startswith("dh_pnl")])
+        _tmp.set_index("date", drop=True, inplace=True)
+        _tmp = _tmp[_tmp[["opt_pnl", "dh_pnl"]].notna().all(axis=1).values]
+        return _tmp.groupby("date").sum()
+
+    def compute_total_leg_pnl(self, strategies):
+        """
+        Computes the leg pnl for both call and put legs
+        """
+        return PnLEngine.aggregate_leg_pnl(self.compute_leg_pnl_table(strategies))
 
     def create_strategy_index(self, total_pnl):
         index_start = 100
-        # we build the index here starting at 100
-        strat_index = pd.DataFrame(index=total_pnl.index,
+        # we build the index here starting at 100 - each value is the previous value plus the previous day's pnl
+        # so the index is the cumulative sum of the starting value followed by the lagged pnl
+        _increments = np.empty(total_pnl.shape)
+        _increments[:1] = index_start
+        _increments[1:] = total_pnl.values[:-1]
+        strat_index = pd.DataFrame(np.cumsum(_increments, axis=0),
+                                   index=total_pnl.index,
                                    columns=total_pnl.columns)
-        #insert starting value of strat
-        strat_index.iloc[:1] = index_start
-        #now we iterate through the total_pnl and we append the result to the strat index
-        for pnl_type in total_pnl.columns:
-            for i in range(1, len(strat_index)):
-                strat_index[pnl_type].iloc[i] = strat_index[pnl_type].iloc[i - 1] + total_pnl[pnl_type].iloc[i - 1]
 
         return strat_index
 
     def run(self, strategies=None):
-        total_pnl = self.compute_total_leg_pnl(strategies)
-        strat_index = self.create_strategy_index(total_pnl)
+        with Instrumentation.span("pnl"):
+            total_pnl = self.compute_total_leg_pnl(strategies)
+            strat_index = self.create_strategy_index(total_pnl)
 
         return strat_index
 
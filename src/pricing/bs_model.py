@@ -1,15 +1,21 @@
 import numpy as np
-from scipy.stats import norm
+#ndtr is the normal cdf behind scipy.stats.norm.cdf - scipy.optimize and py_vollib are only imported by the
+#scalar solvers that use them so importing the pricer stays cheap
+from scipy.special import ndtr
 from scipy.special import ndtri as norm_inv
-from scipy import optimize
-from py_vollib.black_scholes.implied_volatility import implied_volatility as iv
-from py_vollib.helpers.exceptions import PriceIsAboveMaximum, PriceIsBelowIntrinsic
 
 class BlackScholes:
     """
     Static Black Pricing Library to compute Black Price/Vega/Delta
     """
 
+    #status codes returned by the array implied vol solver
+    IV_CONVERGED = 0
+    IV_BELOW_INTRINSIC = 1
+    IV_ABOVE_MAX = 2
+    IV_NO_CONVERGENCE = 3
+    IV_EXPIRED = 4
+
     @staticmethod
     def compute_d1(forward, strike, mty, vol, ann_factor=365):
         return(np.log(forward/strike) + vol**2 / 2 * mty / ann_factor) / (vol * np.sqrt(mty/ann_factor))
@@ -35,9 +41,9 @@ class BlackScholes:
         d2 = d1 - vol * np.sqrt(mty/ann_factor)
 
         if option_type.lower() in ["c", "call"]:
-            price = np.exp(-r * mty/ann_factor) * (forward * norm.cdf(d1) - strike * norm.cdf(d2))
+            price = np.exp(-r * mty/ann_factor) * (forward * ndtr(d1) - strike * ndtr(d2))
         elif option_type.lower() in ["p", "put"]:
-            price = np.exp(-r * mty/ann_factor) * (strike * norm.cdf(-d2) - forward * norm.cdf(-d1))
+            price = np.exp(-r * mty/ann_factor) * (strike * ndtr(-d2) - forward * ndtr(-d1))
 
         return price
 
@@ -62,10 +68,10 @@ class BlackScholes:
         d1 = BlackScholes.compute_d1(forward, strike, mty, vol)
 
         if option_type.lower() in ["c", "call"]:
-            return np.exp(-r * mty/ann_factor) * norm.cdf(d1)
+            return np.exp(-r * mty/ann_factor) * ndtr(d1)
 
         if option_type.lower() in ["p", "put"]:
-            return np.exp(-r * mty/ann_factor) * (norm.cdf(d1) - 1)
+            return np.exp(-r * mty/ann_factor) * (ndtr(d1) - 1)
 
 
 
@@ -80,6 +86,67 @@ class BlackScholes:
             vega = 0
         return vega
 
+    @staticmethod
+    def compute_price_array(forward, strike, mty, vol, is_call, r=0, ann_factor=365):
+        """
+        Array version of compute_price - takes numpy arrays of forward/strike/mty/vol and a boolean call mask
+        and returns the black price for every element, giving intrinsic for expired options
+        """
+        forward, strike, mty, vol, is_call = BlackScholes._as_arrays(forward, strike, mty, vol, is_call)
+        expired = mty == 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d1 = BlackScholes.compute_d1(forward, strike, mty, vol, ann_factor=ann_factor)
+            d2 = d1 - vol * np.sqrt(mty/ann_factor)
+            df = np.exp(-r * mty/ann_factor)
+            price = np.where(is_call,
+                             df * (forward * ndtr(d1) - strike * ndtr(d2)),
+                             df * (strike * ndtr(-d2) - forward * ndtr(-d1)))
+        #if option has expired give instrinsic
+        intrinsic = np.where(is_call, np.maximum(forward - strike, 0), np.maximum(strike - forward, 0))
+        return np.where(expired, intrinsic, price)
+
+    @staticmethod
+    def compute_greeks_array(forward, strike, mty, vol, is_call, r=0, ann_factor=365):
+        """
+        Computes the black price, delta and vega in a single pass over numpy arrays, sharing d1/d2 between them.
+        The expiry handling is the same as the scalar methods (intrinsic price, 100 delta and zero vega)
+
+        :return: tuple of (price, delta, vega) arrays
+        """
+        forward, strike, mty, vol, is_call = BlackScholes._as_arrays(forward, strike, mty, vol, is_call)
+        expired = mty == 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d1 = BlackScholes.compute_d1(forward, strike, mty, vol, ann_factor=ann_factor)
+            d2 = d1 - vol * np.sqrt(mty/ann_factor)
+            df = np.exp(-r * mty/ann_factor)
+            n_d1 = ndtr(d1)
+            price = np.where(is_call,
+                             df * (forward * n_d1 - strike * ndtr(d2)),
+                             df * (strike * ndtr(-d2) - forward * ndtr(-d1)))
+            delta = np.where(is_call, df * n_d1, df * (n_d1 - 1))
+            vega = forward * df * np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi * ann_factor/mty)
+
+        #if option has expired give instrinsic, 100 delta and no vega
+        intrinsic = np.where(is_call, np.maximum(forward - strike, 0), np.maximum(strike - forward, 0))
+        expiry_delta = np.where(is_call, (forward - strike > 0) * 1.0, (strike - forward > 0) * -1.0)
+        price = np.where(expired, intrinsic, price)
+        delta = np.where(expired, expiry_delta, delta)
+        vega = np.where(expired, 0, vega)
+        return price, delta, vega
+
+    @staticmethod
+    def _as_arrays(forward, strike, mty, vol, is_call):
+        return (np.asarray(forward, dtype=float), np.asarray(strike, dtype=float), np.asarray(mty, dtype=float),
+                np.asarray(vol, dtype=float), np.asarray(is_call, dtype=bool))
+
+    @staticmethod
+    def is_call_flag(option_type):
+        """
+        Converts an array of cp flags ("C"/"P"/"call"/"put") into the boolean call mask used by the array methods
+        """
+        _flags = np.char.lower(np.asarray(option_type, dtype=str))
+        return (_flags == "c") | (_flags == "call")
+
     @staticmethod
     def compute_vol_from_price(forward, strike, mty, opt_price, r=0, ann_factor=365, option_type=None):
 
@@ -88,6 +155,7 @@ class BlackScholes:
         else:
             def func(vol, opt_type, forward, strike, mty, r, ann_factor):
                 return BlackScholes.compute_price(forward=forward, strike=strike, mty=mty, vol=vol, option_type=option_type) - opt_price
+            from scipy import optimize
             try:
                 res = optimize.brentq(func, -0.001, 2, args=(option_type, forward, strike, mty, r, ann_factor),
                                    xtol=0.0000001,
@@ -96,11 +164,75 @@ class BlackScholes:
                 return 0
             return res
 
+    @staticmethod
+    def compute_vol_from_price_array(forward, strike, mty, opt_price, is_call, r=0, ann_factor=365,
+                                     vol_max=2, xtol=0.0000001, max_iter=100, fill_value=0):
+        """
+        Inverts a whole chain of prices to implied vol at once using a safeguarded newton method. Every element
+        keeps its own [lo, hi] vol bracket and we fall back to bisection whenever the newton step leaves it,
+        so each element converges independently of the others in the array.
+
+        Elements which cannot be inverted are set to fill_value and flagged in the status array
+        (see the IV_* codes) rather than being silently returned as 0
+
+        :return: tuple of (vol, status) arrays
+        """
+        forward, strike, mty, opt_price, is_call = BlackScholes._as_arrays(forward, strike, mty, opt_price, is_call)
+        vol = np.full(forward.shape, fill_value, dtype=float)
+        status = np.full(forward.shape, BlackScholes.IV_NO_CONVERGENCE, dtype=np.int8)
+
+        #no arbitrage bounds - vol of 0 gives the discounted intrinsic and vol_max gives the max price
+        expired = mty == 0
+        _df = np.exp(-r * mty/ann_factor)
+        intrinsic = _df * np.where(is_call, np.maximum(forward - strike, 0), np.maximum(strike - forward, 0))
+        max_price = BlackScholes.compute_price_array(forward, strike, mty, np.full(forward.shape, vol_max),
+                                                     is_call, r=r, ann_factor=ann_factor)
+        valid = np.isfinite(opt_price) & np.isfinite(forward) & np.isfinite(strike) & (forward > 0) & (strike > 0)
+        below = valid & ~expired & (opt_price < intrinsic)
+        above = valid & ~expired & ~below & (opt_price > max_price)
+        status[expired] = BlackScholes.IV_EXPIRED
+        status[below] = BlackScholes.IV_BELOW_INTRINSIC
+        status[above] = BlackScholes.IV_ABOVE_MAX
+
+        idx = np.flatnonzero(valid & ~expired & ~below & ~above)
+        lo = np.zeros(idx.shape)
+        hi = np.full(idx.shape, float(vol_max))
+        #brenner-subrahmanyam approximation on the time value as the initial guess
+        sigma = np.sqrt(2 * np.pi * ann_factor / mty[idx]) * (opt_price[idx] - intrinsic[idx]) / forward[idx]
+        sigma = np.clip(sigma, 0.01, 0.99 * vol_max)
+
+        for i in range(max_iter):
+            if len(idx) == 0:
+                break
+            price, _, vega = BlackScholes.compute_greeks_array(forward[idx], strike[idx], mty[idx], sigma,
+                                                               is_call[idx], r=r, ann_factor=ann_factor)
+            diff = price - opt_price[idx]
+            #price is increasing in vol so the sign of the error tells us which side of the root we are on
+            hi = np.where(diff > 0, sigma, hi)
+            lo = np.where(diff < 0, sigma, lo)
+            #a vanishing vega overflows the newton step which is then rejected for bisection
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                newton = sigma - diff / vega
+            use_newton = np.isfinite(newton) & (newton > lo) & (newton < hi)
+            new_sigma = np.where(use_newton, newton, (lo + hi) / 2)
+
+            done = (diff == 0) | (np.abs(new_sigma - sigma) < xtol) | (hi - lo < xtol)
+            sigma = np.where(diff == 0, sigma, new_sigma)
+            vol[idx[done]] = sigma[done]
+            status[idx[done]] = BlackScholes.IV_CONVERGED
+
+            #only iterate on the elements that are still unresolved
+            keep = ~done
+            idx, lo, hi, sigma = idx[keep], lo[keep], hi[keep], sigma[keep]
+
+        return vol, status
+
     @staticmethod
     def get_vol(forward, strike, mty, opt_price, r=0, ann_factor=365, option_type=None):
         if mty == 0:
             return 0
         else:
+            from py_vollib.black_scholes.implied_volatility import implied_volatility as iv
             try:
                 impl_vol = iv(opt_price, forward, strike, mty/365, r, option_type.lower())
             except Exception as e:
@@ -142,5 +274,15 @@ class BlackScholes:
             elif option_type.lower() in ["p", "put"]:
                 return forward / np.exp((vol * np.sqrt(mty/ann_factor) * norm_inv(delta_strike + 1)) - (r + (0.5 * vol**2) * np.sqrt(mty/ann_factor)))
 
-
-
+    @staticmethod
+    def invert_bs_delta_get_strike_array(forward, delta_strike, mty, vol, is_call, r=0, ann_factor=365):
+        """
+        Array version of invert_bs_delta_get_strike - takes numpy arrays and a boolean call mask and returns the
+        strike of the delta for every element (0 for expired options)
+        """
+        forward, delta_strike, mty, vol, is_call = BlackScholes._as_arrays(forward, delta_strike, mty, vol, is_call)
+        #put deltas are negative so are shifted to the call delta of the same strike
+        _delta = np.where(is_call, delta_strike, delta_strike + 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            strike = forward / np.exp((vol * np.sqrt(mty/ann_factor) * norm_inv(_delta)) - (r + (0.5 * vol**2) * np.sqrt(mty/ann_factor)))
+        return np.where(mty == 0, 0, strike)
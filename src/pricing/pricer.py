@@ -6,83 +6,280 @@ import numpy as np
 from pricing.bs_model import BlackScholes
 from configuration import ConfigurationFactory
 from manager.data import DataManager
-from os.path import dirname, join
-from datetime import datetime
+from os import makedirs, remove
+from os.path import exists, getsize, join
+import hashlib
+import json
+from utility.atomic_write import AtomicWrite
+from utility.instrumentation import Instrumentation
+from concurrent.futures import ProcessPoolExecutor
 
 class Application:
 
-    def __init__(self):
-        self._init_params()
+    def __init__(self, config=None):
+        self._init_params(config)
 
-    def _init_params(self):
-        _root = dirname(dirname(dirname(__file__)))
-        self.output_path = join(_root, "priced_data")
+    def _init_params(self, config=None):
+        self.output_path = join(DataManager.ROOT_DIR, "priced_data")
 
         self.filename = "priced_weeklies_optionMetricsSpx{}.csv"
 
+        #pricing params - the number of worker processes and the number of rows priced per task
+        _btest_config = ConfigurationFactory.create_btest_config() if config is None else config
+        Instrumentation.configure(_btest_config.get("instrumentation", {}))
+        _config = _btest_config.get("pricer_config", {})
+        self.years = [str(i) for i in range(_config.get("start_year", 2015), _config.get("end_year", 2019) + 1)]
+        self.n_workers = _config.get("n_workers", 1)
+        self.chunk_size = _config.get("chunk_size", 250000)
+        self.ingest_chunk_size = _config.get("ingest_chunk_size", 1000000)
+        #in incremental mode only the dates that are not already in the priced output are priced and appended
+        self.incremental = _config.get("incremental", False)
+
     def run(self):
-        years = [str(i) for i in range(2015, 2020)]
-        for yy in years:
-            #run the pricing
-            self._run_pricing_and_risk(yy)
-            #output to csv
-            self._output_to_csv(yy)
+        with Instrumentation.span("pricer"):
+            if self.incremental:
+                #the daily data drops are small so the incremental pricing runs in this process
+                for yy in self.years:
+                    with Instrumentation.span("year_{}".format(yy), level=Instrumentation.YEAR):
+                        self._run_incremental(yy)
+            elif self.n_workers > 1:
+                self._run_parallel()
+            else:
+                for yy in self.years:
+                    with Instrumentation.span("year_{}".format(yy), level=Instrumentation.YEAR):
+                        #run the pricing
+                        self._run_pricing_and_risk(yy)
+                        #output to csv
+                        self._output_to_csv(yy)
+        Instrumentation.write_report(DataManager.ROOT_DIR)
+
+    def _run_parallel(self):
+        """
+        Spreads the years and the chunks within each year across a process pool. The next year is loaded while
+        the chunks of the current year are priced, so at most two years are held at once; chunks are put back
+        together in their original order so the output is identical to the serial run
+        """
+        Instrumentation.log("Running pricing with {} worker processes".format(self.n_workers))
+        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            _load = pool.submit(Application._load_data, self.years[0], self.ingest_chunk_size) if self.years else None
+            for i, yy in enumerate(self.years):
+                data = _load.result()
+                #the next year is only submitted once this one has been collected
+                _load = pool.submit(Application._load_data, self.years[i + 1], self.ingest_chunk_size) \
+                    if i + 1 < len(self.years) else None
+                #the rows are loaded in the worker processes so they are counted here
+                Instrumentation.count("rows_loaded", len(data))
+                _chunks = [pool.submit(Application._price_and_risk, data.iloc[j:j + self.chunk_size])
+                           for j in range(0, max(len(data), 1), self.chunk_size)]
+                del data
+                self.data = pd.concat([_chunk.result() for _chunk in _chunks], axis=0)
+                self._report_iv_failures(self.data["iv_status"], yy)
+                Instrumentation.log("Finished running pricing and risk for {}".format(self.filename.format(yy)),
+                                    level=Instrumentation.YEAR)
+                self._output_to_csv(yy)
 
     def _run_pricing_and_risk(self, yy):
-        #test the pricing lib
-        data = DataManager.load_exchange_data_and_apply_days_to_expiry_filter(yy,
-                                                                              opt_expiry_filter=5)
-        #We drop any rows with negative forward price
-        data = data.query('forward_price > 0')
+        with Instrumentation.span("load", level=Instrumentation.YEAR):
+            data = Application._load_data(yy, chunksize=self.ingest_chunk_size)
+        with Instrumentation.span("price_and_risk", level=Instrumentation.YEAR):
+            self.data = Application._price_and_risk(data)
+        self._report_iv_failures(self.data["iv_status"], yy)
+        Instrumentation.log("Finished running pricing and risk for {}".format(self.filename.format(yy)),
+                            level=Instrumentation.YEAR)
+
+    def _run_incremental(self, yy):
+        """
+        Prices only the dates of the raw data that are not already in the priced output and appends them to it.
+
+        The new rows are priced and appended a batch of whole dates at a time and the checkpoint (the priced dates
+        and the fingerprint of the output) is updated after each append. If a job is interrupted the output is
+        truncated back to the last checkpoint on restart, so a partly written batch is discarded and the job resumes
+        from the first unpriced date.
+
+        An output whose columns are not those of the current pricing (e.g. written by an older version) is not
+        appended to - the whole year is repriced and the output rewritten
+        """
+        output_path = join(self.output_path, self.filename.format(yy))
+        with Instrumentation.span("load", level=Instrumentation.YEAR):
+            data = Application._load_data(yy, chunksize=self.ingest_chunk_size)
+
+        _columns = Application._price_and_risk(data.iloc[:0]).columns.tolist()
+        if exists(output_path) and Application._read_header(output_path) not in [None, _columns]:
+            Instrumentation.log("The columns of {} are not those of the pricing - repricing the whole year".format(
+                self.filename.format(yy)))
+            Instrumentation.count("incremental_full_reprices")
+            with Instrumentation.span("price_and_risk", level=Instrumentation.YEAR):
+                self.data = Application._price_and_risk(data)
+            self._report_iv_failures(self.data["iv_status"], yy)
+            self._output_to_csv(yy)
+            return
+
+        checkpoint = self._load_checkpoint(yy)
+        data = data[~data["date"].dt.strftime("%Y-%m-%d").isin(checkpoint["dates"])]
+        if data.empty:
+            Instrumentation.log("No new dates to price for {}".format(self.filename.format(yy)),
+                                level=Instrumentation.YEAR)
+            return
+
+        #batches of whole dates of roughly chunk_size rows so a date is never split across a checkpoint
+        #(the raw data is in date order so the stable sort keeps the row order of a full run)
+        data = data.iloc[np.argsort(data["date"].values, kind="stable")]
+        _dates = data["date"].values
+        _new_date = np.ones(len(_dates), dtype=bool)
+        _new_date[1:] = _dates[1:] != _dates[:-1]
+        _date_first_row = np.maximum.accumulate(np.where(_new_date, np.arange(len(_dates)), 0))
+        for _, batch in data.groupby(_date_first_row // self.chunk_size, sort=False):
+            with Instrumentation.span("price_and_risk", level=Instrumentation.YEAR):
+                self.data = Application._price_and_risk(batch)
+            self._report_iv_failures(self.data["iv_status"], yy)
+            self._append_to_csv(output_path)
+            checkpoint.update(Application._fingerprint(output_path))
+            checkpoint["dates"] += sorted(self.data["date"].dt.strftime("%Y-%m-%d").unique())
+            self._write_checkpoint(yy, checkpoint)
+            Instrumentation.count("dates_priced", self.data["date"].nunique())
+        Instrumentation.log("Finished incremental pricing for {} - {} dates priced".format(self.filename.format(yy),
+                                                                                           data["date"].nunique()),
+                            level=Instrumentation.YEAR)
+
+    def _checkpoint_path(self, yy):
+        return join(self.output_path, ".checkpoint", "{}.json".format(self.filename.format(yy)))
+
+    def _load_checkpoint(self, yy):
+        """
+        :return: dict of the dates already priced and the fingerprint of the output after they were appended
+        """
+        output_path = join(self.output_path, self.filename.format(yy))
+        _checkpoint_path = self._checkpoint_path(yy)
+        if not exists(output_path) or getsize(output_path) == 0:
+            self._remove_checkpoint(yy)
+            return {"dates": [], "size": 0}
+        if exists(_checkpoint_path):
+            with open(_checkpoint_path) as _checkpoint:
+                checkpoint = json.load(_checkpoint)
+            #the output is only truncated if its first size bytes are still those written at the checkpoint
+            #i.e. it has not been rewritten since (the mtime changes on an interrupted append so is not used)
+            if Application._fingerprint(output_path, checkpoint.get("size", 0)) == \
+                    {_key: checkpoint.get(_key) for _key in ["size", "columns", "tail_sha1"]}:
+                #discard anything appended after the last checkpoint i.e. an interrupted append
+                if getsize(output_path) > checkpoint["size"]:
+                    Instrumentation.log("Discarding partly written rows of {}".format(self.filename.format(yy)))
+                    with open(output_path, "r+b") as _output:
+                        _output.truncate(checkpoint["size"])
+                return checkpoint
+            Instrumentation.log("Checkpoint of {} does not match the output - rebuilding it from the output".format(
+                self.filename.format(yy)))
+        #the output was written by a full run so we take the priced dates from the output itself
+        _dates = pd.read_csv(output_path, usecols=["date"])["date"]
+        checkpoint = {"dates": sorted(_dates.unique().tolist())}
+        checkpoint.update(Application._fingerprint(output_path))
+        self._write_checkpoint(yy, checkpoint)
+        return checkpoint
+
+    @staticmethod
+    def _fingerprint(output_path, size=None, n_tail_bytes=65536):
+        """
+        :return: dict of the size, header columns and a hash of the last bytes of the first size bytes of the
+        output (the whole output if size is not set)
+        """
+        size = getsize(output_path) if size is None else size
+        with open(output_path, "rb") as _output:
+            _output.seek(max(size - n_tail_bytes, 0))
+            _tail = _output.read(min(size, n_tail_bytes))
+        return {"size": size,
+                "columns": Application._read_header(output_path),
+                "tail_sha1": hashlib.sha1(_tail).hexdigest()}
+
+    @staticmethod
+    def _read_header(output_path):
+        if getsize(output_path) == 0:
+            return None
+        return pd.read_csv(output_path, nrows=0).columns.tolist()
+
+    def _remove_checkpoint(self, yy):
+        if exists(self._checkpoint_path(yy)):
+            remove(self._checkpoint_path(yy))
+
+    def _write_checkpoint(self, yy, checkpoint):
+        makedirs(join(self.output_path, ".checkpoint"), exist_ok=True)
+        with AtomicWrite.file(self._checkpoint_path(yy)) as _checkpoint:
+            json.dump(checkpoint, _checkpoint)
+
+    def _append_to_csv(self, output_path):
+        makedirs(self.output_path, exist_ok=True)
+        _header = not exists(output_path) or getsize(output_path) == 0
+        self.data.to_csv(output_path, mode="a", header=_header, index=False)
+        Instrumentation.log("Successfully appended {} rows to csv {}".format(len(self.data), output_path),
+                            level=Instrumentation.YEAR)
+
+    @staticmethod
+    def _load_data(yy, chunksize=1000000):
+        #the dte and negative forward price filters are applied chunk by chunk as the raw file is streamed in
+        return DataManager.load_exchange_data_streaming(yy,
+                                                        opt_expiry_filter=5,
+                                                        chunksize=chunksize)
+
+    @staticmethod
+    def _price_and_risk(data):
+        """
+        Prices a block of option rows - every row is priced independently so the data can be split into
+        chunks and priced in any order
+        """
+        data = data.copy()
         #WE REQUIRE THE MULTIPLIER HERE
-        data["bs_vol"] = data.apply(lambda x: BlackScholes.compute_vol_from_price(forward=x["forward_price"],
-                                                                                  strike=x["strike_price"],
-                                                                                  mty=x["dte"],
-                                                                                  opt_price=x["mid_price"],
-                                                                                  option_type=x["cp_flag"]),
-                                                                                  axis=1)
+        _fwd = data["forward_price"].values
+        _strike = data["strike_price"].values
+        _mty = data["dte"].values
+        _is_call = BlackScholes.is_call_flag(data["cp_flag"].values)
+        #invert the whole block of mid prices in one batch - failures are flagged in iv_status rather than hidden
+        data["bs_vol"], data["iv_status"] = BlackScholes.compute_vol_from_price_array(forward=_fwd,
+                                                                                      strike=_strike,
+                                                                                      mty=_mty,
+                                                                                      opt_price=data["mid_price"].values,
+                                                                                      is_call=_is_call)
 
         #FINALLY NOTE THAT END OF MONTHLYS ALSO BECOME WEEKLIES SO ITS FINE TO SET A HARD CUT OFF LIMIT
         #TO THE OPTIONS WITH LESS THAN 5 DAYS TO EXPIRY
 
-        data["bs_price"] = data.apply(lambda x: BlackScholes.compute_price(forward=x["forward_price"],
-                                                                           strike=x["strike_price"],
-                                                                           mty=x["dte"],
-                                                                           vol=x["bs_vol"],
-                                                                           option_type=x["cp_flag"]),
-                                                                           axis=1)
+        #the price, delta and vega are all computed in one vectorised pass over the whole block
+        _vol = data["bs_vol"].values
+        _price, _delta, _vega = BlackScholes.compute_greeks_array(forward=_fwd,
+                                                                 strike=_strike,
+                                                                 mty=_mty,
+                                                                 vol=_vol,
+                                                                 is_call=_is_call)
+        data["bs_price"] = _price
 
         #vega test
-        data["bs_price_vol_up_one"] = data.apply(lambda x: BlackScholes.compute_price(forward=x["forward_price"],
-                                                                           strike=x["strike_price"],
-                                                                           mty=x["dte"],
-                                                                           vol=x["bs_vol"] + 0.01,
-                                                                           option_type=x["cp_flag"]),
-                                                                           axis=1)
-
-        data["bs_delta"] = data.apply(lambda x: BlackScholes.compute_delta(forward=x["forward_price"],
-                                                                           strike=x["strike_price"],
-                                                                           mty=x["dte"],
-                                                                           vol=x["bs_vol"],
-                                                                           option_type=x["cp_flag"]),
-                                                                           axis=1)
-
-        data["bs_vega"] = data.apply(lambda x: BlackScholes.compute_vega(forward=x["forward_price"],
-                                                                           strike=x["strike_price"],
-                                                                           mty=x["dte"],
-                                                                           vol=x["bs_vol"],
-                                                                           option_type=x["cp_flag"]),
-                                                                           axis=1)
-
-        self.data = data
-        print("{} - Finished running pricing and risk for {}".format(datetime.now(),
-                                                                     self.filename.format(yy)))
+        data["bs_price_vol_up_one"] = BlackScholes.compute_price_array(forward=_fwd,
+                                                                       strike=_strike,
+                                                                       mty=_mty,
+                                                                       vol=_vol + 0.01,
+                                                                       is_call=_is_call)
+
+        data["bs_delta"] = _delta
+        data["bs_vega"] = _vega
+        return data
+
+    def _report_iv_failures(self, iv_status, yy):
+        _labels = {BlackScholes.IV_BELOW_INTRINSIC: "below intrinsic",
+                   BlackScholes.IV_ABOVE_MAX: "above max price",
+                   BlackScholes.IV_NO_CONVERGENCE: "no convergence"}
+        _counts = iv_status.value_counts()
+        for status, label in _labels.items():
+            if _counts.get(status, 0) > 0:
+                Instrumentation.count("iv_{}".format(label.replace(" ", "_")), _counts[status])
+                Instrumentation.log("{} quotes {} in implied vol solve for {}".format(_counts[status],
+                                                                                  label,
+                                                                                  self.filename.format(yy)))
 
     def _output_to_csv(self, yy):
+        makedirs(self.output_path, exist_ok=True)
         output_path = join(self.output_path, self.filename.format(yy))
         self.data.to_csv(output_path, index=False)
-        print("{} - Successfully output file to csv {}".format(datetime.now(),
-                                                               self.filename.format(yy)))
+        #the output has been rewritten so the checkpoint of an earlier incremental run no longer applies
+        self._remove_checkpoint(yy)
+        Instrumentation.log("Successfully output file to csv {}".format(self.filename.format(yy)),
+                            level=Instrumentation.YEAR)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+from pricing.bs_model import BlackScholes
+from pnl.pnl_calculation import PnLEngine
+from sizing.sizing import Sizing
+from configuration import ConfigurationFactory
+from utility.instrumentation import Instrumentation
+import numpy as np
+import pandas as pd
+
+
+class ScenarioEngine:
+    """
+    Reprices every live leg of every strategy on every date under a grid of forward shocks x vol shocks x time
+    decay and sums the repriced legs into the pnl surface of the portfolio on each date.
+
+    The shocks are broadcast against the stacked leg table so the whole grid is priced in one array computation
+    per chunk of legs - the number of legs in a chunk is chosen so that at most chunk_size leg x scenario prices
+    are held in memory at once.
+
+    The forward shocks are relative (0.01 is a 1% move in the forward), the vol shocks are absolute (0.01 is
+    one vol point) and the time shocks are days of decay. The pnl of a leg is the move of its black price from
+    the unshocked price, and the delta hedged pnl also includes the move of the leg's delta hedge
+    """
+
+    #columns of the leg histories used in the repricing
+    _LEG_COLUMNS = ["date", "forward_price", "strike_price", "cp_flag", "dte", "bs_vol", "bs_delta"]
+
+    #shocked vols are floored so that a large down shock does not price at zero or negative vol
+    MIN_VOL = 1e-4
+
+    def __init__(self, config=None, fwd_shocks=None, vol_shocks=None, time_shocks=None, chunk_size=None):
+        self._init_config(config, fwd_shocks, vol_shocks, time_shocks, chunk_size)
+
+    def _init_config(self, config=None, fwd_shocks=None, vol_shocks=None, time_shocks=None, chunk_size=None):
+        self._config = ConfigurationFactory.create_btest_config() if config is None else config
+        _scenario_config = self._config.get("scenario_config", {})
+        self.fwd_shocks = np.asarray(_scenario_config.get("fwd_shocks", [0.]) if fwd_shocks is None else fwd_shocks,
+                                     dtype=float)
+        self.vol_shocks = np.asarray(_scenario_config.get("vol_shocks", [0.]) if vol_shocks is None else vol_shocks,
+                                     dtype=float)
+        self.time_shocks = np.asarray(_scenario_config.get("time_shocks", [0]) if time_shocks is None else time_shocks,
+                                      dtype=float)
+        self.chunk_size = _scenario_config.get("chunk_size", 10000000) if chunk_size is None else chunk_size
+        self._pnl = PnLEngine(config=self._config)
+        self._sizing_params = self._config["backtest_config"]["trading_params"].get("sizing_params", {})
+
+    @property
+    def grid_shape(self):
+        return len(self.fwd_shocks), len(self.vol_shocks), len(self.time_shocks)
+
+    def run(self, strategies=None):
+        """
+        :return: dataframe of the opt and dh pnl of the portfolio indexed by date and the shocks of the scenario
+        """
+        with Instrumentation.span("scenarios"):
+            dates, opt_pnl, dh_pnl = self.reprice(self.stack_live_legs(strategies))
+            Instrumentation.count("scenario_surfaces", len(dates))
+        _index = pd.MultiIndex.from_product([dates, self.fwd_shocks, self.vol_shocks, self.time_shocks],
+                                            names=["date", "fwd_shock", "vol_shock", "time_shock"])
+        return pd.DataFrame({"opt_pnl": opt_pnl.reshape(-1), "dh_pnl": dh_pnl.reshape(-1)}, index=_index)
+
+    def stack_live_legs(self, strategies):
+        """
+        Stacks the leg histories of every strategy - the same leg rows as the pnl engine - and keeps the rows
+        that can be repriced (i.e. have a positive vol, a zero vol prices at the money as nan), in date order.
+        The long_short of each leg is scaled by the size it was traded at so the surfaces are those of the sized
+        book
+        """
+        stacked = self._pnl.stack_leg_data(strategies,
+                                           columns=self._LEG_COLUMNS + Sizing.get_columns(self._sizing_params))
+        stacked["long_short"] = stacked["long_short"].values * Sizing.compute_sizing(stacked, self._sizing_params)
+        _vol = stacked["bs_vol"].values.astype(float)
+        _live = np.isfinite(_vol) & (_vol > 0)
+        Instrumentation.count("scenario_rows_dropped", len(stacked) - _live.sum())
+        stacked = stacked[_live]
+        return stacked.iloc[np.argsort(stacked["date"].values, kind="stable")]
+
+    def reprice(self, legs):
+        """
+        Reprices the legs under every scenario of the grid one chunk of legs at a time
+
+        :param legs: the live legs in date order (see stack_live_legs)
+        :return: tuple of the dates and the (n_dates, n_fwd, n_vol, n_time) opt and dh pnl surfaces
+        """
+        _dates = legs["date"].values
+        _new_date = np.ones(len(_dates), dtype=bool)
+        _new_date[1:] = _dates[1:] != _dates[:-1]
+        #the date of each leg row as a position into dates
+        _date_group = np.cumsum(_new_date) - 1
+        dates = pd.DatetimeIndex(_dates[_new_date])
+        opt_pnl = np.zeros((len(dates),) + self.grid_shape)
+        dh_pnl = np.zeros((len(dates),) + self.grid_shape)
+
+        _legs = {"forward": legs["forward_price"].values.astype(float),
+                 "strike": legs["strike_price"].values.astype(float),
+                 "mty": legs["dte"].values.astype(float),
+                 "vol": legs["bs_vol"].values.astype(float),
+                 "delta": legs["bs_delta"].values.astype(float),
+                 "long_short": legs["long_short"].values.astype(float),
+                 "is_call": BlackScholes.is_call_flag(legs["cp_flag"].values)}
+        _rows_per_chunk = max(1, int(self.chunk_size // np.prod(self.grid_shape)))
+        for _start in range(0, len(legs), _rows_per_chunk):
+            _chunk = slice(_start, _start + _rows_per_chunk)
+            _opt, _dh = self._reprice_chunk({_col: _values[_chunk] for _col, _values in _legs.items()})
+            #the chunk is in date order so the legs of each date are summed as contiguous runs
+            _groups = _date_group[_chunk]
+            _runs = np.flatnonzero(np.append(True, _groups[1:] != _groups[:-1]))
+            opt_pnl[_groups[_runs]] += np.add.reduceat(_opt, _runs, axis=0)
+            dh_pnl[_groups[_runs]] += np.add.reduceat(_dh, _runs, axis=0)
+        return dates, opt_pnl, dh_pnl
+
+    def _reprice_chunk(self, legs):
+        """
+        :return: tuple of the (n_legs, n_fwd, n_vol, n_time) opt and dh pnl of the chunk of legs
+        """
+        #the legs run along the first axis and the fwd, vol and time shocks along the other three
+        _leg = {_col: _values[:, None, None, None] for _col, _values in legs.items()}
+        _fwd_shocks = self.fwd_shocks[None, :, None, None]
+        _vol_shocks = self.vol_shocks[None, None, :, None]
+        _time_shocks = self.time_shocks[None, None, None, :]
+
+        _base_price = BlackScholes.compute_price_array(forward=_leg["forward"],
+                                                       strike=_leg["strike"],
+                                                       mty=_leg["mty"],
+                                                       vol=_leg["vol"],
+                                                       is_call=_leg["is_call"])
+        _shocked_fwd = _leg["forward"] * (1 + _fwd_shocks)
+        _shocked_price = BlackScholes.compute_price_array(forward=_shocked_fwd,
+                                                          strike=_leg["strike"],
+                                                          mty=np.maximum(_leg["mty"] - _time_shocks, 0),
+                                                          vol=np.maximum(_leg["vol"] + _vol_shocks, self.MIN_VOL),
+                                                          is_call=_leg["is_call"])
+        opt_pnl = _leg["long_short"] * (_shocked_price - _base_price)
+        #the delta hedge is short the leg's delta of the forward as in the dh pnl of the pnl engine
+        dh_pnl = opt_pnl - _leg["long_short"] * _leg["delta"] * (_shocked_fwd - _leg["forward"])
+        return opt_pnl, dh_pnl
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class Action:
+    """
+    The actions taken by the agent at each step - an (n_envs, 2) array of the option position
+    (the long_short of the leg, bounded by max_position) and the fraction of the option delta to hedge
+    """
+
+    N_ACTION = 2
+    POSITION = 0
+    HEDGE_RATIO = 1
+
+    @staticmethod
+    def decode(actions, max_position=1):
+        """
+        :return: tuple of (position, hedge_ratio) arrays clipped to their bounds
+        """
+        actions = np.asarray(actions, dtype=np.float64).reshape(-1, Action.N_ACTION)
+        position = np.clip(actions[:, Action.POSITION], -max_position, max_position)
+        hedge_ratio = np.clip(actions[:, Action.HEDGE_RATIO], 0, 1)
+        return position, hedge_ratio
+
+    @staticmethod
+    def sample(rng, n_envs, max_position=1):
+        """
+        :return: (n_envs, 2) array of uniformly random actions
+        """
+        actions = np.empty((n_envs, Action.N_ACTION))
+        actions[:, Action.POSITION] = rng.uniform(-max_position, max_position, n_envs)
+        actions[:, Action.HEDGE_RATIO] = rng.uniform(0, 1, n_envs)
+        return actions
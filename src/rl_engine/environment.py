@@ -0,0 +1,128 @@
+from manager.cache import ColumnarCache
+from manager.data import DataManager
+from configuration import ConfigurationFactory
+from strategy.strategy import StrategyFactory
+from rl_engine.state import State
+from rl_engine.action import Action
+from rl_engine.reward import Reward
+from rl_engine.feature_store import FeatureStore
+from utility.instrumentation import Instrumentation
+from os.path import join
+import numpy as np
+
+
+class HedgingEnvironment:
+    """
+    Vectorised environment stepping n_envs episodes at once. Each episode trades one newly listed weekly option
+    until expiry - at every step the agent chooses the option position and the fraction of its delta to hedge
+    and is rewarded with the delta hedged pnl of the step. Episodes that finish are reset straight away to a new
+    random episode so every call to step advances all n_envs episodes.
+
+    The states and market data of the episodes are read from a FeatureStore - the store in the configured
+    feature_store_dir is memory mapped (and rebuilt if the priced data has changed) so that every environment
+    and training process shares one copy of the features
+    """
+
+    def __init__(self, config=None, year_indices=None, n_envs=None, seed=None, feature_store=None):
+        self._init_config(config, n_envs, seed)
+        self._init_episodes(year_indices, feature_store)
+
+    def _init_config(self, config=None, n_envs=None, seed=None):
+        self._config = ConfigurationFactory.create_btest_config() if config is None else config
+        _rl_config = self._config.get("rl_engine", {})
+        if _rl_config.get("no_of_state", State.N_STATE) != State.N_STATE:
+            raise ValueError("rl_engine no_of_state must be {}".format(State.N_STATE))
+        self.n_envs = _rl_config.get("n_envs", 64) if n_envs is None else n_envs
+        self.max_position = _rl_config.get("max_position", 1)
+        self._rng = np.random.default_rng(_rl_config.get("seed", 0) if seed is None else seed)
+        self._feature_store_dir = _rl_config.get("feature_store_dir", None)
+
+    def _init_episodes(self, year_indices=None, feature_store=None):
+        self.features = self._load_feature_store(year_indices) if feature_store is None else feature_store
+        if self.features.n_episodes == 0:
+            raise ValueError("No episodes in the priced data")
+        Instrumentation.count("rl_episodes", self.features.n_episodes)
+        self._starts = self.features.episodes[:, 0]
+        self._lengths = self.features.episodes[:, 1]
+
+        self._episode = np.zeros(self.n_envs, dtype=np.int64)
+        self._t = np.zeros(self.n_envs, dtype=np.int64)
+        self._position = np.zeros(self.n_envs)
+        self._hedge_ratio = np.zeros(self.n_envs)
+
+    def _load_feature_store(self, year_indices=None):
+        """
+        Memory maps the feature store of the backtest years, building it first if it is missing or stale. Year
+        indices passed in directly are not necessarily the priced data on disk so their store is built in memory
+        """
+        if year_indices is not None or self._feature_store_dir is None:
+            with Instrumentation.span("build_feature_store"):
+                return FeatureStore.build(StrategyFactory.load_year_indices(self._config) if year_indices is None
+                                          else year_indices)
+
+        _calendar = self._config["backtest_config"]["trading_params"]["option_expiry_calendar"]
+        _store_dir = join(DataManager.ROOT_DIR, self._feature_store_dir)
+        _source = {year: ColumnarCache.fingerprint(DataManager.get_priced_data_path(year, _calendar))
+                   for year in StrategyFactory.get_backtest_years(self._config)}
+        if not FeatureStore.is_valid(_store_dir, _source):
+            with Instrumentation.span("build_feature_store"):
+                FeatureStore.build(StrategyFactory.load_year_indices(self._config), source=_source).write(_store_dir)
+            Instrumentation.log("Successfully wrote rl feature store {}".format(_store_dir))
+        return FeatureStore.load(_store_dir)
+
+    @property
+    def state_size(self):
+        return State.N_STATE
+
+    @property
+    def action_size(self):
+        return Action.N_ACTION
+
+    def reset(self):
+        """
+        Starts a new random episode in every env
+        :return: (n_envs, N_STATE) array of the initial states
+        """
+        self._reset_envs(np.ones(self.n_envs, dtype=bool))
+        return self._get_state()
+
+    def _reset_envs(self, mask):
+        _n = int(mask.sum())
+        self._episode[mask] = self._rng.integers(0, self.features.n_episodes, _n)
+        self._t[mask] = 0
+        self._position[mask] = 0
+        self._hedge_ratio[mask] = 0
+
+    def _get_state(self):
+        #the market part of the states is precomputed - only the agent's position and hedge are filled in
+        state = self.features.states[self._starts[self._episode] + self._t]
+        state[:, State.FEATURES.index("position")] = self._position
+        state[:, State.FEATURES.index("hedge_ratio")] = self._hedge_ratio
+        return state
+
+    def step(self, actions):
+        """
+        Applies the (n_envs, 2) actions and advances every episode by one step
+
+        :return: tuple of (states, rewards, dones, info) - the states of the finished episodes are the initial
+        states of their new episodes and their final states are in info["terminal_state"]
+        """
+        position, hedge_ratio = Action.decode(actions, self.max_position)
+        _row = self._starts[self._episode] + self._t
+        _market, _next_market = self.features.market[_row], self.features.market[_row + 1]
+        _fwd, _price, _delta = [FeatureStore.MARKET.index(_col) for _col in ["forward_price", "bs_price", "bs_delta"]]
+        rewards = Reward.dh_pnl(position=position,
+                                hedge_ratio=hedge_ratio,
+                                price_diff=_next_market[:, _price] - _market[:, _price],
+                                fwd_diff=_next_market[:, _fwd] - _market[:, _fwd],
+                                delta=_market[:, _delta])
+        self._t += 1
+        self._position = position
+        self._hedge_ratio = hedge_ratio
+
+        dones = self._t >= self._lengths[self._episode] - 1
+        info = {}
+        if dones.any():
+            info["terminal_state"] = self._get_state()[dones]
+            self._reset_envs(dones)
+        return self._get_state(), rewards, dones, info
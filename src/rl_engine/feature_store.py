@@ -0,0 +1,216 @@
+from os.path import exists, join
+from datetime import datetime
+from rl_engine.state import State
+from utility.atomic_write import AtomicWrite
+import json
+import numpy as np
+import pandas as pd
+
+
+class EpisodeTable:
+    """
+    The histories of the newly listed weekly contracts laid end to end - an episode is one contract from its
+    listing to its expiry and its rows are the slice [starts[e], starts[e] + lengths[e]) of the columns.
+
+    The histories are gathered once from the column store of each year's contract index and the episodes are
+    ordered by their trade date (the date of their first row)
+    """
+
+    COLUMNS = ["forward_price", "strike_price", "dte", "bs_vol", "bs_delta", "bs_vega", "bs_price"]
+
+    def __init__(self, year_indices, min_length=2):
+        self._init_table(year_indices, min_length)
+
+    def _init_table(self, year_indices, min_length=2):
+        _lengths = []
+        _columns = {_col: [] for _col in ["date"] + self.COLUMNS}
+        self.max_dte = 0
+        for year_index in year_indices.values():
+            contract_index = year_index.contract_index
+            _max_dte = year_index.date_partition.max_dte
+            if contract_index.n_rows == 0:
+                continue
+            self.max_dte = max(self.max_dte, _max_dte)
+            _starts, _stops = contract_index.contract_starts, contract_index.contract_stops
+            #only the contracts which are newly listed weeklys i.e. which start at the new leg maturity
+            _mask = (contract_index.columns["dte"][_starts] == _max_dte) & (_stops - _starts >= min_length)
+            _starts, _stops = _starts[_mask], _stops[_mask]
+            _year_lengths = _stops - _starts
+            _rows = np.arange(_year_lengths.sum()) + np.repeat(_starts - (np.cumsum(_year_lengths) - _year_lengths),
+                                                                _year_lengths)
+            for _col, _values in contract_index.take(_rows, ["date"] + self.COLUMNS).items():
+                _columns[_col].append(np.asarray(_values, dtype="datetime64[ns]" if _col == "date" else np.float64))
+            _lengths.append(_year_lengths)
+
+        _lengths = np.concatenate(_lengths) if _lengths else np.array([], dtype=np.int64)
+        _starts = np.cumsum(_lengths) - _lengths
+        _columns = {_col: np.concatenate(_values) if _values else np.array([]) for _col, _values in _columns.items()}
+
+        #reorder the episodes by trade date so that the episodes of a trade date are a single slice
+        _order = np.argsort(_columns["date"][_starts], kind="stable") if len(_lengths) else _starts
+        _rows = np.arange(_lengths[_order].sum()) + np.repeat(_starts[_order] - (np.cumsum(_lengths[_order]) - _lengths[_order]),
+                                                              _lengths[_order])
+        self.lengths = _lengths[_order]
+        self.starts = np.cumsum(self.lengths) - self.lengths
+        self.n_episodes = len(self.lengths)
+        self.columns = {_col: _values[_rows] for _col, _values in _columns.items()}
+        self.trade_dates = self.columns["date"][self.starts]
+
+
+class FeatureStore:
+    """
+    Precomputed features of the rl episodes stored as .npy arrays which are memory mapped on load, so that
+    every episode sample (and every training process) reads zero copy slices of one copy of the features.
+
+    - states: (n_rows, N_STATE) market part of the state of every step of every episode - the position and
+      hedge ratio columns are left at zero and filled in by the environment
+    - market: (n_rows, 3) forward, option price and delta of every step used to compute the rewards
+    - episodes: (n_episodes, 2) first row and length of every episode, ordered by trade date
+    - date_features: (n_dates, len(DATE_FEATURES)) features of the market on each trade date
+
+    The trade date index (trade date -> slice of the episodes and row of the date features) is kept in the
+    meta file along with the fingerprint of the priced data the features were built from
+    """
+
+    _META = "meta.json"
+    _VERSION = 1
+    _ARRAYS = ["states", "market", "episodes", "date_features"]
+
+    MARKET = ["forward_price", "bs_price", "bs_delta"]
+    DATE_FEATURES = ["forward_price", "fwd_return", "max_dte", "atm_vol", "skew", "total_delta", "total_vega"]
+
+    def __init__(self, arrays, meta):
+        self.states = arrays["states"]
+        self.market = arrays["market"]
+        self.episodes = arrays["episodes"]
+        self.date_features = arrays["date_features"]
+        self.meta = meta
+        self.dates = pd.DatetimeIndex(meta["dates"])
+        self.n_episodes = len(self.episodes)
+
+    @staticmethod
+    def build(year_indices, source=None):
+        """
+        Computes the features of every episode step and every trade date of the year indices
+
+        :return: in memory FeatureStore
+        """
+        episodes = EpisodeTable(year_indices)
+        _cols = episodes.columns
+        _initial_forward = np.repeat(_cols["forward_price"][episodes.starts], episodes.lengths)
+        _zeros = np.zeros(len(_initial_forward))
+        states = State.compute(forward=_cols["forward_price"],
+                               strike=_cols["strike_price"],
+                               dte=_cols["dte"],
+                               vol=_cols["bs_vol"],
+                               delta=_cols["bs_delta"],
+                               vega=_cols["bs_vega"],
+                               price=_cols["bs_price"],
+                               initial_forward=_initial_forward,
+                               max_dte=episodes.max_dte if episodes.max_dte else 1,
+                               position=_zeros,
+                               hedge_ratio=_zeros)
+        market = np.column_stack([_cols[_col] for _col in FeatureStore.MARKET]) if episodes.n_episodes else \
+            np.empty((0, len(FeatureStore.MARKET)))
+
+        date_features = pd.concat([FeatureStore._compute_date_features(year_index.date_partition.data)
+                                   for year_index in year_indices.values()], axis=0)
+        date_features["fwd_return"] = np.log(date_features["forward_price"]).diff().fillna(0)
+
+        #the slice of the episodes traded on each date
+        _dates = date_features.index
+        _episode_start = np.searchsorted(episodes.trade_dates, _dates.values, side="left")
+        _episode_stop = np.searchsorted(episodes.trade_dates, _dates.values, side="right")
+        meta = {"version": FeatureStore._VERSION,
+                "source": source,
+                "state_features": State.FEATURES,
+                "market": FeatureStore.MARKET,
+                "date_features": FeatureStore.DATE_FEATURES,
+                "max_dte": float(episodes.max_dte),
+                "dates": [str(_date.date()) for _date in _dates],
+                "date_episodes": [[int(start), int(stop)] for start, stop in zip(_episode_start, _episode_stop)],
+                "created": str(datetime.now())}
+        arrays = {"states": states,
+                  "market": market,
+                  "episodes": np.column_stack([episodes.starts, episodes.lengths]).astype(np.int64),
+                  "date_features": date_features[FeatureStore.DATE_FEATURES].values.astype(np.float64)}
+        return FeatureStore(arrays, meta)
+
+    @staticmethod
+    def _compute_date_features(data):
+        """
+        The market features of each date are taken from the newly listed expiry (the max dte of the date) -
+        the atm vol is the vol nearest the forward, the skew is the 25 delta put vol less the 25 delta call vol
+        and the delta and vega are totalled over the strikes
+        """
+        if data.empty:
+            return pd.DataFrame(columns=FeatureStore.DATE_FEATURES, index=pd.DatetimeIndex([], name="date"))
+        _max_dte = data.groupby("date")["dte"].transform("max")
+        _listed = data[data["dte"] == _max_dte]
+        _is_call = _listed["cp_flag"].astype(str).str.upper().values == "C"
+        _grouped = _listed.groupby("date")
+
+        features = pd.DataFrame({"forward_price": _grouped["forward_price"].first(),
+                                 "max_dte": _grouped["dte"].first(),
+                                 "total_delta": _grouped["bs_delta"].sum(),
+                                 "total_vega": _grouped["bs_vega"].sum()})
+        _atm = np.abs(np.log(_listed["strike_price"] / _listed["forward_price"]))
+        features["atm_vol"] = _listed["bs_vol"].values[_listed.index.get_indexer(_atm.groupby(_listed["date"]).idxmin())]
+        _call_25 = pd.Series(np.where(_is_call, np.abs(_listed["bs_delta"] - 0.25), np.inf), index=_listed.index)
+        _put_25 = pd.Series(np.where(_is_call, np.inf, np.abs(_listed["bs_delta"] + 0.25)), index=_listed.index)
+        _call_vol = _listed["bs_vol"].values[_listed.index.get_indexer(_call_25.groupby(_listed["date"]).idxmin())]
+        _put_vol = _listed["bs_vol"].values[_listed.index.get_indexer(_put_25.groupby(_listed["date"]).idxmin())]
+        features["skew"] = _put_vol - _call_vol
+        return features
+
+    def get_date_episodes(self, date):
+        """
+        :return: (start, stop) slice of the episodes traded on the date
+        """
+        _idx = self.dates.get_loc(pd.Timestamp(date))
+        return tuple(self.meta["date_episodes"][_idx])
+
+    def get_date_features(self, date):
+        """
+        :return: view of the features of the date
+        """
+        return self.date_features[self.dates.get_loc(pd.Timestamp(date))]
+
+    def get_episode(self, episode):
+        """
+        :return: tuple of views of the states and the market data of the steps of the episode
+        """
+        start, length = self.episodes[episode]
+        return self.states[start:start + length], self.market[start:start + length]
+
+    def write(self, store_dir):
+        """
+        Writes the arrays and the meta file to store_dir
+        """
+        with AtomicWrite.directory(store_dir) as _tmp_dir:
+            for _name in self._ARRAYS:
+                np.save(join(_tmp_dir, "{}.npy".format(_name)), np.ascontiguousarray(getattr(self, _name)),
+                        allow_pickle=False)
+            with open(join(_tmp_dir, self._META), "w") as _meta:
+                json.dump(self.meta, _meta)
+
+    @staticmethod
+    def is_valid(store_dir, source=None):
+        _meta_path = join(store_dir, FeatureStore._META)
+        if not exists(_meta_path):
+            return False
+        with open(_meta_path) as _meta:
+            meta = json.load(_meta)
+        return meta.get("version") == FeatureStore._VERSION and meta.get("source") == source
+
+    @staticmethod
+    def load(store_dir, mmap=True):
+        """
+        Loads the store with the arrays memory mapped read only so that they are shared between processes
+        """
+        with open(join(store_dir, FeatureStore._META)) as _meta:
+            meta = json.load(_meta)
+        _mmap_mode = "r" if mmap else None
+        arrays = {_name: np.load(join(store_dir, "{}.npy".format(_name)), mmap_mode=_mmap_mode, allow_pickle=False)
+                  for _name in FeatureStore._ARRAYS}
+        return FeatureStore(arrays, meta)
@@ -0,0 +1,174 @@
+from os import makedirs
+from os.path import join
+from configuration import ConfigurationFactory
+from rl_engine.action import Action
+import numpy as np
+
+
+class SumTree:
+    """
+    Array backed binary sum tree over the priorities of the replay buffer. The leaves hold the priorities and
+    each parent holds the sum of its children, so both updating a batch of priorities and sampling a batch of
+    indices in proportion to their priority walk the log2(capacity) levels with one vectorised step per level
+    """
+
+    def __init__(self, capacity):
+        self._n_leaves = 1
+        while self._n_leaves < capacity:
+            self._n_leaves *= 2
+        self._tree = np.zeros(2 * self._n_leaves)
+
+    @property
+    def total(self):
+        return self._tree[1]
+
+    @property
+    def max_priority(self):
+        return self._tree[self._n_leaves:].max()
+
+    def update(self, indices, priorities):
+        _nodes = np.asarray(indices, dtype=np.int64) + self._n_leaves
+        self._tree[_nodes] = priorities
+        _nodes = np.unique(_nodes // 2)
+        while _nodes[0] >= 1:
+            self._tree[_nodes] = self._tree[2 * _nodes] + self._tree[2 * _nodes + 1]
+            if _nodes[0] == 1:
+                break
+            _nodes = np.unique(_nodes // 2)
+
+    def get(self, indices):
+        return self._tree[np.asarray(indices, dtype=np.int64) + self._n_leaves]
+
+    def find(self, values):
+        """
+        :return: the leaf index of each value of the cumulative priorities
+        """
+        values = np.array(values, dtype=np.float64)
+        _nodes = np.ones(len(values), dtype=np.int64)
+        while _nodes[0] < self._n_leaves:
+            _left = self._tree[2 * _nodes]
+            _go_right = values >= _left
+            values -= np.where(_go_right, _left, 0)
+            _nodes = 2 * _nodes + _go_right
+        return _nodes - self._n_leaves
+
+
+class ReplayBuffer:
+    """
+    Preallocated ring buffer of transitions for off-policy training on the HedgingEnvironment. The states,
+    actions, rewards, next states and dones are each one numpy array of the buffer capacity (optionally memory
+    mapped on disk for very large buffers) so inserting a batch of transitions is a slice assignment and there
+    is no memory churn once the buffer is allocated.
+
+    Batches are sampled uniformly or, if prioritized, in proportion to priority ** alpha with the importance
+    sampling weights of prioritized experience replay
+    """
+
+    _ARRAYS = ["states", "actions", "rewards", "next_states", "dones"]
+
+    def __init__(self, capacity=None, state_size=None, action_size=Action.N_ACTION, prioritized=None, alpha=None,
+                 beta=None, spill_dir=None, seed=0, config=None, dtype=np.float32):
+        self._init_config(config, capacity, state_size, prioritized, alpha, beta, spill_dir)
+        self._init_arrays(action_size, dtype)
+        self._rng = np.random.default_rng(seed)
+
+    def _init_config(self, config=None, capacity=None, state_size=None, prioritized=None, alpha=None, beta=None,
+                     spill_dir=None):
+        if config is None and None in (capacity, state_size, prioritized):
+            config = ConfigurationFactory.create_btest_config()
+        _rl_config = {} if config is None else config.get("rl_engine", {})
+        _buffer_config = _rl_config.get("replay_buffer", {})
+        self.capacity = _buffer_config.get("capacity", 1000000) if capacity is None else capacity
+        self.state_size = _rl_config.get("no_of_state", 9) if state_size is None else state_size
+        self.prioritized = _buffer_config.get("prioritized", False) if prioritized is None else prioritized
+        self.alpha = _buffer_config.get("alpha", 0.6) if alpha is None else alpha
+        self.beta = _buffer_config.get("beta", 0.4) if beta is None else beta
+        self.spill_dir = _buffer_config.get("spill_dir", None) if spill_dir is None else spill_dir
+
+    def _init_arrays(self, action_size, dtype):
+        _shapes = {"states": (self.capacity, self.state_size),
+                   "actions": (self.capacity, action_size),
+                   "rewards": (self.capacity,),
+                   "next_states": (self.capacity, self.state_size),
+                   "dones": (self.capacity,)}
+        if self.spill_dir is not None:
+            makedirs(self.spill_dir, exist_ok=True)
+        for _name in self._ARRAYS:
+            _dtype = np.bool_ if _name == "dones" else dtype
+            if self.spill_dir is None:
+                _array = np.zeros(_shapes[_name], dtype=_dtype)
+            else:
+                _array = np.lib.format.open_memmap(join(self.spill_dir, "{}.npy".format(_name)), mode="w+",
+                                                   dtype=_dtype, shape=_shapes[_name])
+            setattr(self, _name, _array)
+        self._tree = SumTree(self.capacity) if self.prioritized else None
+        self._next = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, states, actions, rewards, next_states, dones):
+        """
+        Inserts a batch of transitions (e.g. one step of all of the envs) overwriting the oldest transitions
+        once the buffer is full. New transitions get the max priority so they are sampled at least once
+        """
+        rewards = np.atleast_1d(rewards)
+        _n = len(rewards)
+        if _n > self.capacity:
+            #only the last capacity transitions would survive the insert
+            states, actions, rewards, next_states, dones = [np.asarray(_values)[-self.capacity:] for _values in
+                                                            [states, actions, rewards, next_states, dones]]
+            _n = self.capacity
+        _idx = (self._next + np.arange(_n)) % self.capacity
+        self.states[_idx] = np.reshape(states, (_n, self.state_size))
+        self.actions[_idx] = np.reshape(actions, (_n, -1))
+        self.rewards[_idx] = rewards
+        self.next_states[_idx] = np.reshape(next_states, (_n, self.state_size))
+        self.dones[_idx] = np.atleast_1d(dones)
+        if self._tree is not None:
+            _max_priority = self._tree.max_priority if self.size else 1.0
+            self._tree.update(_idx, np.full(_n, _max_priority))
+        self._next = (self._next + _n) % self.capacity
+        self.size = min(self.size + _n, self.capacity)
+        return _idx
+
+    def sample(self, batch_size):
+        """
+        :return: dict of the arrays of the sampled transitions along with their indices in the buffer and their
+        importance sampling weights (all ones for uniform sampling)
+        """
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty replay buffer")
+        if self._tree is None:
+            indices = self._rng.integers(0, self.size, batch_size)
+            weights = np.ones(batch_size)
+        else:
+            #stratified sampling - one value from each of batch_size equal segments of the total priority
+            _segment = self._tree.total / batch_size
+            _values = (np.arange(batch_size) + self._rng.uniform(size=batch_size)) * _segment
+            indices = np.minimum(self._tree.find(_values), self.size - 1)
+            _probs = self._tree.get(indices) / self._tree.total
+            weights = (self.size * _probs) ** -self.beta
+            weights /= weights.max()
+        batch = {_name: getattr(self, _name)[indices] for _name in self._ARRAYS}
+        batch["indices"] = indices
+        batch["weights"] = weights
+        return batch
+
+    def update_priorities(self, indices, priorities, eps=1e-6):
+        """
+        Sets the priorities of sampled transitions e.g. to their absolute td errors
+        """
+        if self._tree is None:
+            return
+        self._tree.update(indices, (np.abs(priorities) + eps) ** self.alpha)
+
+    def flush(self):
+        """
+        Writes the memory mapped arrays back to disk
+        """
+        for _name in self._ARRAYS:
+            _array = getattr(self, _name)
+            if isinstance(_array, np.memmap):
+                _array.flush()
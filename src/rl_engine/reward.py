@@ -0,0 +1,17 @@
+
+
+class Reward:
+    """
+    The reward of a step is the delta hedged pnl of the position over the step, as in PnLEngine.compute_leg_pnl
+    but with the hedge scaled by the hedge ratio chosen by the agent
+    """
+
+    @staticmethod
+    def dh_pnl(position, hedge_ratio, price_diff, fwd_diff, delta):
+        """
+        :return: the opt pnl of the position plus the pnl of hedging hedge_ratio of its delta (taken at the
+        start of the step)
+        """
+        opt_pnl = position * price_diff
+        delta_pnl = -position * fwd_diff * delta
+        return opt_pnl + hedge_ratio * delta_pnl
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+class State:
+    """
+    The state vector observed by the agent at each step of an episode. Every feature is computed for all of the
+    parallel episodes at once from the (n_envs,) arrays of the current rows of the episodes
+    """
+
+    FEATURES = ["log_moneyness",
+                "time_to_expiry",
+                "bs_vol",
+                "bs_delta",
+                "bs_vega",
+                "bs_price",
+                "fwd_return",
+                "position",
+                "hedge_ratio"]
+    N_STATE = len(FEATURES)
+
+    @staticmethod
+    def compute(forward, strike, dte, vol, delta, vega, price, initial_forward, max_dte, position, hedge_ratio):
+        """
+        :return: (n_envs, N_STATE) array of the states - prices are scaled by the forward so that the states of
+        different years and strikes are comparable
+        """
+        state = np.empty((len(forward), State.N_STATE))
+        state[:, 0] = np.log(strike / forward)
+        state[:, 1] = dte / max_dte
+        state[:, 2] = vol
+        state[:, 3] = delta
+        state[:, 4] = vega / forward
+        state[:, 5] = price / forward
+        state[:, 6] = np.log(forward / initial_forward)
+        state[:, 7] = position
+        state[:, 8] = hedge_ratio
+        return state
@@ -1,7 +1,62 @@
+import numpy as np
+import pandas as pd
+from pnl.leg_table import LegTable
+from utility.instrumentation import Instrumentation
 
 
 class Sizing:
+    """
+    Static sizing library - computes the size each leg of the stacked leg table is traded at. A leg keeps the
+    size it was traded at on its trade date for the whole of its history, and legs whose sized column is False
+    (a leg_sizing of no_sizing in the strategy config) are traded at unit size
+    """
+
+    #columns of the leg histories needed by each sizing method
+    COLUMNS = {"vega_target": ["bs_vega"]}
+
+    @staticmethod
+    def get_columns(sizing_params):
+        return Sizing.COLUMNS.get(sizing_params.get("sizing_method"), [])
+
+    @staticmethod
+    def compute_sizing(stacked, sizing_params):
+        """
+        :return: the size of every row of the stacked leg table under the sizing method (unit size if the
+        method is not set)
+        """
+        if sizing_params.get("sizing_method") == "vega_target":
+            return Sizing.compute_vega_sizing(stacked, sizing_params["target_vega"], sizing_params.get("max_size"))
+        return np.ones(len(stacked))
 
     @staticmethod
-    def compute_vega_sizing(ts):
-        pass
+    def compute_vega_sizing(stacked, target_vega, max_size=None):
+        """
+        Scales all of the legs traded on a trade date by the same notional so that the vega of the book traded
+        on the trade date (the sum of the long/short vega of its legs on entry) is the target vega. The target
+        vega is in the units of bs_vega. Legs with no vega on entry are left out of the book vega and trade dates
+        with no book vega are not traded.
+
+        A book whose legs net out to a near zero vega is scaled up without limit unless max_size is set, in which
+        case the size is capped at max_size. Unsized legs are left out of the book vega
+
+        :return: the size of every row of the stacked leg table
+        """
+        _leg_starts = np.flatnonzero(LegTable.first_rows(stacked["leg_id"].values))
+        _leg_lengths = np.diff(np.append(_leg_starts, len(stacked)))
+        _sized = stacked["sized"].values[_leg_starts] if "sized" in stacked else np.ones(len(_leg_starts), dtype=bool)
+
+        #the vega of each sized leg on entry summed into the book vega of its trade date
+        _entry_vega = stacked["long_short"].values[_leg_starts] * stacked["bs_vega"].values[_leg_starts]
+        _no_vega = _sized & ~np.isfinite(_entry_vega)
+        Instrumentation.count("sizing_legs_no_vega", _no_vega.sum())
+        _trade_date, _ = pd.factorize(stacked["trade_date"].values[_leg_starts])
+        _book_vega = np.abs(np.bincount(_trade_date, weights=np.where(_sized & ~_no_vega, _entry_vega, 0.)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            _size = np.where(_book_vega > 0, target_vega / _book_vega, 0.)
+        #trade dates with only unsized legs are not sized at all so they are not counted as zeroed
+        _has_sized = np.bincount(_trade_date, weights=_sized) > 0
+        Instrumentation.count("sizing_dates_zeroed", ((_size == 0) & _has_sized).sum())
+        if max_size is not None:
+            Instrumentation.count("sizing_dates_capped", (_size > max_size).sum())
+            _size = np.minimum(_size, max_size)
+        return np.repeat(np.where(_sized, _size[_trade_date], 1.), _leg_lengths)
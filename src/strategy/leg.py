@@ -1,9 +1,33 @@
+from collections import namedtuple
+
+
+class LegParams(namedtuple("LegParams", ["exdate", "strike_price", "cp_flag", "forward_price", "bs_delta"])):
+    """
+    The compact description of a leg selected on a trade date - the contract and its initial forward and delta
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def from_frame(data):
+        """
+        :return: list of the LegParams of each row of the data
+        """
+        return [LegParams(*_row) for _row in zip(*[data[_field].tolist() for _field in LegParams._fields])]
 
 
 class Leg:
+    """
+    A fixed strike option leg. The leg history is not copied into the leg - the leg only stores the row
+    offsets of its contract in the year's shared column store (see ContractIndex) and the history is
+    materialised when leg_data is asked for
+    """
+
+    __slots__ = ["exp_date", "strike", "opt_type", "_initial_forward", "_initial_delta", "_store", "_start", "_stop"]
 
-    def __init__(self, params=None):
+    def __init__(self, params=None, store=None):
         self._init_params(params)
+        self._init_history(store)
 
     def _init_params(self, params=None):
         #store the fixed strike option details in each leg
@@ -14,5 +38,34 @@ class Leg:
         self._initial_forward = params.forward_price
         self._initial_delta = params.bs_delta
 
+    def _init_history(self, store=None):
+        #store the offsets of the contract history in the shared column store
+        self._store = store
+        if store is None:
+            self._start, self._stop = 0, 0
+        else:
+            self._start, self._stop = store.get_offsets(self.exp_date, self.strike, self.opt_type)
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def offsets(self):
+        return self._start, self._stop
+
+    @property
+    def leg_data(self):
+        """
+        The leg history as a dataframe - built from the column store on each access
+        """
+        return self._store.get_frame(self._start, self._stop)
+
+    def get_column(self, column):
+        """
+        :return: a view of a single column of the leg history without materialising the dataframe
+        """
+        return self._store.columns[column][self._start:self._stop]
 
-    
\ No newline at end of file
+    def __len__(self):
+        return self._stop - self._start
@@ -1,30 +1,61 @@
 from os.path import dirname, join
 from configuration import ConfigurationFactory
-from datetime import datetime
 from manager.data import DataManager
+from manager.index import ContractIndex, DatePartition, StrikeIndex
+from manager.prefetch import YearPrefetcher
+from manager.shared import SharedYearData, SharedYearView
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import numpy as np
 import pandas as pd
-from strategy.leg import Leg
+from strategy.leg import Leg, LegParams
 from pricing.bs_model import BlackScholes
 from utility.date_utility import DateUtility
+from utility.instrumentation import Instrumentation
+
+#the year attached by a worker process of the parallel strategy factory - kept until the next year is sent
+_SHARED_YEAR = None
+
+
+def _select_trade_date_legs(year_descriptor, strat_config, strat_type, trade_dates):
+    """
+    Worker task selecting the legs of a range of trade dates from the shared year data
+    :return: dict of trade date -> leg params of the trade dates
+    """
+    global _SHARED_YEAR
+    _block_names = tuple(_col_meta["block"] for _col_meta in year_descriptor["columns"].values())
+    if _SHARED_YEAR is None or _SHARED_YEAR.block_names != _block_names:
+        if _SHARED_YEAR is not None:
+            _SHARED_YEAR.close()
+        _SHARED_YEAR = SharedYearView(year_descriptor)
+    return Strategy.select_legs_batch(strat_config, _SHARED_YEAR.get_many(trade_dates), _SHARED_YEAR.max_dte,
+                                      strat_type)
+
 
 class StrategyFactory:
 
-    def __init__(self):
+    def __init__(self, config=None, year_indices=None, skip_trade_dates=None):
         #initialise strategies container
-        self._init_params()
+        self._init_params(year_indices, skip_trade_dates)
         #load the configuration but purely for dates
-        self._init_date_config()
+        self._init_date_config(config)
         #step 1: initialise the filtered set of trading dates based on leg entry frequency
         self.create_strategies()
         #clean the strategies container removing redundant trade dates
         self._clean_strategies()
 
 
-    def _init_params(self):
+    def _init_params(self, year_indices=None, skip_trade_dates=None):
         self.strategies = {}
+        #optional dict of year -> YearIndex that has already been loaded (e.g. shared across a parameter sweep)
+        self._year_indices = {} if year_indices is None else year_indices
+        #optional dict of year -> trade dates whose results are already known (e.g. from the backtest cache)
+        #these are not built but are recorded in self.skipped_trade_dates if they would have been traded
+        self._skip_trade_dates = {} if skip_trade_dates is None else skip_trade_dates
+        self.skipped_trade_dates = {}
 
-    def _init_date_config(self):
-        self._config = ConfigurationFactory.create_btest_config()
+    def _init_date_config(self, config=None):
+        self._config = ConfigurationFactory.create_btest_config() if config is None else config
 
         #initialise start and end dates
         self.start_date = self._config["backtest_config"]["start_date"]
@@ -47,19 +78,41 @@ class StrategyFactory:
         self._year_end = _years.to_list()
         self._years = [str(y.year) for y in _years]
 
-    def _gen_trading_dates(self, data_trading_dates, pd_trading_dates):
+    @staticmethod
+    def get_backtest_years(config):
+        """
+        :return: the list of data years covered by the backtest start and end dates
+        """
+        _years = pd.date_range(start=pd.to_datetime(config["backtest_config"]["start_date"], format="%Y-%m-%d"),
+                               end=pd.to_datetime(config["backtest_config"]["end_date"], format="%Y-%m-%d"),
+                               freq="1Y")
+        return [str(y.year) for y in _years]
+
+    @staticmethod
+    def load_year_index(config, year):
+        """
+        :return: the YearIndex of the data year in the option expiry calendar and float precision of the config
+        """
+        return DataManager.load_year_index(year,
+                                           option_expiry_calendar=config["backtest_config"]["trading_params"]["option_expiry_calendar"],
+                                           downcast_floats=config.get("data_config", {}).get("downcast_floats", False))
+
+    @staticmethod
+    def load_year_indices(config):
+        """
+        :return: dict of year -> YearIndex of every data year of the backtest, to be shared between factories
+        """
+        return {year: StrategyFactory.load_year_index(config, year) for year in StrategyFactory.get_backtest_years(config)}
+
+    def _gen_trading_dates(self, date_partition, pd_trading_dates):
         """
         From the raw data we create the list of final trading dates and return the output as a list
         :return:
         """
 
-        # get the nearest date to start date but first we need to set it as an index
-        _tmp = pd.DataFrame(data_trading_dates["date"].unique(),
-                            index=data_trading_dates["date"].unique())
-        _first_available_date_idx = _tmp.index.get_loc(self.start_date,
-                                                       method='nearest')
-        _first_trade_date = data_trading_dates.iloc[_first_available_date_idx]["date"]
-        _data_trade_dates = data_trading_dates[data_trading_dates["date"] >= _first_trade_date]["date"].unique()
+        # get the nearest date to start date from the dates of the partition
+        _first_trade_date = date_partition.nearest_date(self.start_date)
+        _data_trade_dates = date_partition.dates[date_partition.dates >= _first_trade_date]
 
         # Finally apply the _data_trade_dates as a filter to _trading_date_range
         _mask = pd_trading_dates.isin(_data_trade_dates)
@@ -76,62 +129,126 @@ class StrategyFactory:
 
         :return: A list of trading dates based on the trading parameters
         """
-        print("{} - Initialising strategies".format(datetime.now()))
+        Instrumentation.log("Initialising strategies")
         #load frequencies and expiries from config
         self._leg_freq = self._config["backtest_config"]["trading_params"]["entry_freq"]
         self._opt_expiry_calendar = self._config["backtest_config"]["trading_params"]["option_expiry_calendar"]
 
-        for idx, year in enumerate(self._years):
-            #first we create the range of dates based on entry frequency
-            _trading_date_range = pd.date_range(start=self._year_start[idx],
-                                               end=self._year_end[idx],
-                                               freq=self._leg_freq)
-            #next we load the correct csv data
-            data = DataManager.load_priced_exchange_data(year,
-                                                         option_expiry_calendar=self._opt_expiry_calendar)
-            ##########
-            # step 1 #
-            ##########
-            #step 1: filter the trading date range we created above
-            #incase some of the data doesnt exist for those trading dates
-            _final_trading_dates = self._gen_trading_dates(data, _trading_date_range)
-            #end step 1: append these to self.strategies per year
-            self.strategies[year] = dict.fromkeys(_final_trading_dates)
-
-            ##########
-            # step 2 #
-            ##########
-            #step 2: from the clean list of trading dates we have we now need to create the strategy and leg
-            #objects from the leg data
-
-            #We initialise the configuration based on the strategy type (whether this is multileg or outright)
-            self._strat_config = self._config["backtest_config"][self._strat_type]
-
-            #we now need to collect the list of options that are in the delta strike range and create strategy
-            #objects assuming there are all 4 days to expiry in the weeklys
-            for trade_date in self.strategies[year]:
-                #we omit the trading day if there is no 4 dte option (i.e. max of dte)
-                new_leg_mty = data["dte"].max()
-                #step 1: first get all of the new weeklys that we trade on this date
-                #i.e. if we dont have any new weeklys to trade on this date then we skip this from the data
-                if (data[data["date"] == trade_date]["dte"] == new_leg_mty).value_counts().index[0] is True:
-                    print("{} - Creating strategies for trade date: {}".format(datetime.now(),
-                                                                               trade_date))
+        #the legs of the trade dates can be selected in parallel by worker processes reading the year from
+        #shared memory - the strategies themselves are always put together here
+        _factory_config = self._config.get("strategy_factory", {})
+        self._n_workers = _factory_config.get("n_workers", 1)
+        self._tasks_per_worker = _factory_config.get("tasks_per_worker", 4)
+
+        #the next year is loaded in the background while the strategies of the current year are built
+        _prefetch_depth = self._config.get("data_config", {}).get("prefetch_depth", 1)
+        with YearPrefetcher(self._years, self._load_year_index, depth=_prefetch_depth) as _year_loader, \
+                (ProcessPoolExecutor(max_workers=self._n_workers) if self._n_workers > 1 else nullcontext()) as pool:
+            for idx, year in enumerate(self._years):
+                with Instrumentation.span("year_{}".format(year), level=Instrumentation.YEAR):
+                    with Instrumentation.span("load_year_index", level=Instrumentation.YEAR):
+                        year_index = _year_loader.get(year)
+                    self._create_year_strategies(idx, year, year_index, pool)
+
+    def _select_legs_parallel(self, pool, date_partition, trade_dates):
+        """
+        Selects the legs of the trade dates across the pool - each task is a contiguous range of trade dates
+        and only the year's shared memory descriptor is sent to the workers
+
+        :return: dict of trade date -> leg params
+        """
+        if not trade_dates:
+            return {}
+        leg_params = {}
+        _n_tasks = min(len(trade_dates), self._n_workers * self._tasks_per_worker)
+        with SharedYearData(date_partition) as shared_year:
+            _tasks = [pool.submit(_select_trade_date_legs, shared_year.descriptor, self._strat_config,
+                                  self._strat_type, list(_dates))
+                      for _dates in np.array_split(np.array(trade_dates, dtype=object), _n_tasks)]
+            for _task in _tasks:
+                leg_params.update(_task.result())
+        return leg_params
+
+    def _create_year_strategies(self, idx, year, year_index, pool=None):
+        """
+        Creates the strategies for every trading date of the year
+        """
+        #first we create the range of dates based on entry frequency
+        _trading_date_range = pd.date_range(start=self._year_start[idx],
+                                           end=self._year_end[idx],
+                                           freq=self._leg_freq)
+        #the year's data has the contracts indexed and the dates partitioned so that
+        #each leg's history and each trade date's data is a single lookup
+        contract_index = year_index.contract_index
+        date_partition = year_index.date_partition
+        ##########
+        # step 1 #
+        ##########
+        #step 1: filter the trading date range we created above
+        #incase some of the data doesnt exist for those trading dates
+        _final_trading_dates = self._gen_trading_dates(date_partition, _trading_date_range)
+        #end step 1: append these to self.strategies per year
+        self.strategies[year] = dict.fromkeys(_final_trading_dates)
+        self.skipped_trade_dates[year] = []
+        _skip_trade_dates = self._skip_trade_dates.get(year, ())
+
+        ##########
+        # step 2 #
+        ##########
+        #step 2: from the clean list of trading dates we have we now need to create the strategy and leg
+        #objects from the leg data
+
+        #We initialise the configuration based on the strategy type (whether this is multileg or outright)
+        self._strat_config = self._config["backtest_config"][self._strat_type]
+
+        #the legs of all of the trade dates to build are selected up front in one pass over their rows, split
+        #across the workers if we have a pool
+        _build_trade_dates = [trade_date for trade_date in self.strategies[year]
+                              if date_partition.new_listing[trade_date] and trade_date not in _skip_trade_dates]
+        with Instrumentation.span("select_legs", level=Instrumentation.YEAR):
+            if pool is not None:
+                _leg_params = self._select_legs_parallel(pool, date_partition, _build_trade_dates)
+            else:
+                _leg_params = Strategy.select_legs_batch(self._strat_config,
+                                                         date_partition.get_many(_build_trade_dates),
+                                                         date_partition.max_dte, self._strat_type)
+
+        #we now need to collect the list of options that are in the delta strike range and create strategy
+        #objects assuming there are all 4 days to expiry in the weeklys
+        for trade_date in self.strategies[year]:
+            #we omit the trading day if there is no 4 dte option (i.e. max of dte)
+            #step 1: first get all of the new weeklys that we trade on this date
+            #i.e. if we dont have any new weeklys to trade on this date then we skip this from the data
+            if date_partition.new_listing[trade_date] and trade_date in _skip_trade_dates:
+                self.skipped_trade_dates[year].append(trade_date)
+                Instrumentation.count("trade_dates_cached")
+            elif date_partition.new_listing[trade_date]:
+                Instrumentation.log("Creating strategies for trade date: {}".format(trade_date),
+                                    level=Instrumentation.DETAIL)
+                with Instrumentation.span("trade_date", level=Instrumentation.DETAIL):
                     self.strategies[year][trade_date] = Strategy(config_params=self._strat_config,
                                                                  trade_date=trade_date,
-                                                                 data=data,
-                                                                 strat_type=self._strat_type)
-                    print("{} - Finished creating strategies for trade date: {}".format(datetime.now(),
-                                                                                        trade_date))
-                else:
-                    print("{} - Skipping trade date: {} as there is no leg data".format(datetime.now(),
-                                                                                        trade_date))
+                                                                 strat_type=self._strat_type,
+                                                                 contract_index=contract_index,
+                                                                 date_partition=date_partition,
+                                                                 leg_params=_leg_params.get(trade_date))
+                Instrumentation.count("strategies_built")
+            else:
+                Instrumentation.log("Skipping trade date: {} as there is no leg data".format(trade_date),
+                                    level=Instrumentation.DETAIL)
+                Instrumentation.count("trade_dates_skipped")
+
+    def _load_year_index(self, year):
+        if year in self._year_indices:
+            return self._year_indices[year]
+        return StrategyFactory.load_year_index(self._config, year)
+
     def _clean_strategies(self):
         """
         We clean the strategies object removing redundant dates
         :return:
         """
-        print("{} - Cleaning Strategies".format(datetime.now()))
+        Instrumentation.log("Cleaning Strategies", level=Instrumentation.YEAR)
         for yyyy in list(self.strategies.keys()):
             _tmp = {}
             for t_stamp, strat in list(self.strategies[yyyy].items()):
@@ -143,109 +260,123 @@ class StrategyFactory:
 
 class Strategy:
 
-    def __init__(self, config_params=None, data=None, trade_date=None, strat_type=None):
+    def __init__(self, config_params=None, data=None, trade_date=None, strat_type=None, contract_index=None,
+                 date_partition=None, leg_params=None):
         #initialise config
         self._init_config(config_params)
-        #create the data filter for the trade date
-        self._tmp = data[data["date"] == trade_date]
+        #the contract index and date partition are normally shared across all strategies of the year
+        self._contract_index = ContractIndex(data) if contract_index is None else contract_index
+        #the legs may already have been selected e.g. by a worker process of the parallel strategy factory
+        if leg_params is None:
+            if date_partition is None:
+                date_partition = DatePartition(data)
+            leg_params = Strategy.select_legs(config_params, date_partition.get(trade_date), date_partition.max_dte,
+                                              strat_type)
+        #the legs only point into the contract index so we do not keep the trade date data
+        self._init_legs(leg_params)
+
+        Instrumentation.count("legs_built", len(getattr(self, "call_legs", {})) + len(getattr(self, "put_legs", {})))
+        Instrumentation.log("Successfully created strategies", level=Instrumentation.DETAIL)
+
+    def _init_config(self, config_params):
+        self._strat_config = config_params
+
+    def _init_legs(self, leg_params):
+        for call_put_legs in leg_params:
+            #create the self.call_legs = {} / self.put_legs = {} container
+            #the legs point into the contract index which has already dropped the duplicate dte rows
+            setattr(self, call_put_legs, {_leg_id: Leg(params=_params, store=self._contract_index)
+                                          for _leg_id, _params in leg_params[call_put_legs].items()})
+
+    @staticmethod
+    def select_legs(strat_config, trade_date_data, new_leg_mty, strat_type):
+        """
+        Selects the contracts traded on the trade date from the trade date's data
+
+        :return: dict of call_legs/put_legs -> dict of leg_id -> LegParams
+        """
+        _leg_params = Strategy.select_legs_batch(strat_config, trade_date_data, new_leg_mty, strat_type)
+        return next(iter(_leg_params.values()), {})
+
+    @staticmethod
+    def select_legs_batch(strat_config, data, new_leg_mty, strat_type):
+        """
+        Selects the contracts traded on each of the trade dates in one pass over the rows of all of the dates
+
+        :param data: the rows of the trade dates - the rows of each trade date must be contiguous
+        :return: dict of trade date -> dict of call_legs/put_legs -> dict of leg_id -> LegParams
+        """
+        _dates = data["date"].values
+        _new_date = np.ones(len(_dates), dtype=bool)
+        _new_date[1:] = _dates[1:] != _dates[:-1]
+        _date_starts = np.flatnonzero(_new_date)
+        #the trade date of each row as a position into trade_dates
+        _date_group = np.cumsum(_new_date) - 1
+        trade_dates = pd.DatetimeIndex(_dates[_date_starts])
 
         #if we have a multileg strategy we need to create the legs from the delta strike
         if strat_type == "multi_leg_strategy":
-            self._gen_multileg_strategy(data=data)
+            return Strategy._select_multileg_legs(strat_config, data, trade_dates, _date_group)
         elif strat_type == "outright_strategy":
             #need to call initialise call/put legs
-            self._gen_outright_strategy(data=data)
-
-        print("{} - Successfully created strategies".format(datetime.now()))
-
-    def _init_config(self, config_params):
-        self._strat_config = config_params
+            return Strategy._select_outright_legs(strat_config, data, trade_dates, _date_group, _date_starts,
+                                                  new_leg_mty)
+        return {}
 
-    def _gen_outright_strategy(self, data=None):
-        for call_put_legs in self._strat_config:
-            #create the self.call_legs = {} / self.put_legs = {} container
-            setattr(self, call_put_legs, {})
-            for _leg_id in self._strat_config[call_put_legs]:
-                _leg_params = self._strat_config[call_put_legs][_leg_id]
-                #get the fixed strike here
-                fixed_strike = self._get_fixed_strike(data=data, leg_params=_leg_params)
-                #we need to convert this row to a pandas series from the squeeze method
-                fs_leg_params = self._tmp.loc[(self._tmp["strike_price"] == fixed_strike) & \
-                                              (self._tmp["cp_flag"] == _leg_params["call_put"].upper())]
-                fixed_strike_leg_params = fs_leg_params[fs_leg_params["dte"] == data["dte"].max()].drop_duplicates(subset="dte", keep="last").squeeze(axis=0)
-                #create the leg object
-                _leg = Leg(params=fixed_strike_leg_params)
-                _leg.leg_data = data.loc[(data["exdate"] == _leg.exp_date) & \
-                                         (data["strike_price"] == _leg.strike) & \
-                                         (data["cp_flag"] == _leg.opt_type)]
-                # the data has duplicate rows which is annoying - we drop them here
-                # note we had dte 4,4,3,3,2,2,1,1,0 so we drop these for the same fixed strike to expiry
-                _leg.leg_data.drop_duplicates(subset="dte", keep="last", inplace=True)
-                # add to the leg collection
-                getattr(self, call_put_legs)[_leg_id] = _leg
-
-    def _get_fixed_strike(self, data=None, leg_params=None):
+    @staticmethod
+    def _select_outright_legs(strat_config, data, trade_dates, date_group, date_starts, new_leg_mty):
         # for each trade entry date we need to compute the fixed strike of the option
         # pseudo method means we should be using the atm vol with the forward
-
-        # step 1: get the forward price
-        _fwd = self._tmp["forward_price"].iloc[0]
-        # step 2: get the atm vol by finding the fixed strike nearest to the forward price
         # spx strikes round every 5 as the min increment
         base = 5
-        _atm_strike = int(base * round(_fwd / base))
-        _atm_vol = self._tmp.loc[(self._tmp["strike_price"] == _atm_strike) & \
-                                 (self._tmp["cp_flag"] == leg_params["call_put"].upper())]["bs_vol"].values[0]
-        # step 3 compute the fixed strike option that we trade and create the leg
-        _fixed_strike = BlackScholes.invert_bs_delta_get_strike(forward=_fwd,
-                                                                delta_strike=leg_params["delta_strike"],
-                                                                mty=data["dte"].max(),
-                                                                vol=_atm_vol,
-                                                                option_type=leg_params["call_put"])
-        # step 4 round the fixed strike to nearest tradeable strike
-        fixed_strike = int(base * round(_fixed_strike / base))
-        return fixed_strike
-
-    def _gen_multileg_strategy(self, data=None):
-        # apply delta strike range
-        self._apply_delta_strike_filter()
-        # initialise call and put legs
-        self._init_multi_call_legs(data=data)
-        self._init_multi_put_legs(data=data)
-
-    def _apply_delta_strike_filter(self):
-        self._call_delta_strikes = self._tmp.loc[(self._tmp['bs_delta'] >= self._strat_config["call_legs"]["delta_strike_range"][1]) \
-                                                 & (self._tmp['bs_delta'] <= self._strat_config["call_legs"]["delta_strike_range"][0])]
-        self._put_delta_strikes = self._tmp.loc[(self._tmp['bs_delta'] >= self._strat_config["put_legs"]["delta_strike_range"][1]) \
-                                                 & (self._tmp['bs_delta'] <= self._strat_config["put_legs"]["delta_strike_range"][0])]
-
-    def _init_multi_call_legs(self, data=None):
-        self.call_legs = {}
-        for idx in range(len(self._call_delta_strikes)):
-            leg_id = "leg_{}".format(str(idx + 1))
-            _leg = Leg(params=self._call_delta_strikes.iloc[idx])
-            _leg.leg_data = data.loc[(data["exdate"] == _leg.exp_date) & \
-                                     (data["strike_price"] == _leg.strike) & \
-                                     (data["cp_flag"] == _leg.opt_type)]
-            #the data has duplicate rows which is annoying - we drop them here
-            #note we had dte 4,4,3,3,2,2,1,1,0 so we drop these for the same fixed strike to expiry
-            _leg.leg_data.drop_duplicates(subset="dte", keep="last", inplace=True)
-
-            #add to the leg collection
-            self.call_legs[leg_id] = _leg
-
-    def _init_multi_put_legs(self, data=None):
-        self.put_legs = {}
-        for idx in range(len(self._put_delta_strikes)):
-            leg_id = "leg_{}".format(str(idx + 1))
-            _leg = Leg(params=self._put_delta_strikes.iloc[idx])
-            _leg.leg_data = data.loc[(data["exdate"] == _leg.exp_date) & \
-                                     (data["strike_price"] == _leg.strike) & \
-                                     (data["cp_flag"] == _leg.opt_type)]
-            #the data has duplicate rows which is annoying - we drop them here
-            #note we had dte 4,4,3,3,2,2,1,1,0 so we drop these for the same fixed strike to expiry
-            _leg.leg_data.drop_duplicates(subset="dte", keep="last", inplace=True)
-
-            #add to the leg collection
-            self.put_legs[leg_id] = _leg
-
+        leg_params = {trade_date: {call_put_legs: {} for call_put_legs in strat_config} for trade_date in trade_dates}
+        _strike = data["strike_price"].values.astype(float)
+        _vol = data["bs_vol"].values
+        #the strikes are bucketed by trade date and call/put
+        _buckets = 2 * date_group + BlackScholes.is_call_flag(data["cp_flag"].values)
+        #the atm vol is read off the first row of the strike on the trade date and the legs are the last row of
+        #the strike at the new leg maturity
+        _atm_index = StrikeIndex(_buckets, _strike, keep="first")
+        _new_legs = np.flatnonzero(data["dte"].values == new_leg_mty)
+        _leg_index = StrikeIndex(_buckets[_new_legs], _strike[_new_legs], keep="last")
+
+        # step 1: get the forward price of every trade date
+        _fwd = data["forward_price"].values[date_starts]
+        # step 2: get the atm vol by finding the listed strike nearest to the forward price
+        _atm_strike = base * np.round(_fwd / base)
+        for call_put_legs in strat_config:
+            for _leg_id, _leg_config in strat_config[call_put_legs].items():
+                _is_call = BlackScholes.is_call_flag([_leg_config["call_put"]])[0]
+                _leg_buckets = 2 * np.arange(len(trade_dates)) + _is_call
+                _atm_rows = _atm_index.nearest(_leg_buckets, _atm_strike)
+                _atm_vol = np.where(_atm_rows >= 0, _vol[_atm_rows], np.nan)
+                # step 3 compute the fixed strike option that we trade on every trade date
+                _fixed_strike = BlackScholes.invert_bs_delta_get_strike_array(forward=_fwd,
+                                                                              delta_strike=_leg_config["delta_strike"],
+                                                                              mty=new_leg_mty,
+                                                                              vol=_atm_vol,
+                                                                              is_call=_is_call)
+                # step 4 round the fixed strike to the nearest listed strike
+                _rows = _leg_index.nearest(_leg_buckets, base * np.round(_fixed_strike / base))
+                _selected = np.flatnonzero(_rows >= 0)
+                Instrumentation.count("legs_unresolved", len(trade_dates) - len(_selected))
+                for _date_pos, _params in zip(_selected, LegParams.from_frame(data.iloc[_new_legs[_rows[_selected]]])):
+                    leg_params[trade_dates[_date_pos]][call_put_legs][_leg_id] = _params
+        return leg_params
+
+    @staticmethod
+    def _select_multileg_legs(strat_config, data, trade_dates, date_group):
+        # apply delta strike range and initialise call and put legs
+        leg_params = {trade_date: {} for trade_date in trade_dates}
+        _delta = data["bs_delta"].values
+        for call_put_legs in ["call_legs", "put_legs"]:
+            _delta_strike_range = strat_config[call_put_legs]["delta_strike_range"]
+            _in_range = (_delta >= _delta_strike_range[1]) & (_delta <= _delta_strike_range[0])
+            _params = LegParams.from_frame(data[_in_range])
+            #the legs of each trade date are contiguous as the rows of the trade dates are
+            _bounds = np.append(0, np.cumsum(np.bincount(date_group[_in_range], minlength=len(trade_dates))))
+            for _date_pos, trade_date in enumerate(trade_dates):
+                leg_params[trade_date][call_put_legs] = {"leg_{}".format(str(idx + 1)): _leg_params
+                                                         for idx, _leg_params in
+                                                         enumerate(_params[_bounds[_date_pos]:_bounds[_date_pos + 1]])}
+        return leg_params
@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+from os import makedirs, replace
+from os.path import exists
+import shutil
+
+
+class AtomicWrite:
+    """
+    Writes go to a temporary path which is only swapped in once the write has completed, so that a crashed
+    write never leaves a half written file or directory behind
+    """
+
+    @staticmethod
+    @contextmanager
+    def directory(path):
+        """
+        :return: the temporary directory to write into - it replaces path on exit
+        """
+        _tmp_dir = path + ".tmp"
+        if exists(_tmp_dir):
+            shutil.rmtree(_tmp_dir)
+        makedirs(_tmp_dir)
+        yield _tmp_dir
+        if exists(path):
+            shutil.rmtree(path)
+        replace(_tmp_dir, path)
+
+    @staticmethod
+    @contextmanager
+    def file(path, mode="w"):
+        """
+        :return: the temporary file opened for writing - it replaces path on exit
+        """
+        with open(path + ".tmp", mode) as _file:
+            yield _file
+        replace(path + ".tmp", path)
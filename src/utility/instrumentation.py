@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from datetime import datetime
+from os import makedirs
+from os.path import dirname, isabs, join
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+
+class Instrumentation:
+    """
+    Process wide instrumentation for the pipeline - replaces the print-timestamp progress reporting with
+
+    - nested timing spans (e.g. stage > year > trade date) aggregated by their path
+    - counters (rows loaded, legs built, implied vol failures, duplicates dropped, ...)
+    - levelled logging so that the per trade date lines are only printed at high verbosity
+    - opt-in cProfile and tracemalloc hooks
+    - a json run report written at the end of the run
+
+    The verbosity levels are 0 (silent), 1 (stages), 2 (years) and 3 (trade dates / strategies)
+    """
+
+    STAGE = 1
+    YEAR = 2
+    DETAIL = 3
+
+    _verbosity = 1
+    _report_path = None
+    _profile = False
+    _trace_memory = False
+
+    _profiler = None
+    _started = None
+    _stack = []
+    #the traced memory peak of the run (first) and of each open span before the peak was last reset
+    _peaks = [0]
+    _spans = {}
+    _counters = {}
+
+    @staticmethod
+    def configure(config=None):
+        """
+        Configures the instrumentation from the "instrumentation" section of the backtest config and starts the
+        profiling hooks if they are switched on. Any previously collected spans and counters are cleared
+        """
+        config = {} if config is None else config
+        Instrumentation.reset()
+        Instrumentation._verbosity = config.get("verbosity", 1)
+        Instrumentation._report_path = config.get("report_path", None)
+        Instrumentation._profile = config.get("profile", False)
+        Instrumentation._trace_memory = config.get("trace_memory", False)
+        if Instrumentation._profile:
+            Instrumentation._profiler = cProfile.Profile()
+            Instrumentation._profiler.enable()
+        if Instrumentation._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def reset():
+        if Instrumentation._profiler is not None:
+            Instrumentation._profiler.disable()
+            Instrumentation._profiler = None
+        Instrumentation._started = datetime.now()
+        Instrumentation._stack = []
+        Instrumentation._peaks = [0]
+        Instrumentation._spans = {}
+        Instrumentation._counters = {}
+
+    @staticmethod
+    def log(message, level=1):
+        if level <= Instrumentation._verbosity:
+            print("{} - {}".format(datetime.now(), message))
+
+    @staticmethod
+    def count(name, n=1):
+        Instrumentation._counters[name] = Instrumentation._counters.get(name, 0) + int(n)
+
+    @staticmethod
+    @contextmanager
+    def span(name, level=1):
+        """
+        Times the enclosed block. Spans nest, and are aggregated by their full path so that e.g. every trade date
+        span of a year is one entry in the report with its count, total and max time.
+
+        When tracing memory the traced peak is reset on entry so the peak of a span is its own and not that of
+        whatever ran before it - the peak up to the reset is carried by the enclosing span
+        """
+        _trace_memory = Instrumentation._trace_memory and tracemalloc.is_tracing()
+        if _trace_memory:
+            Instrumentation._peaks[-1] = max(Instrumentation._peaks[-1], tracemalloc.get_traced_memory()[1])
+            Instrumentation._peaks.append(0)
+            tracemalloc.reset_peak()
+        Instrumentation._stack.append(name)
+        _path = "/".join(Instrumentation._stack)
+        _start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _seconds = time.perf_counter() - _start
+            Instrumentation._stack.pop()
+            _peak = None
+            if _trace_memory:
+                #combine the span's peak with the peak the enclosing span carries
+                _peak = max(Instrumentation._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                Instrumentation._peaks[-1] = max(Instrumentation._peaks[-1], _peak)
+            _span = Instrumentation._spans.setdefault(_path, {"level": level, "count": 0, "total_s": 0.0, "max_s": 0.0})
+            _span["count"] += 1
+            _span["total_s"] += _seconds
+            _span["max_s"] = max(_span["max_s"], _seconds)
+            if _peak is not None:
+                _span["peak_mem_mb"] = max(_span.get("peak_mem_mb", 0), _peak / 1e6)
+            Instrumentation.log("Finished {} in {:.3f}s".format(_path, _seconds), level=level)
+
+    @staticmethod
+    def report(n_profile_rows=30):
+        """
+        :return: dict of the run - spans, counters and the memory/profile summaries if they were switched on
+        """
+        report = {"started": str(Instrumentation._started),
+                  "finished": str(datetime.now()),
+                  "spans": Instrumentation._spans,
+                  "counters": Instrumentation._counters}
+        if Instrumentation._trace_memory and tracemalloc.is_tracing():
+            _current, _peak = tracemalloc.get_traced_memory()
+            _peak = max([_peak] + Instrumentation._peaks)
+            report["memory"] = {"current_mb": _current / 1e6, "peak_mb": _peak / 1e6}
+        if Instrumentation._profiler is not None:
+            Instrumentation._profiler.disable()
+            _stream = io.StringIO()
+            pstats.Stats(Instrumentation._profiler, stream=_stream).sort_stats("cumulative").print_stats(n_profile_rows)
+            report["profile"] = _stream.getvalue().splitlines()
+            Instrumentation._profiler.enable()
+        return report
+
+    @staticmethod
+    def write_report(root_dir=None):
+        """
+        Writes the json run report to the configured report_path (relative paths are taken from root_dir)
+        """
+        if Instrumentation._report_path is None:
+            return None
+        _path = Instrumentation._report_path
+        if not isabs(_path) and root_dir is not None:
+            _path = join(root_dir, _path)
+        if dirname(_path):
+            makedirs(dirname(_path), exist_ok=True)
+        with open(_path, "w") as _report:
+            json.dump(Instrumentation.report(), _report, indent=2, default=str)
+        Instrumentation.log("Successfully wrote run report {}".format(_path))
+        return _path
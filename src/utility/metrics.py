@@ -1,40 +1,194 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from utility.date_utility import DateUtility
 
 
 class StrategyMetrics:
+    """
+    Static metrics of strategy indices. Every metric takes a single index (series) or a wide dataframe of indices
+    with one column per strategy variant, and computes all of the columns at once on the underlying array.
+    Columns may start or end with nans e.g. variants run over different date ranges. Gaps within a column are
+    forward filled before the returns are taken as pandas pct_change does (but the end of a column is not, so a
+    variant that has stopped has no returns rather than zero returns).
+
+    Given a window of N days (e.g. "21d", "3m" or "1y" - see DateUtility.get_days) a metric is computed over the
+    trailing window of N returns ending on each date, i.e. over the last N + 1 values of the index as in
+    pct_change().rolling(N), rather than over the whole index. Windows that are not complete are nan
+    """
+
+    ANN_FACTOR = 252
+    #max number of elements of the trailing windows materialised at once by the rolling metrics
+    CHUNK_SIZE = 10000000
+
+    @staticmethod
+    def compute_info_ratio(timeseries, window=None):
+        return StrategyMetrics._compute(timeseries, StrategyMetrics._info_ratio, window)
+
+    @staticmethod
+    def compute_returns(timeseries, window=None):
+        return StrategyMetrics._compute(timeseries, StrategyMetrics._returns, window)
+
+    @staticmethod
+    def compute_volatility(timeseries, window=None):
+        return StrategyMetrics._compute(timeseries, StrategyMetrics._volatility, window)
+
+    @staticmethod
+    def compute_cvar(timeseries, n_days=21, q=0.05, window=None):
+        """
+        The mean of the n_days returns at or below their q quantile
+        """
+        n_days = DateUtility.get_days(n_days) if isinstance(n_days, str) else n_days
+        return StrategyMetrics._compute(timeseries, lambda x: StrategyMetrics._cvar(x, n_days, q), window)
 
     @staticmethod
-    def compute_info_ratio(timeseries):
-        mean = StrategyMetrics.compute_returns(timeseries)
-        vol = StrategyMetrics.compute_volatility(timeseries)
-        ir = mean / vol
-        return ir
+    def compute_max_drawdown(timeseries, window=None):
+        """
+        The largest fall of the index from a previous peak as a (negative) fraction of the peak
+        """
+        return StrategyMetrics._compute(timeseries, StrategyMetrics._max_drawdown, window)
 
     @staticmethod
-    def compute_returns(timeseries):
-        mean = ((timeseries.iloc[-1] / timeseries.iloc[0]) ** (1 / timeseries.shape[0]) - 1) * 252
-        return mean
+    def compute_calmar_ratio(timeseries, window=None):
+        """
+        The annualised return over the size of the max drawdown
+        """
+        return StrategyMetrics._compute(timeseries, StrategyMetrics._calmar_ratio, window)
 
     @staticmethod
-    def compute_volatility(timeseries):
-        vol = timeseries.pct_chamge(1).std() * np.sqrt(252)
-        return vol
+    def compute_summary(timeseries, window=None):
+        """
+        :return: dataframe of every metric (columns) of each strategy index (rows) - for ranking the variants
+        of a sweep. With a window the metrics are those of the trailing window ending on the last date
+        """
+        if isinstance(timeseries, pd.Series):
+            timeseries = timeseries.to_frame()
+        if window is not None:
+            #only the last window (of N returns so N + 1 values) is needed for the summary
+            timeseries = timeseries.iloc[-(DateUtility.get_days(window) + 1):]
+        return pd.DataFrame({"annualised_return": StrategyMetrics.compute_returns(timeseries),
+                             "annualised_volatility": StrategyMetrics.compute_volatility(timeseries),
+                             "info_ratio": StrategyMetrics.compute_info_ratio(timeseries),
+                             "cvar": StrategyMetrics.compute_cvar(timeseries),
+                             "max_drawdown": StrategyMetrics.compute_max_drawdown(timeseries),
+                             "calmar_ratio": StrategyMetrics.compute_calmar_ratio(timeseries)})
 
     @staticmethod
-    def compute_cvar(timeseries, n_days=21, q=0.05):
-        rets = timeseries.pct_change(n_days)
-        thresholds = rets.quintile(q)
-        cvar = pd.Series(index=thresholds.index, dtype=float)
+    def _compute(timeseries, func, window=None):
+        """
+        Applies the metric func to every column of the indices - func takes an array with the dates along the
+        last axis and reduces that axis
+
+        :return: the metric of each column (a single value for a series) or, with a window, the metric of the
+        trailing window ending on each date of each column
+        """
+        _values = np.asarray(timeseries.values, dtype=float)
+        _values = StrategyMetrics._fill_gaps(_values[:, None] if _values.ndim == 1 else _values)
+        if window is None:
+            metric = func(_values.T)
+            if isinstance(timeseries, pd.Series):
+                return metric[0]
+            return pd.Series(metric, index=timeseries.columns)
 
-        for idx in thresholds.index:
-            location = rets[idx] <= thresholds.loc[idx]
-            cvar.loc[idx] = rets.loc[location, idx].mean()
+        metric = StrategyMetrics._rolling(_values, DateUtility.get_days(window) + 1, func)
+        if isinstance(timeseries, pd.Series):
+            return pd.Series(metric[:, 0], index=timeseries.index, name=timeseries.name)
+        return pd.DataFrame(metric, index=timeseries.index, columns=timeseries.columns)
 
-        return cvar
+    @staticmethod
+    def _fill_gaps(values):
+        #forward fills the nans between the first and last values of each (n_dates, n_cols) column
+        _rows = np.arange(len(values))[:, None]
+        _valid = ~np.isnan(values)
+        _last_valid = np.maximum.accumulate(np.where(_valid, _rows, -1), axis=0)
+        _inside = (_last_valid >= 0) & (_rows <= np.where(_valid, _rows, -1).max(axis=0))
+        return np.where(_inside, np.take_along_axis(values, np.maximum(_last_valid, 0), axis=0), values)
+
+    @staticmethod
+    def _rolling(values, window, func):
+        """
+        Applies the metric func to the trailing windows of window values of the columns - the windows are strided
+        views of the values and are materialised a chunk of columns at a time to bound the memory. Windows with
+        any nan values are nan
+        """
+        n_dates, n_cols = values.shape
+        metric = np.full((n_dates, n_cols), np.nan)
+        if n_dates < window:
+            return metric
+        #(n_dates - window + 1, n_cols, window) view of the windows ending on each date
+        _windows = sliding_window_view(values, window, axis=0)
+        _chunk_cols = max(1, StrategyMetrics.CHUNK_SIZE // (_windows.shape[0] * window))
+        for _start in range(0, n_cols, _chunk_cols):
+            _cols = slice(_start, _start + _chunk_cols)
+            metric[window - 1:, _cols] = func(_windows[:, _cols])
+        #the number of nan values in each window from the running count of the nans of each column
+        _nans = np.cumsum(np.isnan(values), axis=0)
+        _window_nans = _nans[window - 1:] - np.vstack([np.zeros((1, n_cols)), _nans[:-window]])
+        metric[window - 1:][_window_nans > 0] = np.nan
+        return metric
 
-        pass
+    @staticmethod
+    def _first_last(x):
+        #the first and last non nan values along the last axis and the number of values between them
+        _valid = ~np.isnan(x)
+        _first = np.argmax(_valid, axis=-1)
+        _last = x.shape[-1] - 1 - np.argmax(_valid[..., ::-1], axis=-1)
+        return (np.take_along_axis(x, _first[..., None], axis=-1)[..., 0],
+                np.take_along_axis(x, _last[..., None], axis=-1)[..., 0],
+                _last - _first + 1)
+
+    @staticmethod
+    def _pct_change(x, n_days=1):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return x[..., n_days:] / x[..., :-n_days] - 1
+
+    @staticmethod
+    def _returns(x):
+        _first, _last, _n = StrategyMetrics._first_last(x)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return ((_last / _first) ** (1 / _n) - 1) * StrategyMetrics.ANN_FACTOR
+
+    @staticmethod
+    def _volatility(x):
+        _rets = StrategyMetrics._pct_change(x)
+        _n = (~np.isnan(_rets)).sum(axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            _mean = np.nansum(_rets, axis=-1) / _n
+            _var = np.nansum((_rets - _mean[..., None]) ** 2, axis=-1) / (_n - 1)
+        return np.where(_n > 1, np.sqrt(_var) * np.sqrt(StrategyMetrics.ANN_FACTOR), np.nan)
+
+    @staticmethod
+    def _info_ratio(x):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return StrategyMetrics._returns(x) / StrategyMetrics._volatility(x)
+
+    @staticmethod
+    def _cvar(x, n_days, q):
+        if x.shape[-1] <= n_days:
+            return np.full(x.shape[:-1], np.nan)
+        _rets = StrategyMetrics._pct_change(x, n_days)
+        #linearly interpolated quantile of the non nan returns (the nans are sorted to the end)
+        _n = (~np.isnan(_rets)).sum(axis=-1)
+        _pos = np.maximum(_n - 1, 0) * q
+        _lower = np.floor(_pos).astype(np.int64)
+        _upper = np.minimum(_lower + 1, np.maximum(_n - 1, 0))
+        _sorted = np.sort(_rets, axis=-1)
+        _lower_rets = np.take_along_axis(_sorted, _lower[..., None], axis=-1)[..., 0]
+        _upper_rets = np.take_along_axis(_sorted, _upper[..., None], axis=-1)[..., 0]
+        _threshold = _lower_rets + (_upper_rets - _lower_rets) * (_pos - _lower)
+        _tail = _rets <= _threshold[..., None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(_tail, _rets, 0).sum(axis=-1) / _tail.sum(axis=-1)
+
+    @staticmethod
+    def _max_drawdown(x):
+        _peak = np.fmax.accumulate(x, axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            _drawdown = x / _peak - 1
+        _drawdown = np.where(np.isnan(_drawdown), np.inf, _drawdown).min(axis=-1)
+        return np.where(np.isinf(_drawdown), np.nan, _drawdown)
 
     @staticmethod
-    def compute_calmar_ratio():
-        pass
\ No newline at end of file
+    def _calmar_ratio(x):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return StrategyMetrics._returns(x) / np.abs(StrategyMetrics._max_drawdown(x))
@@ -0,0 +1,47 @@
+##the tests import the modules from src as the entry points do
+import json
+import sys
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "src"))
+
+import pytest
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    """
+    Raw option data of two short synthetic years with the DataManager pointed at it
+    """
+    from benchmark.synthetic import SyntheticDataGenerator
+    from manager.data import DataManager
+    _generator = SyntheticDataGenerator(n_days=12, n_strikes=8, seed=0)
+    for yy in ["2015", "2016"]:
+        _generator.write(yy, str(tmp_path))
+    monkeypatch.setattr(DataManager, "ROOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+
+@pytest.fixture
+def priced_root(data_root):
+    """
+    The synthetic years priced into priced_data
+    """
+    from pricing.pricer import Application
+    Application(config={"instrumentation": {"verbosity": 0},
+                        "pricer_config": {"start_year": 2015, "end_year": 2016}}).run()
+    return data_root
+
+
+@pytest.fixture
+def btest_config():
+    """
+    The repo backtest config over the synthetic years, run silently
+    """
+    with open(join(dirname(dirname(abspath(__file__))), "conf", "backtest_config.json")) as _config:
+        config = json.load(_config)
+    config["backtest_config"]["start_date"] = "2015-01-01"
+    config["backtest_config"]["end_date"] = "2016-12-31"
+    config["instrumentation"] = {"verbosity": 0}
+    return config
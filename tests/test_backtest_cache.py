@@ -0,0 +1,61 @@
+import copy
+from os.path import join
+import pandas as pd
+import pytest
+from app.incremental import IncrementalBacktest
+from manager.data import DataManager
+from pnl.backtest_cache import BacktestCache
+from pnl.pnl_calculation import PnLEngine
+from strategy.strategy import StrategyFactory
+
+
+def _hits(config, cache_dir):
+    #the trade dates of each year that the next incremental run would read from the cache
+    cache = BacktestCache(cache_dir, config)
+    hits = {}
+    for year, year_index in StrategyFactory.load_year_indices(config).items():
+        _date_partition = year_index.date_partition
+        keys = BacktestCache.trade_date_keys(_date_partition, _date_partition.dates[_date_partition.new_listing.values])
+        hits[year] = (len(cache.hits(year, keys)), len(keys))
+    return hits
+
+
+@pytest.fixture
+def full_index(priced_root, btest_config):
+    return PnLEngine(config=btest_config).run(strategies=StrategyFactory(config=btest_config).strategies)
+
+
+def test_rerun_hits_the_cache(full_index, btest_config, tmp_path):
+    cache_dir = str(tmp_path / "backtest_cache")
+    assert all(_n_hits == 0 for _n_hits, _ in _hits(btest_config, cache_dir).values())
+    pd.testing.assert_frame_equal(IncrementalBacktest(config=btest_config, cache_dir=cache_dir).run(), full_index)
+    assert all(_n_hits == _n_keys > 0 for _n_hits, _n_keys in _hits(btest_config, cache_dir).values())
+    backtest = IncrementalBacktest(config=btest_config, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(backtest.run(), full_index)
+    assert not any(backtest.strategies.values())
+
+
+def test_changed_data_misses_the_cache(priced_root, btest_config, tmp_path):
+    cache_dir = str(tmp_path / "backtest_cache")
+    IncrementalBacktest(config=btest_config, cache_dir=cache_dir).run()
+    _path = DataManager.get_priced_data_path("2016")
+    data = pd.read_csv(_path, float_precision="round_trip")
+    #only the trade dates whose window covers the last date depend on it
+    data.loc[data["date"] == data["date"].max(), "bs_price"] += 1.
+    data.to_csv(_path, index=False)
+    hits = _hits(btest_config, cache_dir)
+    assert hits["2015"][0] == hits["2015"][1]
+    assert 0 < hits["2016"][1] - hits["2016"][0] < hits["2016"][1]
+    full_index = PnLEngine(config=btest_config).run(strategies=StrategyFactory(config=btest_config).strategies)
+    pd.testing.assert_frame_equal(IncrementalBacktest(config=btest_config, cache_dir=cache_dir).run(), full_index)
+
+
+def test_changed_config_or_version_misses_the_cache(priced_root, btest_config, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "backtest_cache")
+    IncrementalBacktest(config=btest_config, cache_dir=cache_dir).run()
+    config = copy.deepcopy(btest_config)
+    config["backtest_config"]["multi_leg_strategy"]["call_legs"]["delta_strike_range"] = [0.4, 0.1]
+    assert BacktestCache.config_hash(config) != BacktestCache.config_hash(btest_config)
+    assert all(_n_hits == 0 for _n_hits, _ in _hits(config, cache_dir).values())
+    monkeypatch.setattr(BacktestCache, "_VERSION", BacktestCache._VERSION + 1)
+    assert all(_n_hits == 0 for _n_hits, _ in _hits(btest_config, cache_dir).values())
@@ -0,0 +1,13 @@
+import json
+from benchmark.benchmark import BenchmarkSuite
+from configuration import ConfigurationFactory
+
+
+def test_benchmark_is_silent_and_ignores_the_repo_config(tmp_path, capsys, monkeypatch):
+    def _create_btest_config(*args, **kwargs):
+        raise AssertionError("the benchmark must not read the repo config")
+    monkeypatch.setattr(ConfigurationFactory, "create_btest_config", _create_btest_config)
+    report = BenchmarkSuite(n_days=(5,), n_strikes=5, trace_memory=False, work_dir=str(tmp_path)).run()
+    assert capsys.readouterr().out == ""
+    stages = json.loads(json.dumps(report))["runs"][0]["stages"]
+    assert stages["strategy_factory"]["legs"] > 0 and stages["pnl_engine"]["rows"] == stages["strategy_factory"]["legs"]
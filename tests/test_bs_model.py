@@ -0,0 +1,80 @@
+import warnings
+import numpy as np
+import pytest
+from pricing.bs_model import BlackScholes
+
+
+@pytest.fixture
+def chain():
+    #calls and puts either side of the forward including expired options
+    rng = np.random.default_rng(0)
+    _n = 200
+    return {"forward": rng.uniform(1900, 2100, _n),
+            "strike": 5 * np.round(rng.uniform(1700, 2300, _n) / 5),
+            "mty": rng.choice([0, 1, 3, 7, 30], _n).astype(float),
+            "vol": rng.uniform(0.05, 0.6, _n),
+            "cp_flag": rng.choice(["C", "P"], _n)}
+
+
+def test_greeks_array_matches_scalar(chain):
+    _is_call = BlackScholes.is_call_flag(chain["cp_flag"])
+    price, delta, vega = BlackScholes.compute_greeks_array(chain["forward"], chain["strike"], chain["mty"],
+                                                           chain["vol"], _is_call)
+    _price_array = BlackScholes.compute_price_array(chain["forward"], chain["strike"], chain["mty"], chain["vol"],
+                                                    _is_call)
+    for i in range(len(price)):
+        _args = dict(forward=chain["forward"][i], strike=chain["strike"][i], mty=chain["mty"][i],
+                     vol=chain["vol"][i], option_type=chain["cp_flag"][i])
+        assert price[i] == pytest.approx(BlackScholes.compute_price(**_args), abs=1e-10)
+        assert _price_array[i] == pytest.approx(BlackScholes.compute_price(**_args), abs=1e-10)
+        assert delta[i] == pytest.approx(BlackScholes.compute_delta(**_args), abs=1e-12)
+        assert vega[i] == pytest.approx(BlackScholes.compute_vega(**_args), abs=1e-10)
+
+
+def test_implied_vol_array_matches_scalar_solver(chain):
+    _is_call = BlackScholes.is_call_flag(chain["cp_flag"])
+    _price = BlackScholes.compute_price_array(chain["forward"], chain["strike"], chain["mty"], chain["vol"], _is_call)
+    vol, status = BlackScholes.compute_vol_from_price_array(chain["forward"], chain["strike"], chain["mty"], _price,
+                                                            _is_call)
+    assert (status[chain["mty"] == 0] == BlackScholes.IV_EXPIRED).all()
+    for i in np.flatnonzero(status == BlackScholes.IV_CONVERGED):
+        _vol = BlackScholes.compute_vol_from_price(chain["forward"][i], chain["strike"][i], chain["mty"][i],
+                                                   _price[i], option_type=chain["cp_flag"][i])
+        #deep otm options have no vega so their vol is only recovered to the price
+        _repriced = BlackScholes.compute_price(chain["forward"][i], chain["strike"][i], chain["mty"][i], vol[i],
+                                               option_type=chain["cp_flag"][i])
+        assert _repriced == pytest.approx(_price[i], abs=1e-6)
+        if BlackScholes.compute_vega(chain["forward"][i], chain["strike"][i], chain["mty"][i], chain["vol"][i]) > 1e-2:
+            assert vol[i] == pytest.approx(_vol, abs=1e-6)
+            assert vol[i] == pytest.approx(chain["vol"][i], abs=1e-6)
+
+
+def test_implied_vol_array_flags_arbitrage():
+    _forward = np.full(3, 2000.)
+    _strike = np.array([1900., 2000., 2100.])
+    vol, status = BlackScholes.compute_vol_from_price_array(_forward, _strike, np.full(3, 7.), np.array([50., 2000., 10.]),
+                                                            np.array([True, True, True]))
+    np.testing.assert_array_equal(status, [BlackScholes.IV_BELOW_INTRINSIC, BlackScholes.IV_ABOVE_MAX,
+                                           BlackScholes.IV_CONVERGED])
+    np.testing.assert_array_equal(vol[:2], [0, 0])
+
+
+def test_implied_vol_array_is_silent_on_vanishing_vega():
+    #an itm quote whose newton steps pass through vols with no vega must not warn on every pricing run
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        vol, status = BlackScholes.compute_vol_from_price_array(np.array([2014.279120091155]), np.array([1805.]),
+                                                                np.array([30.]), np.array([210.4751013044663]),
+                                                                np.array([True]))
+    assert status[0] == BlackScholes.IV_CONVERGED
+    assert vol[0] == pytest.approx(0.20081382632432832, abs=1e-6)
+
+
+def test_invert_delta_strike_array_matches_scalar(chain):
+    _is_call = BlackScholes.is_call_flag(chain["cp_flag"])
+    _delta = np.where(_is_call, 0.25, -0.25)
+    strike = BlackScholes.invert_bs_delta_get_strike_array(chain["forward"], _delta, chain["mty"], chain["vol"],
+                                                           _is_call)
+    for i in range(len(strike)):
+        assert strike[i] == pytest.approx(BlackScholes.invert_bs_delta_get_strike(
+            chain["forward"][i], _delta[i], chain["mty"][i], chain["vol"][i], option_type=chain["cp_flag"][i]))
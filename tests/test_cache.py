@@ -0,0 +1,46 @@
+from os.path import join
+import numpy as np
+import pandas as pd
+from manager.cache import ColumnarCache
+
+
+def _priced(tmp_path):
+    data = pd.DataFrame({"date": pd.to_datetime(["2015-01-02", "2015-01-02", "2015-01-05"]),
+                         "cp_flag": ["C", "P", "C"],
+                         "strike_price": [2000, 2005, 2010],
+                         "bs_vol": [0.15, np.nan, 0.1512345678901]})
+    source_path = join(str(tmp_path), "priced.csv")
+    data.to_csv(source_path, index=False)
+    return data, source_path
+
+
+def test_round_trip(tmp_path):
+    data, source_path = _priced(tmp_path)
+    cache_dir = join(str(tmp_path), "cache")
+    ColumnarCache.write(data, cache_dir, source_path)
+    assert ColumnarCache.is_valid(cache_dir, source_path)
+    for mmap in [True, False]:
+        cached = ColumnarCache.read(cache_dir, mmap=mmap)
+        assert cached["cp_flag"].dtype == "category"
+        pd.testing.assert_frame_equal(cached.astype({"cp_flag": object}), data)
+
+
+def test_downcast_round_trip(tmp_path):
+    data, source_path = _priced(tmp_path)
+    cache_dir = join(str(tmp_path), "cache")
+    ColumnarCache.write(data, cache_dir, source_path, downcast_floats=True)
+    assert ColumnarCache.is_valid(cache_dir, source_path, downcast_floats=True)
+    assert not ColumnarCache.is_valid(cache_dir, source_path)
+    cached = ColumnarCache.read(cache_dir)
+    assert cached["bs_vol"].dtype == np.float32
+    assert cached["strike_price"].dtype == data["strike_price"].dtype
+    np.testing.assert_allclose(cached["bs_vol"], data["bs_vol"], rtol=1e-6)
+
+
+def test_stale_when_source_changes(tmp_path):
+    data, source_path = _priced(tmp_path)
+    cache_dir = join(str(tmp_path), "cache")
+    assert not ColumnarCache.is_valid(cache_dir, source_path)
+    ColumnarCache.write(data, cache_dir, source_path)
+    data.iloc[:2].to_csv(source_path, index=False)
+    assert not ColumnarCache.is_valid(cache_dir, source_path)
@@ -0,0 +1,22 @@
+import pytest
+import configuration
+from configuration import ConfigurationFactory
+
+
+def test_loads_the_default_config():
+    assert "backtest_config" in ConfigurationFactory.create_btest_config()
+
+
+def test_missing_config_raises(tmp_path, monkeypatch):
+    with pytest.raises(FileNotFoundError):
+        ConfigurationFactory.create_btest_config(conf_path=str(tmp_path / "missing.json"))
+    monkeypatch.setattr(configuration, "exists", lambda path: False)
+    with pytest.raises(FileNotFoundError):
+        ConfigurationFactory.create_btest_config()
+
+
+def test_invalid_config_raises(tmp_path):
+    _conf_path = tmp_path / "backtest_config.json"
+    _conf_path.write_text('{"backtest_config": ')
+    with pytest.raises(ValueError):
+        ConfigurationFactory.create_btest_config(conf_path=str(_conf_path))
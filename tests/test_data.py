@@ -0,0 +1,11 @@
+import pandas as pd
+import pytest
+from manager.data import DataManager
+
+
+@pytest.mark.parametrize("chunksize", [97, 1000000])
+def test_streaming_matches_legacy_loader(data_root, chunksize):
+    legacy = DataManager.load_exchange_data_and_apply_days_to_expiry_filter("2015", opt_expiry_filter=8)
+    streamed = DataManager.load_exchange_data_streaming("2015", opt_expiry_filter=8, chunksize=chunksize)
+    assert 0 < len(streamed) < len(DataManager.load_exchange_data("2015"))
+    pd.testing.assert_frame_equal(streamed, legacy[streamed.columns])
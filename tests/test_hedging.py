@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pnl.hedging import HedgingEngine
+from pnl.pnl_calculation import PnLEngine
+
+
+def _stacked_legs(n_legs=12, max_days=9, seed=0):
+    #legs of different lengths with nan deltas on the first day of some legs and within the leg histories
+    rng = np.random.default_rng(seed)
+    legs = []
+    for _leg_id in range(n_legs):
+        _n_days = int(rng.integers(1, max_days + 1))
+        _delta = rng.uniform(-1, 1, _n_days)
+        _delta[rng.random(_n_days) < 0.2] = np.nan
+        if _leg_id % 3 == 0:
+            _delta[0] = np.nan
+        legs.append(pd.DataFrame({"leg_id": _leg_id,
+                                  "date": pd.bdate_range("2015-01-02", periods=_n_days),
+                                  "bs_price": rng.uniform(1, 10, _n_days),
+                                  "forward_price": 2000 + rng.normal(0, 20, _n_days).cumsum(),
+                                  "bs_delta": _delta,
+                                  "long_short": rng.choice([-1., 1.])}))
+    return pd.concat(legs, ignore_index=True)
+
+
+def _reference_dh_pnl(stacked, kind, param):
+    #per leg simulation of the hedge held from each day to the next
+    dh_pnl = []
+    for _, leg in stacked.groupby("leg_id", sort=False):
+        _price, _fwd, _delta = leg["bs_price"].values, leg["forward_price"].values, leg["bs_delta"].values
+        _long_short = leg["long_short"].values[0]
+        _hedge = np.nan
+        for i in range(len(leg)):
+            if i == 0:
+                dh_pnl.append(np.nan)
+            else:
+                dh_pnl.append(_long_short * (_price[i] - _price[i - 1]) - _long_short * (_fwd[i] - _fwd[i - 1]) * _hedge)
+            if kind == "none":
+                _hedge = 0.
+            elif kind == "every" and i % param == 0:
+                _hedge = _delta[i]
+            elif kind == "band" and (i == 0 or np.isnan(_hedge) or abs(_delta[i] - _hedge) > param):
+                _hedge = _delta[i]
+    return np.array(dh_pnl)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_dh_pnl_matches_per_leg_simulation(seed):
+    stacked = _stacked_legs(seed=seed)
+    hedging = HedgingEngine(["1d", "2d", "band_0.2", "none"])
+    pnl = PnLEngine.compute_leg_pnl(stacked, hedging=hedging)
+    assert hedging.pnl_columns == ["dh_pnl", "dh_pnl_2d", "dh_pnl_band_0.2", "dh_pnl_none"]
+    for _column, (_, _kind, _param) in zip(hedging.pnl_columns, hedging.schedules):
+        np.testing.assert_allclose(pnl[_column].values, _reference_dh_pnl(stacked, _kind, _param), equal_nan=True)
+
+
+def test_band_rebalances_when_no_hedge_is_held():
+    _delta = np.array([np.nan, 0.5, 0.52, np.nan, 0.9])
+    _hedge = HedgingEngine.hedge_positions(_delta, np.arange(5), "band", 0.1)
+    np.testing.assert_array_equal(_hedge, [np.nan, 0.5, 0.5, 0.5, 0.9])
+
+
+def test_aggregate_keeps_rows_with_nan_in_other_schedules():
+    leg_pnl = pd.DataFrame({"date": pd.to_datetime(["2015-01-02", "2015-01-02", "2015-01-05", "2015-01-05"]),
+                            "opt_pnl": [1., 2., np.nan, 4.],
+                            "dh_pnl": [0.5, 1., 1., 2.],
+                            "dh_pnl_band_0.1": [np.nan, 1.5, 3., np.nan]})
+    total_pnl = PnLEngine.aggregate_leg_pnl(leg_pnl)
+    #the row without an opt pnl is dropped from every column but the nans of the band schedule are not
+    np.testing.assert_array_equal(total_pnl["opt_pnl"].values, [3., 4.])
+    np.testing.assert_array_equal(total_pnl["dh_pnl"].values, [1.5, 2.])
+    np.testing.assert_array_equal(total_pnl["dh_pnl_band_0.1"].values, [1.5, 0.])
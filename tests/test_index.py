@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from manager.data import DataManager
+from manager.index import ContractIndex, DatePartition
+
+
+@pytest.fixture
+def data(data_root):
+    #a year of weekly rows (with their duplicates) thinned out and shuffled so the contracts are ragged and
+    #their rows are out of order
+    data = DataManager.load_exchange_data_and_apply_days_to_expiry_filter("2015", opt_expiry_filter=8)
+    rng = np.random.default_rng(0)
+    return data.iloc[rng.permutation(len(data))[:int(0.7 * len(data))]]
+
+
+def _reference_leg_data(data, exdate, strike, cp_flag):
+    #the per leg masking of the original strategy
+    leg_data = data.loc[(data["exdate"] == exdate) & (data["strike_price"] == strike) & (data["cp_flag"] == cp_flag)]
+    return leg_data.drop_duplicates(subset="dte", keep="last")
+
+
+def test_contract_slices_match_masking(data):
+    contract_index = ContractIndex(data)
+    _contracts = data[ContractIndex.KEYS].drop_duplicates()
+    assert len(contract_index.contract_starts) == len(_contracts)
+    for exdate, strike, cp_flag in _contracts.itertuples(index=False):
+        pd.testing.assert_frame_equal(contract_index.get_leg_data(exdate, strike, cp_flag),
+                                      _reference_leg_data(data, exdate, strike, cp_flag))
+    assert contract_index.get_offsets(pd.Timestamp("2030-01-01"), 1., "C") == (0, 0)
+
+
+def test_date_partition_matches_masking(data):
+    date_partition = DatePartition(data)
+    new_leg_mty = data["dte"].max()
+    assert list(date_partition.dates) == sorted(data["date"].unique())
+    for trade_date in date_partition.dates:
+        _rows = data[data["date"] == trade_date]
+        pd.testing.assert_frame_equal(date_partition.get(trade_date), _rows)
+        assert date_partition.date_max_dte[trade_date] == _rows["dte"].max()
+        _is_new = (_rows["dte"] == new_leg_mty).values
+        assert date_partition.new_listing[trade_date] == (_is_new.sum() > (~_is_new).sum())
+    assert date_partition.new_listing.any() and not date_partition.new_listing.all()
+    _dates = date_partition.dates[[3, 0, 5]]
+    pd.testing.assert_frame_equal(date_partition.get_many(_dates),
+                                  pd.concat([data[data["date"] == _date] for _date in _dates]))
+    assert date_partition.get(pd.Timestamp("2030-01-01")).empty
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utility.metrics import StrategyMetrics
+
+
+@pytest.fixture
+def indices():
+    #a wide frame of indices starting late, with an internal gap and with no gaps
+    rng = np.random.default_rng(0)
+    indices = pd.DataFrame(100 * np.exp(rng.normal(0, 0.01, (300, 3)).cumsum(axis=0)),
+                           index=pd.bdate_range("2015-01-01", periods=300))
+    indices.iloc[:50, 1] = np.nan
+    indices.iloc[120:125, 2] = np.nan
+    return indices
+
+
+def test_volatility_fills_gaps_as_pandas():
+    _index = pd.Series([100, 101, np.nan, 102, 103.])
+    assert StrategyMetrics.compute_volatility(_index) == pytest.approx(0.0786020818)
+    assert StrategyMetrics.compute_volatility(_index) == pytest.approx(_index.pct_change().std() * np.sqrt(252))
+
+
+def test_volatility_matches_pandas(indices):
+    _volatility = StrategyMetrics.compute_volatility(indices)
+    pd.testing.assert_series_equal(_volatility, indices.pct_change().std() * np.sqrt(252))
+
+
+def test_rolling_volatility_matches_pandas(indices):
+    _volatility = StrategyMetrics.compute_volatility(indices, window="21d")
+    pd.testing.assert_frame_equal(_volatility, indices.pct_change().rolling(21).std() * np.sqrt(252))
+
+
+def test_rolling_metrics_match_per_window_reference(indices):
+    #the metrics of each trailing window of 21 returns (22 values) computed one column and window at a time
+    _returns = StrategyMetrics.compute_returns(indices, window="21d")
+    _drawdown = StrategyMetrics.compute_max_drawdown(indices, window="21d")
+    _filled = indices.ffill()
+    for _col in indices.columns:
+        for _end in range(21, len(indices), 17):
+            _window = _filled[_col].iloc[_end - 21:_end + 1]
+            if _window.isna().any():
+                assert np.isnan(_returns[_col].iloc[_end]) and np.isnan(_drawdown[_col].iloc[_end])
+                continue
+            assert _returns[_col].iloc[_end] == pytest.approx(
+                ((_window.iloc[-1] / _window.iloc[0]) ** (1 / len(_window)) - 1) * 252)
+            assert _drawdown[_col].iloc[_end] == pytest.approx((_window / _window.cummax() - 1).min())
+
+
+def test_cvar_matches_per_column_reference(indices):
+    _cvar = StrategyMetrics.compute_cvar(indices, n_days=21, q=0.05)
+    for _col in indices.columns:
+        _rets = indices[_col].pct_change(21).dropna()
+        _threshold = np.quantile(_rets, 0.05)
+        assert _cvar[_col] == pytest.approx(_rets[_rets <= _threshold].mean())
+
+
+def test_summary_window_is_last_rolling_window(indices):
+    _summary = StrategyMetrics.compute_summary(indices, window="21d")
+    pd.testing.assert_series_equal(_summary["annualised_volatility"],
+                                   StrategyMetrics.compute_volatility(indices, window="21d").iloc[-1],
+                                   check_names=False)
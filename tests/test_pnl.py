@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pnl.pnl_calculation import PnLEngine
+
+
+@pytest.fixture
+def stacked():
+    #legs traded on different dates with overlapping histories and a nan price inside one of the histories
+    rng = np.random.default_rng(0)
+    legs = []
+    for _leg_id in range(10):
+        _n_days = int(rng.integers(2, 8))
+        _price = rng.uniform(1, 10, _n_days)
+        if _leg_id == 4:
+            _price[2] = np.nan
+        legs.append(pd.DataFrame({"leg_id": _leg_id,
+                                  "date": pd.bdate_range("2015-01-02", periods=_n_days) + pd.offsets.BDay(_leg_id // 2),
+                                  "bs_price": _price,
+                                  "forward_price": 2000 + rng.normal(0, 20, _n_days).cumsum(),
+                                  "bs_delta": rng.uniform(-1, 1, _n_days),
+                                  "long_short": rng.choice([-1., 1.])}))
+    return pd.concat(legs, ignore_index=True)
+
+
+def _reference_total_pnl(stacked):
+    #the per leg diffs and shifts of the original engine, concatenated and summed by date
+    pnl = []
+    for _, leg in stacked.groupby("leg_id", sort=False):
+        leg = leg.copy()
+        leg["opt_pnl"] = leg["long_short"] * leg["bs_price"].diff()
+        leg["delta_pnl"] = -leg["long_short"] * leg["forward_price"].diff() * leg["bs_delta"].shift()
+        leg["dh_pnl"] = leg["opt_pnl"] + leg["delta_pnl"]
+        pnl.append(leg.filter(["date", "opt_pnl", "dh_pnl"]).set_index("date"))
+    return pd.concat(pnl, axis=0).dropna().groupby("date").sum()
+
+
+def _reference_strategy_index(total_pnl):
+    #the element by element index of the original engine
+    strat_index = pd.DataFrame(index=total_pnl.index, columns=total_pnl.columns, dtype=float)
+    strat_index.iloc[:1] = 100
+    for _col in total_pnl.columns:
+        for i in range(1, len(strat_index)):
+            strat_index.iloc[i, strat_index.columns.get_loc(_col)] = strat_index[_col].iloc[i - 1] + \
+                                                                      total_pnl[_col].iloc[i - 1]
+    return strat_index
+
+
+def test_total_pnl_matches_per_leg_engine(stacked):
+    total_pnl = PnLEngine.aggregate_leg_pnl(PnLEngine.compute_leg_pnl(stacked))
+    pd.testing.assert_frame_equal(total_pnl, _reference_total_pnl(stacked))
+
+
+def test_strategy_index_matches_element_by_element_index(stacked):
+    _config = {"backtest_config": {"trading_params": {"strat_type": {"method": "multi_leg_strategy"}},
+                                   "multi_leg_strategy": {}}}
+    total_pnl = _reference_total_pnl(stacked)
+    strat_index = PnLEngine(config=_config).create_strategy_index(total_pnl)
+    pd.testing.assert_frame_equal(strat_index, _reference_strategy_index(total_pnl))
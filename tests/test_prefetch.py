@@ -0,0 +1,56 @@
+import threading
+import time
+import pytest
+from manager.prefetch import YearPrefetcher
+from strategy.strategy import StrategyFactory
+
+YEARS = ["2015", "2016", "2017", "2018"]
+
+
+def _failing_load(year):
+    if year == "2017":
+        raise FileNotFoundError(year)
+    return "data {}".format(year)
+
+
+@pytest.mark.parametrize("depth", [0, 1, 2])
+def test_load_errors_are_raised_for_their_year(depth):
+    with YearPrefetcher(YEARS, _failing_load, depth=depth) as prefetcher:
+        assert prefetcher.get("2015") == "data 2015"
+        assert prefetcher.get("2016") == "data 2016"
+        with pytest.raises(FileNotFoundError, match="2017"):
+            prefetcher.get("2017")
+        assert prefetcher.get("2018") == "data 2018"
+
+
+def test_years_are_asked_for_in_order():
+    with YearPrefetcher(YEARS, _failing_load) as prefetcher:
+        with pytest.raises(ValueError):
+            prefetcher.get("2016")
+
+
+@pytest.mark.parametrize("depth", [1, 2])
+def test_at_most_depth_years_are_loaded_ahead(depth):
+    _lock = threading.Lock()
+    _counts = {"loaded": 0, "taken": 0, "ahead": 0}
+
+    def _load(year):
+        with _lock:
+            _counts["loaded"] += 1
+            _counts["ahead"] = max(_counts["ahead"], _counts["loaded"] - _counts["taken"])
+        return year
+
+    with YearPrefetcher(YEARS, _load, depth=depth) as prefetcher:
+        for year in YEARS:
+            #give the prefetch thread time to run ahead
+            time.sleep(0.05)
+            with _lock:
+                _counts["taken"] += 1
+            assert prefetcher.get(year) == year
+    assert _counts["ahead"] == depth
+
+
+def test_factory_raises_the_error_of_a_missing_year(priced_root, btest_config):
+    btest_config["backtest_config"]["end_date"] = "2017-12-31"
+    with pytest.raises(FileNotFoundError):
+        StrategyFactory(config=btest_config)
@@ -0,0 +1,45 @@
+from os import remove
+from os.path import join
+import pandas as pd
+from pricing.pricer import Application
+
+
+def pricer_config(**pricer_params):
+    return {"instrumentation": {"verbosity": 0},
+            "pricer_config": dict({"start_year": 2015, "end_year": 2016}, **pricer_params)}
+
+
+def _read_priced(root, yy):
+    return pd.read_csv(join(str(root), "priced_data", "priced_weeklies_optionMetricsSpx{}.csv".format(yy)))
+
+
+def test_parallel_pricing_matches_serial(data_root):
+    Application(config=pricer_config(n_workers=1)).run()
+    serial = {yy: _read_priced(data_root, yy) for yy in ["2015", "2016"]}
+    Application(config=pricer_config(n_workers=2, chunk_size=300)).run()
+    for yy in ["2015", "2016"]:
+        pd.testing.assert_frame_equal(_read_priced(data_root, yy), serial[yy])
+
+
+def test_incremental_pricing_resumes_and_truncates(data_root):
+    _raw_path = join(str(data_root), "raw_data", "optionMetricsSpx2015.csv")
+    _priced_path = join(str(data_root), "priced_data", "priced_weeklies_optionMetricsSpx2015.csv")
+    #the incremental pricing keeps the row order of a full run for raw data in date order, as the real files are
+    raw = pd.read_csv(_raw_path, float_precision="round_trip").sort_values("date", kind="stable")
+    raw.to_csv(_raw_path, index=False)
+    Application(config=pricer_config(end_year=2015)).run()
+    with open(_priced_path, "rb") as _priced:
+        full = _priced.read()
+    remove(_priced_path)
+
+    #the raw data arrives in three drops and the second run is interrupted part way through an append
+    _dates = sorted(raw["date"].unique())
+    for _last_date, _partial_append in [(_dates[4], False), (_dates[8], True), (_dates[-1], False)]:
+        raw[raw["date"] <= _last_date].to_csv(_raw_path, index=False)
+        if _partial_append:
+            with open(_priced_path, "a") as _priced:
+                _priced.write("2015-01-13,2015-01-16,C,20")
+        Application(config=pricer_config(end_year=2015, incremental=True, chunk_size=200)).run()
+    Application(config=pricer_config(end_year=2015, incremental=True, chunk_size=200)).run()
+    with open(_priced_path, "rb") as _priced:
+        assert _priced.read() == full
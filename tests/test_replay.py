@@ -0,0 +1,66 @@
+import numpy as np
+from rl_engine.replay import ReplayBuffer, SumTree
+
+
+def test_sum_tree_finds_the_cumulative_priorities():
+    rng = np.random.default_rng(0)
+    tree = SumTree(13)
+    priorities = rng.uniform(0, 1, 13)
+    priorities[[2, 7]] = 0
+    tree.update(np.arange(13), priorities)
+    #a partial update of some of the leaves
+    priorities[[0, 5, 12]] = [0.5, 2., 0.]
+    tree.update([0, 5, 12], priorities[[0, 5, 12]])
+    assert np.isclose(tree.total, priorities.sum())
+    assert tree.max_priority == priorities.max()
+    np.testing.assert_array_equal(tree.get(np.arange(13)), priorities)
+    values = rng.uniform(0, tree.total, 10000)
+    _cumulative = np.cumsum(priorities)
+    _expected = np.searchsorted(_cumulative, values, side="right")
+    #values within rounding of a boundary may land either side of it
+    _ambiguous = np.isclose(values[:, None], _cumulative[None, :]).any(axis=1)
+    np.testing.assert_array_equal(tree.find(values)[~_ambiguous], _expected[~_ambiguous])
+    assert not np.isin(tree.find(values), [2, 7, 12]).any()
+
+
+def _buffer(prioritized, capacity=10):
+    return ReplayBuffer(capacity=capacity, state_size=3, action_size=2, prioritized=prioritized, alpha=1.,
+                        beta=0.5, seed=0)
+
+
+def _transitions(start, n):
+    _ids = np.arange(start, start + n, dtype=np.float64)
+    return (np.repeat(_ids[:, None], 3, axis=1), np.repeat(_ids[:, None], 2, axis=1), _ids,
+            np.repeat(_ids[:, None] + 1, 3, axis=1), _ids % 2 == 0)
+
+
+def test_ring_buffer_keeps_the_latest_transitions():
+    buffer = _buffer(prioritized=False)
+    buffer.add(*_transitions(0, 6))
+    buffer.add(*_transitions(6, 7))
+    assert len(buffer) == 10
+    assert sorted(buffer.rewards) == list(range(3, 13))
+    batch = buffer.sample(500)
+    assert set(batch["rewards"]) == set(range(3, 13))
+    for _name in ["states", "actions", "next_states"]:
+        np.testing.assert_array_equal(batch[_name][:, 0] - (_name == "next_states"), batch["rewards"])
+    np.testing.assert_array_equal(batch["dones"], batch["rewards"] % 2 == 0)
+    np.testing.assert_array_equal(batch["weights"], 1.)
+    buffer.add(*_transitions(13, 25))
+    assert sorted(buffer.rewards) == list(range(28, 38))
+
+
+def test_prioritized_sampling_follows_the_priorities():
+    buffer = _buffer(prioritized=True)
+    _idx = buffer.add(*_transitions(0, 4))
+    priorities = np.array([1., 2., 3., 0.])
+    buffer.update_priorities(_idx, priorities, eps=0.)
+    batch = buffer.sample(60000)
+    _freq = np.bincount(batch["indices"], minlength=4) / len(batch["indices"])
+    np.testing.assert_allclose(_freq, priorities / priorities.sum(), atol=1e-3)
+    _weights = (4 * priorities[batch["indices"]] / priorities.sum()) ** -0.5
+    np.testing.assert_allclose(batch["weights"], _weights / _weights.max())
+    #new transitions get the max priority
+    buffer.add(*_transitions(4, 1))
+    _freq = np.bincount(buffer.sample(60000)["indices"], minlength=5) / 60000
+    np.testing.assert_allclose(_freq, np.append(priorities, 3.) / 9., atol=1e-3)
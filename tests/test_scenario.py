@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+from pnl.pnl_calculation import PnLEngine
+from pricing.scenario import ScenarioEngine
+from strategy.strategy import StrategyFactory
+
+
+def test_zero_shocks_give_zero_pnl(priced_root, btest_config):
+    strategies = StrategyFactory(config=btest_config).strategies
+    stacked = PnLEngine(config=btest_config).stack_leg_data(strategies, columns=["date", "bs_vol"])
+    #the expired legs are priced at zero vol which must be left out rather than turn the surface to nan
+    assert (stacked["bs_vol"] == 0).any()
+    surface = ScenarioEngine(config=btest_config, fwd_shocks=[0.], vol_shocks=[0.], time_shocks=[0]).run(strategies)
+    _dates = stacked.loc[stacked["bs_vol"] > 0, "date"]
+    assert list(surface.index.get_level_values("date")) == sorted(_dates.unique())
+    assert (surface.values == 0).all()
+
+
+def test_shocked_surface_is_finite_and_chunk_invariant(priced_root, btest_config):
+    strategies = StrategyFactory(config=btest_config).strategies
+    _shocks = {"fwd_shocks": [-0.05, 0., 0.05], "vol_shocks": [-0.5, 0., 0.02], "time_shocks": [0, 1]}
+    surface = ScenarioEngine(config=btest_config, **_shocks).run(strategies)
+    assert np.isfinite(surface.values).all()
+    pd.testing.assert_frame_equal(ScenarioEngine(config=btest_config, chunk_size=50, **_shocks).run(strategies),
+                                  surface)
@@ -0,0 +1,53 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import pandas as pd
+import pytest
+from manager.shared import SharedYearData, SharedYearView
+from pnl.pnl_calculation import PnLEngine
+from strategy.strategy import StrategyFactory
+
+
+@pytest.fixture
+def date_partition(priced_root, btest_config):
+    return StrategyFactory.load_year_index(btest_config, "2015").date_partition
+
+
+def _attach_and_read(descriptor, dates):
+    view = SharedYearView(descriptor)
+    try:
+        return view.get_many(dates)
+    finally:
+        view.close()
+
+
+def _expected(date_partition, dates):
+    expected = pd.concat([date_partition.get(_date) for _date in dates])[SharedYearData.COLUMNS]
+    return expected.reset_index(drop=True).astype({"cp_flag": "category"})
+
+
+def test_workers_attach_to_the_shared_year(date_partition):
+    _dates = date_partition.dates[[4, 0, 7]]
+    with SharedYearData(date_partition) as shared:
+        view = SharedYearView(shared.descriptor)
+        pd.testing.assert_frame_equal(view.get(_dates[0]), _expected(date_partition, _dates[:1]))
+        assert view.get(pd.Timestamp("2030-01-01")).empty
+        view.close()
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            pd.testing.assert_frame_equal(pool.submit(_attach_and_read, shared.descriptor, _dates).result(),
+                                          _expected(date_partition, _dates))
+
+
+def test_close_frees_the_shared_memory(date_partition):
+    shared = SharedYearData(date_partition)
+    _names = [_col_meta["block"] for _col_meta in shared.descriptor["columns"].values()]
+    shared.close()
+    for _name in _names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=_name)
+
+
+def test_parallel_factory_matches_serial(priced_root, btest_config):
+    serial = PnLEngine(config=btest_config).run(strategies=StrategyFactory(config=btest_config).strategies)
+    btest_config["strategy_factory"] = {"n_workers": 2, "tasks_per_worker": 2}
+    parallel = PnLEngine(config=btest_config).run(strategies=StrategyFactory(config=btest_config).strategies)
+    pd.testing.assert_frame_equal(parallel, serial)
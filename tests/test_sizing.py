@@ -0,0 +1,72 @@
+import copy
+import numpy as np
+import pandas as pd
+from pnl.pnl_calculation import PnLEngine
+from sizing.sizing import Sizing
+from strategy.strategy import StrategyFactory
+
+
+def _stacked_legs():
+    #three trade dates - one with a leg with no vega, one whose legs net out to a near zero vega and one with
+    #no vega at all
+    _legs = [("2015-01-02", 1., 0.4), ("2015-01-02", -1., 0.3), ("2015-01-02", -1., np.nan),
+             ("2015-01-09", 1., 0.25), ("2015-01-09", -1., 0.2499),
+             ("2015-01-16", -1., np.nan)]
+    stacked = []
+    for _leg_id, (_trade_date, _long_short, _vega) in enumerate(_legs):
+        _n_days = _leg_id % 3 + 1
+        stacked.append(pd.DataFrame({"trade_date": pd.Timestamp(_trade_date),
+                                     "leg_id": _leg_id,
+                                     "long_short": _long_short,
+                                     "bs_vega": np.append(_vega, np.linspace(0.1, 0.2, _n_days - 1))}))
+    return pd.concat(stacked, ignore_index=True)
+
+
+def _reference_size(stacked, target_vega, max_size=None):
+    #per trade date sum of the entry vega of its sized legs
+    _sized = stacked["sized"] if "sized" in stacked else pd.Series(True, index=stacked.index)
+    _entry = stacked[_sized].drop_duplicates("leg_id")
+    _book_vega = (_entry["long_short"] * _entry["bs_vega"]).groupby(_entry["trade_date"]).sum().abs()
+    _size = (target_vega / _book_vega).where(_book_vega > 0, 0.)
+    _size = _size if max_size is None else _size.clip(upper=max_size)
+    return np.where(_sized, stacked["trade_date"].map(_size).values, 1.)
+
+
+def test_vega_sizing_matches_per_trade_date_reference():
+    stacked = _stacked_legs()
+    _size = Sizing.compute_sizing(stacked, {"sizing_method": "vega_target", "target_vega": 0.1})
+    np.testing.assert_allclose(_size, _reference_size(stacked, 0.1))
+    #the nan vega leg is left out of the book vega rather than zeroing the trade date
+    np.testing.assert_allclose(_size[0], 0.1 / (0.4 - 0.3))
+    assert (_size[stacked["trade_date"].values == np.datetime64("2015-01-16")] == 0).all()
+
+
+def test_vega_sizing_caps_near_zero_book_vega():
+    stacked = _stacked_legs()
+    _size = Sizing.compute_sizing(stacked, {"sizing_method": "vega_target", "target_vega": 0.1, "max_size": 50})
+    np.testing.assert_allclose(_size, _reference_size(stacked, 0.1, max_size=50))
+    assert _size.max() == 50
+
+
+def test_unsized_legs_trade_at_unit_size():
+    stacked = _stacked_legs()
+    #the first leg of the first trade date and every leg of the second are configured with no_sizing
+    stacked["sized"] = ~stacked["leg_id"].isin([0, 3, 4])
+    _size = Sizing.compute_sizing(stacked, {"sizing_method": "vega_target", "target_vega": 0.1})
+    np.testing.assert_allclose(_size, _reference_size(stacked, 0.1))
+    np.testing.assert_allclose(_size[stacked["leg_id"].isin([0, 3, 4]).values], 1.)
+    np.testing.assert_allclose(_size[stacked["leg_id"].values == 1], 0.1 / 0.3)
+
+
+def test_leg_sizing_of_the_strategy_config(priced_root, btest_config):
+    strategies = StrategyFactory(config=btest_config).strategies
+    unsized_config = copy.deepcopy(btest_config)
+    del unsized_config["backtest_config"]["trading_params"]["sizing_params"]
+    unsized_index = PnLEngine(config=unsized_config).run(strategies=strategies)
+    #the repo multileg legs are configured with no_sizing so the vega target leaves their index unchanged
+    pd.testing.assert_frame_equal(PnLEngine(config=btest_config).run(strategies=strategies), unsized_index)
+    #the call legs are vega sized once their no_sizing is removed
+    del btest_config["backtest_config"]["multi_leg_strategy"]["call_legs"]["leg_sizing"]
+    stacked = PnLEngine(config=btest_config).stack_leg_data(strategies, columns=["cp_flag"])
+    np.testing.assert_array_equal(stacked["sized"].values, stacked["cp_flag"].astype(str).values == "C")
+    assert not PnLEngine(config=btest_config).run(strategies=strategies).equals(unsized_index)
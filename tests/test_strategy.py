@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pricing.bs_model import BlackScholes
+from strategy.leg import LegParams
+from strategy.strategy import Strategy
+
+NEW_LEG_MTY = 7
+
+
+@pytest.fixture
+def data():
+    #priced rows of a few trade dates with every strike listed at the new leg maturity and a shorter one, a
+    #duplicate of each row at the new leg maturity and the rows of each date in a random order
+    rng = np.random.default_rng(0)
+    _frames = []
+    for trade_date in pd.bdate_range("2015-01-05", periods=6):
+        _forward = rng.uniform(1950, 2050)
+        _strike = 5 * np.arange(np.round(_forward / 5) - 60, np.round(_forward / 5) + 61)
+        _frame = pd.DataFrame([(_k, _cp, _dte) for _k in _strike for _cp in ["C", "P"] for _dte in [NEW_LEG_MTY, 3]],
+                              columns=["strike_price", "cp_flag", "dte"])
+        _frame = pd.concat([_frame, _frame[_frame["dte"] == NEW_LEG_MTY]], ignore_index=True)
+        _frame["date"] = trade_date
+        _frame["exdate"] = trade_date + pd.to_timedelta(_frame["dte"], unit="D")
+        _frame["forward_price"] = _forward
+        _frame["bs_vol"] = 0.15 + 0.5 * (np.log(_frame["strike_price"] / _forward)) ** 2 + rng.uniform(0, 0.01, len(_frame))
+        _frame["bs_delta"] = BlackScholes.compute_greeks_array(_forward, _frame["strike_price"].values,
+                                                               _frame["dte"].values, _frame["bs_vol"].values,
+                                                               BlackScholes.is_call_flag(_frame["cp_flag"].values))[1]
+        _frames.append(_frame.iloc[rng.permutation(len(_frame))])
+    return pd.concat(_frames, ignore_index=True)
+
+
+def _reference_fixed_strike_leg(tmp, leg_config):
+    #the per trade date selection of the original strategy - the atm vol of the first row of the atm strike,
+    #the scalar delta inversion and the last row of the rounded strike at the new leg maturity
+    base = 5
+    _fwd = tmp["forward_price"].iloc[0]
+    _atm_strike = int(base * round(_fwd / base))
+    _atm_vol = tmp.loc[(tmp["strike_price"] == _atm_strike) &
+                       (tmp["cp_flag"] == leg_config["call_put"].upper())]["bs_vol"].values[0]
+    _fixed_strike = BlackScholes.invert_bs_delta_get_strike(forward=_fwd, delta_strike=leg_config["delta_strike"],
+                                                            mty=NEW_LEG_MTY, vol=_atm_vol,
+                                                            option_type=leg_config["call_put"])
+    _fixed_strike = int(base * round(_fixed_strike / base))
+    _rows = tmp[(tmp["strike_price"] == _fixed_strike) & (tmp["cp_flag"] == leg_config["call_put"].upper()) &
+                (tmp["dte"] == NEW_LEG_MTY)]
+    return LegParams.from_frame(_rows.iloc[-1:])[0]
+
+
+def test_outright_legs_match_per_trade_date_selection(data):
+    strat_config = {"call_legs": {"leg_1": {"delta_strike": 0.4, "call_put": "c"},
+                                  "leg_2": {"delta_strike": 0.1, "call_put": "c"}},
+                    "put_legs": {"leg_1": {"delta_strike": -0.25, "call_put": "p"}}}
+    leg_params = Strategy.select_legs_batch(strat_config, data, NEW_LEG_MTY, "outright_strategy")
+    assert list(leg_params) == list(data["date"].unique())
+    for trade_date, tmp in data.groupby("date", sort=False):
+        for call_put_legs in strat_config:
+            for _leg_id, _leg_config in strat_config[call_put_legs].items():
+                assert leg_params[trade_date][call_put_legs][_leg_id] == _reference_fixed_strike_leg(tmp, _leg_config)
+
+
+def test_multileg_legs_match_per_trade_date_selection(data):
+    strat_config = {"call_legs": {"call_put": "c", "delta_strike_range": [0.5, 0.05]},
+                    "put_legs": {"call_put": "p", "delta_strike_range": [-0.05, -0.5]}}
+    leg_params = Strategy.select_legs_batch(strat_config, data, NEW_LEG_MTY, "multi_leg_strategy")
+    for trade_date, tmp in data.groupby("date", sort=False):
+        for call_put_legs in ["call_legs", "put_legs"]:
+            _range = strat_config[call_put_legs]["delta_strike_range"]
+            _rows = tmp[(tmp["bs_delta"] >= _range[1]) & (tmp["bs_delta"] <= _range[0])]
+            assert leg_params[trade_date][call_put_legs] == {"leg_{}".format(idx + 1): _params for idx, _params in
+                                                             enumerate(LegParams.from_frame(_rows))}
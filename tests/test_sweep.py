@@ -0,0 +1,19 @@
+import pandas as pd
+from app.sweep import SweepEngine
+from pnl.pnl_calculation import PnLEngine
+from strategy.strategy import StrategyFactory
+
+
+def test_sweep_is_deterministic(priced_root, btest_config):
+    serial = SweepEngine(config=btest_config, n_workers=1).run()
+    assert serial["variant_id"].nunique() == 8
+    pd.testing.assert_frame_equal(SweepEngine(config=btest_config, n_workers=1).run(), serial)
+    pd.testing.assert_frame_equal(SweepEngine(config=btest_config, n_workers=2).run(), serial)
+
+
+def test_sweep_variants_match_standalone_backtests(priced_root, btest_config):
+    engine = SweepEngine(config=btest_config, n_workers=1)
+    results = SweepEngine.pivot_indices(engine.run(), column="opt_pnl")
+    for variant_id, (_, config) in enumerate(engine.create_variants()):
+        strat_index = PnLEngine(config=config).run(strategies=StrategyFactory(config=config).strategies)
+        pd.testing.assert_series_equal(results[variant_id], strat_index["opt_pnl"], check_names=False)